@@ -1,19 +1,75 @@
-from quart import Quart, jsonify, request, render_template, send_file
+from quart import Quart, Request, jsonify, request, render_template, send_file
 from quart_cors import cors
 from bidding_workflow import BiddingWorkflow
+import storage
+from document_store import DocumentStore
+from workspace import Workspace, DEFAULT_PROJECT, list_workspaces, validate_project_id
+from llm_scheduler import get_scheduler
+from circuit_breaker import breaker_stats
+from nlp_pool import shutdown_nlp_pool
+from dedup import find_duplicates
+from coverage import analyze_coverage, outline_documents, parse_requirements
+from outline import OutlineIndex
+from search_index import SearchIndex
+from http_cache import ResponseCache, file_mtime, file_stamp, json_response, make_body
+from docx_export import export_workspace
+from ingest import IngestError, detect_format, ingest_file, save_stream, upload_path
+from jobs import JobRegistry
 import logging
 from config import Config
 import json
 from datetime import datetime
 import os
 import webbrowser
+from urllib.parse import quote
 import asyncio
 
+class AppRequest(Request):
+    """上传招标文件的接口不受 MAX_CONTENT_LENGTH 限制（由 save_stream 按 INGEST_MAX_BYTES 检查），接收超时也更长"""
+
+    def __init__(self, method, scheme, path, *args, max_content_length=None, body_timeout=None, **kwargs):
+        if path == '/api/ingest':
+            max_content_length, body_timeout = None, Config.INGEST_BODY_TIMEOUT
+        super().__init__(method, scheme, path, *args, max_content_length=max_content_length,
+                         body_timeout=body_timeout, **kwargs)
+
 app = Quart(__name__)
+app.request_class = AppRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 设置最大请求大小为16MB
 app = cors(app, allow_origin="*", allow_methods=["GET", "POST"])  # 明确允许GET和POST方法
 logger = logging.getLogger(__name__)
 
+# 各项目的小节片段存储（只读），生成过程中用于返回已完成的部分
+document_stores = {}
+# 各项目的生成锁：不同项目可并行生成，同一项目同一时间只允许一个生成任务
+project_locks = {}
+# 轮询接口的响应缓存，按文件修改时间/文档版本失效
+response_cache = ResponseCache()
+# 导入、导出等后台任务
+jobs = JobRegistry()
+
+def current_workspace() -> Workspace:
+    """请求所属的项目工作区（?project_id=xxx），缺省为默认项目"""
+    return Workspace.for_project(request.args.get('project_id', DEFAULT_PROJECT))
+
+@app.before_request
+async def check_project_id():
+    """?project_id= 不合法时直接返回 400，不进入各接口（否则会被接口的通用异常处理记为 500）"""
+    project_id = request.args.get('project_id')
+    if project_id:
+        try:
+            validate_project_id(project_id)
+        except ValueError as e:
+            return jsonify({"code": 1, "message": str(e), "data": None}), 400
+
+def get_document_store(workspace: Workspace) -> DocumentStore:
+    if workspace.project_id not in document_stores:
+        document_stores[workspace.project_id] = DocumentStore(workspace.sections_dir)
+    return document_stores[workspace.project_id]
+
+def get_project_lock(workspace: Workspace) -> asyncio.Lock:
+    return project_locks.setdefault(workspace.project_id, asyncio.Lock())
+
 @app.route('/')
 async def index():
     return await render_template('index.html', active_page='index')
@@ -27,12 +83,17 @@ async def generate_outline():
         except:
             request_data = {}
         
-        async with BiddingWorkflow() as workflow:
-            logger.info("开始生成大纲")
+        workspace = current_workspace()
+        lock = get_project_lock(workspace)
+        if lock.locked():
+            return jsonify({"code": 1, "message": "该项目正在生成中", "data": None}), 409
+        priority = request.args.get('priority', 1, type=int)
+        async with lock, BiddingWorkflow(workspace, priority) as workflow:
+            logger.info(f"开始生成大纲（项目 {workspace.project_id}）")
             
             # 加载输入文件
             logger.info("加载输入文件")
-            workflow.load_input_files()
+            await workflow.load_input_files()
             
             # 生成大纲
             logger.info("生成大纲")
@@ -72,18 +133,24 @@ async def generate_outline():
 
 @app.route('/generate_document', methods=['POST','GET'])
 async def generate_document():
-    workflow = BiddingWorkflow()
+    workflow = None
     try:
-        # 加载输入文件
-        workflow.load_input_files()
-        
-        # 加载大纲
-        with open(Config.OUTLINE_DIR / 'outline.json', 'r', encoding='utf-8') as f:
-            outline_dict = json.load(f)
+        workspace = current_workspace()
+        lock = get_project_lock(workspace)
+        if lock.locked():
+            return jsonify({"status": "error", "message": "该项目正在生成中"}), 409
+        async with lock:
+            # priority：与其它同时生成的项目争用 LLM 并发名额时的权重，默认 1
+            workflow = BiddingWorkflow(workspace, request.args.get('priority', 1, type=int))
+            # 加载输入文件
+            await workflow.load_input_files()
+            
+            # 加载大纲
+            outline_dict = await storage.read_json_async(workspace.outline_json)
             workflow.outline = workflow.parse_outline_json(outline_dict)
-        
-        # 生成完整内容
-        success = await workflow.generate_full_content_async()
+            
+            # 生成完整内容
+            success = await workflow.generate_full_content_async()
         if not success:
             return jsonify({"status": "error", "message": "生成文档失败"}), 500
         
@@ -96,18 +163,21 @@ async def generate_document():
         logger.error(f"生成文档时出错: {e}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
-        await workflow.llm_client.close()
+        if workflow:
+            await workflow.llm_client.close()
 
 @app.route('/show_outline', methods=['GET'])
 async def show_outline():
     try:
-        with open(Config.OUTLINE_DIR / 'outline.json', 'r', encoding='utf-8') as f:
-            outline_content = json.load(f)
-        return jsonify({
-            "code": 0,
-            "message": "success",
-            "data": outline_content
-        })
+        workspace = current_workspace()
+        outline_file = workspace.outline_json
+
+        async def build():
+            outline_content = await storage.read_json_async(outline_file)
+            return {"code": 0, "message": "success", "data": outline_content}, file_mtime(outline_file)
+
+        body = await response_cache.get(('show_outline', workspace.project_id), file_stamp(outline_file), build)
+        return json_response(body)
     except Exception as e:
         logger.error(f"读取outline.json时出错: {str(e)}", exc_info=True)
         return jsonify({
@@ -119,13 +189,24 @@ async def show_outline():
 @app.route('/show_document', methods=['GET'])
 async def show_document():
     try:
-        with open(Config.OUTPUT_DIR / 'content.md', 'r', encoding='utf-8') as f:
-            content = f.read()
-        return jsonify({
-            "code": 0,
-            "message": "success",
-            "data": content
-        })
+        workspace = current_workspace()
+        content_file = workspace.content_file
+        document_store = get_document_store(workspace)
+        await document_store.refresh_async()
+        stamp = (file_stamp(content_file), document_store.revision(), document_store.last_modified())
+
+        async def build():
+            content_mtime = file_mtime(content_file)
+            if document_store.layout and document_store.last_modified() > content_mtime:
+                # 生成仍在进行（或尚未拼装），返回目前已完成的小节
+                content = await document_store.render_async()
+            else:
+                content = await storage.read_text_async(content_file)
+            data = {"code": 0, "message": "success", "data": content}
+            return data, max(content_mtime, document_store.last_modified())
+
+        body = await response_cache.get(('show_document', workspace.project_id), stamp, build)
+        return json_response(body)
     except Exception as e:
         logger.error(f"读取content.md时出错: {str(e)}", exc_info=True)
         return jsonify({
@@ -134,31 +215,51 @@ async def show_document():
             "data": None
         }), 500
 
+@app.route('/api/sections', methods=['GET'])
+async def document_sections():
+    """增量拉取小节：返回版本 since 之后写入的小节（full 为 true 时为全部小节，应替换已有内容）"""
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"code": 1, "message": "since 必须是整数", "data": None}), 400
+    try:
+        document_store = await get_document_store(current_workspace()).refresh_async()
+        changes = await document_store.changes_since_async(since)
+        return json_response(make_body({"code": 0, "message": "success", "data": changes},
+                                       document_store.last_modified()))
+    except Exception as e:
+        logger.error(f"读取小节增量时出错: {str(e)}", exc_info=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+
 @app.route('/show_input', methods=['GET'])
 async def show_input():
     try:
-        score_path = Config.INPUT_DIR / 'score.md'
-        tech_path = Config.INPUT_DIR / 'tech.md'
-        
-        score_content = ''
-        tech_content = ''
-        
-        if score_path.exists():
-            with open(score_path, 'r', encoding='utf-8') as f:
-                score_content = f.read()
-                
-        if tech_path.exists():
-            with open(tech_path, 'r', encoding='utf-8') as f:
-                tech_content = f.read()
-        
-        return jsonify({
-            "code": 0,
-            "message": "success",
-            "data": {
-                "score_md": score_content,
-                "tech_md": tech_content
+        workspace = current_workspace()
+        score_path = workspace.score_file
+        tech_path = workspace.tech_file
+
+        async def build():
+            score_content = ''
+            tech_content = ''
+
+            if score_path.exists():
+                score_content = await storage.read_text_async(score_path)
+
+            if tech_path.exists():
+                tech_content = await storage.read_text_async(tech_path)
+
+            data = {
+                "code": 0,
+                "message": "success",
+                "data": {
+                    "score_md": score_content,
+                    "tech_md": tech_content
+                }
             }
-        })
+            return data, file_mtime(score_path, tech_path)
+
+        body = await response_cache.get(('show_input', workspace.project_id), file_stamp(score_path, tech_path), build)
+        return json_response(body)
     except Exception as e:
         logger.error(f"读取输入文件时出错: {str(e)}", exc_info=True)
         return jsonify({
@@ -174,14 +275,12 @@ async def save_input():
         score_content = request_data.get('score_md', '')
         tech_content = request_data.get('tech_md', '')
         
-        score_path = Config.INPUT_DIR / 'score.md'
-        tech_path = Config.INPUT_DIR / 'tech.md'
+        workspace = current_workspace().ensure()
+        score_path = workspace.score_file
+        tech_path = workspace.tech_file
         
-        with open(score_path, 'w', encoding='utf-8') as f:
-            f.write(score_content)
-            
-        with open(tech_path, 'w', encoding='utf-8') as f:
-            f.write(tech_content)
+        await storage.write_text_async(score_path, score_content)
+        await storage.write_text_async(tech_path, tech_content)
         
         return jsonify({
             "code": 0,
@@ -197,6 +296,78 @@ async def save_input():
         }), 500
 
 # 配置相关的路由
+@app.route('/api/ingest', methods=['POST'])
+async def ingest_tender():
+    """
+    导入招标文件（PDF/DOCX/XLSX），生成 tech.md 和 score.md
+
+    请求体为文件的原始内容（如 curl --data-binary @招标文件.pdf），文件名放在 filename 参数中；
+    上传完成后在后台解析，返回任务信息，通过 /api/jobs/<job_id> 查看进度和结果。
+    """
+    workspace = current_workspace()
+    lock = get_project_lock(workspace)
+    if lock.locked():
+        return jsonify({"code": 1, "message": "该项目正在生成中", "data": None}), 409
+    path = upload_path(workspace, request.args.get('filename', ''))
+    try:
+        size = await save_stream(request.body, path)
+        await asyncio.get_running_loop().run_in_executor(None, detect_format, path)
+    except IngestError as e:
+        path.unlink(missing_ok=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 400
+    except Exception as e:
+        logger.error(f"保存上传文件时出错: {e}", exc_info=True)
+        path.unlink(missing_ok=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+    logger.info(f"已接收招标文件 {path.name}（{size} 字节，项目 {workspace.project_id}）")
+
+    async def run(job):
+        async with lock:
+            return await ingest_file(path, workspace, job)
+
+    job = jobs.start('ingest', workspace.project_id, run)
+    return jsonify({"code": 0, "message": "文件已上传，正在解析", "data": job.to_dict()}), 202
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+@app.route('/api/export', methods=['POST'])
+async def export_document():
+    """在后台把当前文档导出为 Word（outputs/content.docx），完成后通过 /api/export/download 下载"""
+    workspace = current_workspace()
+    job = jobs.running(workspace.project_id, 'export')
+    if job is None:
+        async def run(job):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, export_workspace, workspace, job)
+
+        job = jobs.start('export', workspace.project_id, run)
+    return jsonify({"code": 0, "message": "正在导出", "data": job.to_dict()}), 202
+
+@app.route('/api/export/download', methods=['GET'])
+async def download_export():
+    docx_file = current_workspace().docx_file
+    if not docx_file.exists():
+        return jsonify({"code": 1, "message": "尚未导出 Word 文档", "data": None}), 404
+    response = await send_file(docx_file, mimetype=DOCX_MIMETYPE, conditional=True)
+    # 中文文件名按 RFC 5987 编码，HTTP 头只能是 latin-1
+    response.headers['Content-Disposition'] = f"attachment; filename=content.docx; filename*=UTF-8''{quote('技术方案.docx')}"
+    return response
+
+@app.route('/api/jobs', methods=['GET'])
+async def list_jobs():
+    """当前项目的后台任务，从新到旧"""
+    workspace = current_workspace()
+    kind = request.args.get('kind') or None
+    return jsonify({"code": 0, "message": "success",
+                    "data": [job.to_dict() for job in jobs.list(workspace.project_id, kind)]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"code": 1, "message": "任务不存在", "data": None}), 404
+    return jsonify({"code": 0, "message": "success", "data": job.to_dict()})
+
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """获取当前配置"""
@@ -238,6 +409,17 @@ async def update_config():
             if 'urls' in proxy_config:
                 Config.PROXY_URLS = proxy_config['urls']
         
+        # 更新模型路由配置
+        if 'model_routes' in new_config:
+            for task, routes in new_config['model_routes'].items():
+                if task in Config.MODEL_ROUTES and isinstance(routes, list):
+                    Config.MODEL_ROUTES[task] = routes
+        
+        # 更新链路追踪配置
+        if 'trace' in new_config:
+            trace_config = new_config['trace']
+            Config.TRACE_ENABLED = trace_config.get('enabled', Config.TRACE_ENABLED)
+        
         # 保存到配置文件
         Config.save_config()
         
@@ -313,14 +495,16 @@ async def save_prompts():
 @app.route('/api/outline', methods=['GET'])
 async def get_outline():
     try:
-        outline_file = Config.OUTLINE_DIR / 'outline.json'
+        workspace = current_workspace()
+        outline_file = workspace.outline_json
         if not outline_file.exists():
             return jsonify({"outline": []}), 200
-            
-        with open(outline_file, 'r', encoding='utf-8') as f:
-            outline_data = json.load(f)
-            
-        return jsonify(outline_data)
+
+        async def build():
+            return await storage.read_json_async(outline_file), file_mtime(outline_file)
+
+        body = await response_cache.get(('api_outline', workspace.project_id), file_stamp(outline_file), build)
+        return json_response(body)
     except Exception as e:
         logger.error(f"读取大纲时出错: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
@@ -332,19 +516,114 @@ async def save_outline():
         if not isinstance(outline_data, dict):
             return jsonify({"error": "Invalid outline format"}), 400
 
-        # 确保输出目录存在
-        os.makedirs(Config.OUTLINE_DIR, exist_ok=True)
-        
-        # 保存大纲文件
-        outline_file = Config.OUTLINE_DIR / 'outline.json'
-        with open(outline_file, 'w', encoding='utf-8') as f:
-            json.dump(outline_data, f, ensure_ascii=False, indent=2)
+        # 保存大纲文件（原子写入，会自动创建输出目录）
+        outline_file = current_workspace().outline_json
+        await storage.write_json_async(outline_file, outline_data)
             
         return jsonify({"message": "大纲保存成功"})
     except Exception as e:
         logger.error(f"保存大纲时出错: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/projects', methods=['GET'])
+async def list_projects():
+    """列出所有项目及其状态"""
+    try:
+        loop = asyncio.get_running_loop()
+        projects = await loop.run_in_executor(None, lambda: [workspace.info() for workspace in list_workspaces()])
+        for project in projects:
+            lock = project_locks.get(project['project_id'])
+            project['running'] = bool(lock and lock.locked())
+        return jsonify({"code": 0, "message": "success", "data": projects})
+    except Exception as e:
+        logger.error(f"列出项目时出错: {str(e)}", exc_info=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+
+@app.route('/api/projects', methods=['POST'])
+async def create_project():
+    """创建项目工作区"""
+    try:
+        request_data = await request.get_json()
+        project_id = (request_data or {}).get('project_id')
+        if not project_id or not isinstance(project_id, str):
+            # for_project 会把空 ID 当作默认项目
+            raise ValueError("project_id is required")
+        workspace = Workspace.for_project(project_id)
+    except ValueError as e:
+        return jsonify({"code": 1, "message": str(e), "data": None}), 400
+    try:
+        created = not workspace.exists()
+        workspace.ensure()
+        return jsonify({"code": 0, "message": "success" if created else "项目已存在", "data": workspace.info()})
+    except Exception as e:
+        logger.error(f"创建项目时出错: {str(e)}", exc_info=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+
+@app.route('/api/scheduler', methods=['GET'])
+async def scheduler_stats():
+    """LLM 并发名额的使用情况与各生成任务的排队状态"""
+    return jsonify({"code": 0, "message": "success", "data": get_scheduler().stats()})
+
+@app.route('/api/llm_health', methods=['GET'])
+async def llm_health():
+    """各模型的熔断状态与最近请求的失败、慢请求统计"""
+    return jsonify({"code": 0, "message": "success", "data": breaker_stats()})
+
+@app.route('/api/duplicates', methods=['GET'])
+async def get_duplicates():
+    """检测当前文档中跨小节的近似重复段落（按已完成的小节实时计算）"""
+    try:
+        document_store = get_document_store(current_workspace())
+        await document_store.refresh_async()
+        sections = [(key, content) for key, _, content in await document_store.sections_async()]
+        loop = asyncio.get_running_loop()
+        pairs = await loop.run_in_executor(None, find_duplicates, sections)
+        return jsonify({"code": 0, "message": "success", "data": [pair.to_dict() for pair in pairs]})
+    except Exception as e:
+        logger.error(f"检测重复内容时出错: {e}", exc_info=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+
+@app.route('/api/coverage', methods=['GET'])
+async def get_coverage():
+    """技术要求和评分项在大纲与已生成正文中的覆盖矩阵（实时计算）"""
+    try:
+        workspace = current_workspace()
+        tech_content = await storage.read_text_async(workspace.tech_file) if workspace.tech_file.exists() else ""
+        score_content = await storage.read_text_async(workspace.score_file) if workspace.score_file.exists() else ""
+        outline = None
+        if workspace.outline_json.exists():
+            outline = outline_documents(OutlineIndex.from_dict(await storage.read_json_async(workspace.outline_json)))
+        document_store = get_document_store(workspace)
+        await document_store.refresh_async()
+        content = await document_store.sections_async()
+        requirements = parse_requirements(tech_content, score_content)
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(None, analyze_coverage, requirements, outline, content)
+        return jsonify({"code": 0, "message": "success", "data": report})
+    except Exception as e:
+        logger.error(f"检查需求覆盖时出错: {e}", exc_info=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+
+@app.route('/search', methods=['GET'])
+async def search():
+    """
+    检索所有项目已生成的小节
+
+    参数：q 检索词（空格分隔多个词，需同时命中），project_id 只在该项目中检索（可选），limit 返回条数
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({"code": 1, "message": "缺少检索词", "data": None}), 400
+        project_id = request.args.get('project_id') or None
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, SearchIndex().search, query, project_id, limit)
+        return jsonify({"code": 0, "message": "success", "data": results})
+    except Exception as e:
+        logger.error(f"检索时出错: {e}", exc_info=True)
+        return jsonify({"code": 1, "message": str(e), "data": None}), 500
+
 @app.route('/res/<path:filename>')
 async def serve_resource(filename):
     try:
@@ -353,6 +632,11 @@ async def serve_resource(filename):
         logger.error(f"提供资源 {filename} 时出错: {e}")
         return "资源未找到", 404
 
+@app.after_serving
+async def stop_background_work():
+    await jobs.cancel_all()
+    shutdown_nlp_pool()
+
 if __name__ == '__main__':
     # 检查webui目录是否存在
     if not os.path.exists('templates'):
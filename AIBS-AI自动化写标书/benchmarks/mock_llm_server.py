@@ -0,0 +1,251 @@
+# benchmarks/mock_llm_server.py
+
+"""
+本地模拟的 OpenAI 兼容 chat/completions 服务
+
+用于离线压测，不消耗真实供应商额度。可模拟：
+- 首字延迟分布（fixed / uniform / lognormal）
+- 按 tokens/s 的解码速度（非流式时整体等待，流式时按 SSE 分块推送）
+- 429 限流（随机、周期性突发、超出并发上限）
+- 5xx 错误
+- 输出被截断（finish_reason = "length"）
+
+单独运行：
+    python -m benchmarks.mock_llm_server --port 8765 --latency-ms 500 --tps 400
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiohttp import web
+
+# 用于拼接模拟正文的中文片段，1 个汉字按 1 个 token 计
+_FILLER = "本系统采用分层架构设计，通过统一的数据平台实现设备接入、远程控制与智能调度，确保运行稳定可靠。"
+
+
+@dataclass
+class MockServerConfig:
+    """模拟服务的行为参数"""
+    # 首字延迟（毫秒）
+    latency_dist: str = 'lognormal'  # fixed / uniform / lognormal
+    latency_ms: float = 500.0        # fixed 的取值；uniform 的上限；lognormal 的中位数
+    latency_sigma: float = 0.5       # lognormal 的形状参数
+    # 解码
+    tokens_per_second: float = 400.0
+    output_tokens: int = 800         # 每次回复的 token 数（不超过请求里的 max_tokens）
+    # 故障注入
+    rate_limit_rate: float = 0.0     # 随机返回 429 的概率
+    burst_period_s: float = 0.0      # 周期性 429 突发：周期（0 表示关闭）
+    burst_duration_s: float = 0.0    # 每个周期开始后持续返回 429 的时长
+    max_concurrency: int = 0         # 同时处理的请求上限，超出返回 429（0 表示不限）
+    retry_after_s: int = 1           # 429 响应携带的 Retry-After
+    error_rate_5xx: float = 0.0      # 随机返回 500/502/503 的概率
+    truncation_rate: float = 0.0     # 随机截断输出的概率
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockServerStats:
+    """服务端视角的统计"""
+    requests: int = 0
+    statuses: Counter = field(default_factory=Counter)
+    truncated: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+
+
+class MockLLMServer:
+    """基于 aiohttp 的模拟 LLM 服务，可在同一事件循环内启动和关闭"""
+
+    def __init__(self, config: Optional[MockServerConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or MockServerConfig()
+        self.host = host
+        self.port = port
+        self.stats = MockServerStats()
+        self._random = random.Random(self.config.seed)
+        self._started_at = time.monotonic()
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post('/chat/completions', self.handle_chat_completions)
+        self.app.router.add_post('/v1/chat/completions', self.handle_chat_completions)
+
+    @property
+    def url(self) -> str:
+        """供 LLMClient 使用的 base_url"""
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        # port=0 时由系统分配端口
+        self.port = self._runner.addresses[0][1]
+        self._started_at = time.monotonic()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    def _first_token_delay(self) -> float:
+        cfg = self.config
+        if cfg.latency_dist == 'fixed':
+            ms = cfg.latency_ms
+        elif cfg.latency_dist == 'uniform':
+            ms = self._random.uniform(0, cfg.latency_ms)
+        else:
+            ms = self._random.lognormvariate(math.log(max(cfg.latency_ms, 1e-3)), cfg.latency_sigma)
+        return ms / 1000.0
+
+    def _in_burst(self) -> bool:
+        cfg = self.config
+        if cfg.burst_period_s <= 0:
+            return False
+        elapsed = time.monotonic() - self._started_at
+        return (elapsed % cfg.burst_period_s) < cfg.burst_duration_s
+
+    def _error_response(self, status: int) -> web.Response:
+        self.stats.statuses[status] += 1
+        headers = {'Retry-After': str(self.config.retry_after_s)} if status == 429 else None
+        return web.json_response(
+            {"error": {"message": f"mock error {status}", "code": status}},
+            status=status,
+            headers=headers
+        )
+
+    async def handle_chat_completions(self, request: web.Request) -> web.StreamResponse:
+        cfg = self.config
+        self.stats.requests += 1
+        body = await request.json()
+
+        # 故障注入
+        if cfg.max_concurrency and self.stats.in_flight >= cfg.max_concurrency:
+            return self._error_response(429)
+        if self._in_burst() or self._random.random() < cfg.rate_limit_rate:
+            return self._error_response(429)
+        if self._random.random() < cfg.error_rate_5xx:
+            return self._error_response(self._random.choice((500, 502, 503)))
+
+        tokens = min(cfg.output_tokens, int(body.get('max_tokens') or cfg.output_tokens))
+        finish_reason = 'stop'
+        if self._random.random() < cfg.truncation_rate:
+            tokens = max(1, int(tokens * self._random.uniform(0.1, 0.9)))
+            finish_reason = 'length'
+            self.stats.truncated += 1
+        text = (_FILLER * (tokens // len(_FILLER) + 1))[:tokens]
+
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+        try:
+            await asyncio.sleep(self._first_token_delay())
+            if body.get('stream'):
+                return await self._stream(request, body, text, finish_reason)
+            await asyncio.sleep(len(text) / cfg.tokens_per_second)
+            self.stats.statuses[200] += 1
+            return web.json_response({
+                "id": f"mock-{self.stats.requests}",
+                "object": "chat.completion",
+                "model": body.get('model', 'mock'),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": finish_reason
+                }],
+                "usage": {
+                    "prompt_tokens": sum(len(m.get('content', '')) for m in body.get('messages', [])),
+                    "completion_tokens": len(text),
+                    "total_tokens": len(text)
+                }
+            })
+        finally:
+            self.stats.in_flight -= 1
+
+    async def _stream(self, request: web.Request, body: dict, text: str, finish_reason: str) -> web.StreamResponse:
+        """以 SSE 分块推送，模拟逐 token 解码"""
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        chunk_size = 20
+        for i in range(0, len(text), chunk_size):
+            piece = text[i:i + chunk_size]
+            await asyncio.sleep(len(piece) / self.config.tokens_per_second)
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": body.get('model', 'mock'),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        final = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        await response.write_eof()
+        self.stats.statuses[200] += 1
+        return response
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """注册模拟服务相关的命令行参数（run_benchmark 复用）"""
+    defaults = MockServerConfig()
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'lognormal'], default=defaults.latency_dist)
+    parser.add_argument('--latency-ms', type=float, default=defaults.latency_ms)
+    parser.add_argument('--latency-sigma', type=float, default=defaults.latency_sigma)
+    parser.add_argument('--tps', type=float, default=defaults.tokens_per_second, help='解码速度 tokens/s')
+    parser.add_argument('--output-tokens', type=int, default=defaults.output_tokens)
+    parser.add_argument('--rate-limit-rate', type=float, default=defaults.rate_limit_rate)
+    parser.add_argument('--burst-period', type=float, default=defaults.burst_period_s)
+    parser.add_argument('--burst-duration', type=float, default=defaults.burst_duration_s)
+    parser.add_argument('--max-concurrency', type=int, default=defaults.max_concurrency)
+    parser.add_argument('--retry-after', type=int, default=defaults.retry_after_s)
+    parser.add_argument('--error-rate', type=float, default=defaults.error_rate_5xx)
+    parser.add_argument('--truncation-rate', type=float, default=defaults.truncation_rate)
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def server_config_from_args(args: argparse.Namespace) -> MockServerConfig:
+    return MockServerConfig(
+        latency_dist=args.latency_dist,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tps,
+        output_tokens=args.output_tokens,
+        rate_limit_rate=args.rate_limit_rate,
+        burst_period_s=args.burst_period,
+        burst_duration_s=args.burst_duration,
+        max_concurrency=args.max_concurrency,
+        retry_after_s=args.retry_after,
+        error_rate_5xx=args.error_rate,
+        truncation_rate=args.truncation_rate,
+        seed=args.seed
+    )
+
+
+async def _serve_forever(config: MockServerConfig, host: str, port: int):
+    async with MockLLMServer(config, host=host, port=port) as server:
+        print(f"Mock LLM server listening on {server.url}")
+        while True:
+            await asyncio.sleep(3600)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='模拟 OpenAI 兼容的 chat/completions 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve_forever(server_config_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
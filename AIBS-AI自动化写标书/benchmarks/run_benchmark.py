@@ -0,0 +1,218 @@
+# benchmarks/run_benchmark.py
+
+"""
+离线压测：在本地模拟服务上测量 generate_full_content_async / _call_llm_async 的吞吐
+
+示例：
+    python -m benchmarks.run_benchmark                      # 依次运行 10/100/500 小节场景
+    python -m benchmarks.run_benchmark --scenario 100 --rate-limit-rate 0.05 --error-rate 0.02
+    python -m benchmarks.run_benchmark --mode call --requests 200 --concurrency 15
+
+输出每个场景的总耗时、小节延迟 p50/p95、请求数/秒以及服务端状态码分布。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# 允许以脚本方式运行（python benchmarks/run_benchmark.py）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config  # noqa: E402
+from benchmarks.mock_llm_server import MockLLMServer, add_server_arguments, server_config_from_args  # noqa: E402
+
+# 预置场景：小节数量
+SCENARIOS = {
+    '10': 10,
+    '100': 100,
+    '500': 500,
+}
+
+# 合成大纲的形状：每节 5 个小节，每章 12 节（覆盖 "1.10" 之后的编号）
+SUBSECTIONS_PER_SECTION = 5
+SECTIONS_PER_CHAPTER = 12
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法求分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def build_synthetic_outline(total_subsections: int) -> Dict:
+    """构造指定小节数量的大纲 JSON（与 outline.json 结构一致）"""
+    chapters = []
+    remaining = total_subsections
+    chapter_no = 0
+    while remaining > 0:
+        chapter_no += 1
+        sections = []
+        for section_no in range(1, SECTIONS_PER_CHAPTER + 1):
+            if remaining <= 0:
+                break
+            count = min(SUBSECTIONS_PER_SECTION, remaining)
+            remaining -= count
+            sections.append({
+                'section_title': f"{chapter_no}.{section_no} 压测节",
+                'sub_sections': [
+                    {
+                        'sub_section_title': f"{chapter_no}.{section_no}.{sub_no} 压测小节",
+                        'content_summary': "描述系统架构、部署方式与运维保障措施。"
+                    }
+                    for sub_no in range(1, count + 1)
+                ]
+            })
+        chapters.append({'chapter_title': f"第{chapter_no}章 压测章节", 'sections': sections})
+    return {'body_paragraphs': chapters}
+
+
+def summarize(name: str, wall: float, latencies: List[float], server: MockLLMServer, failures: int) -> Dict:
+    stats = server.stats
+    return {
+        'scenario': name,
+        'sections': len(latencies),
+        'failures': failures,
+        'wall_time_s': round(wall, 3),
+        'section_p50_s': round(percentile(latencies, 50), 3),
+        'section_p95_s': round(percentile(latencies, 95), 3),
+        'section_max_s': round(max(latencies), 3) if latencies else 0.0,
+        'requests': stats.requests,
+        'requests_per_s': round(stats.requests / wall, 2) if wall > 0 else 0.0,
+        'peak_in_flight': stats.peak_in_flight,
+        'truncated': stats.truncated,
+        'statuses': {str(k): v for k, v in sorted(stats.statuses.items())},
+    }
+
+
+async def bench_workflow(name: str, sections: int, args: argparse.Namespace) -> Dict:
+    """端到端压测 generate_full_content_async"""
+    from bidding_workflow import BiddingWorkflow
+    from workspace import Workspace
+
+    async with MockLLMServer(server_config_from_args(args)) as server:
+        with tempfile.TemporaryDirectory() as output_dir:
+            workspace = Workspace('benchmark', Path(output_dir) / 'inputs', Path(output_dir) / 'outputs')
+            # 压测生成的内容不写入正式的检索索引
+            Config.SEARCH_INDEX_FILE = Path(output_dir) / 'search.db'
+            async with BiddingWorkflow(workspace) as workflow:
+                workflow.llm_client.base_url = server.url
+                workflow.llm_client.api_key = 'benchmark'
+                workflow.tech_content = "压测用技术要求。" * 50
+                workflow.score_content = "压测用评分标准。" * 20
+                workflow.outline = workflow.parse_outline_json(build_synthetic_outline(sections))
+
+                # 记录每个小节的端到端耗时（含排队、重试）
+                latencies: List[float] = []
+                failures = 0
+                generate = workflow.llm_client.generate_section_content_async
+
+                async def timed_generate(section):
+                    nonlocal failures
+                    start = time.perf_counter()
+                    result = await generate(section)
+                    latencies.append(time.perf_counter() - start)
+                    if "生成失败" in result.get('content', ''):
+                        failures += 1
+                    return result
+
+                workflow.llm_client.generate_section_content_async = timed_generate
+
+                start = time.perf_counter()
+                await workflow.generate_full_content_async()
+                wall = time.perf_counter() - start
+
+    return summarize(name, wall, latencies, server, failures)
+
+
+async def bench_calls(name: str, requests: int, concurrency: int, args: argparse.Namespace) -> Dict:
+    """直接压测 _call_llm_async（不经过工作流的批次与写盘）"""
+    from llmkey import LLMClient
+
+    async with MockLLMServer(server_config_from_args(args)) as server:
+        client = LLMClient()
+        client.base_url = server.url
+        client.api_key = 'benchmark'
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        failures = 0
+
+        async def one_call(i: int):
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                content = await client._call_llm_async([
+                    {"role": "system", "content": "benchmark"},
+                    {"role": "user", "content": f"request {i}"}
+                ])
+                latencies.append(time.perf_counter() - start)
+                if not content:
+                    failures += 1
+
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(one_call(i) for i in range(requests)))
+            wall = time.perf_counter() - start
+        finally:
+            await client.close()
+
+    return summarize(name, wall, latencies, server, failures)
+
+
+def print_report(report: Dict):
+    print(
+        f"[{report['scenario']}] sections={report['sections']} failures={report['failures']} "
+        f"wall={report['wall_time_s']:.2f}s p50={report['section_p50_s']:.2f}s "
+        f"p95={report['section_p95_s']:.2f}s max={report['section_max_s']:.2f}s "
+        f"requests={report['requests']} rps={report['requests_per_s']:.2f} "
+        f"peak_in_flight={report['peak_in_flight']} statuses={report['statuses']}"
+    )
+
+
+async def main(args: argparse.Namespace) -> List[Dict]:
+    Config.RETRY_DELAY = args.retry_delay
+    Config.TIMEOUT = args.timeout
+    os.environ.pop('LLM_API_BASE', None)
+
+    reports = []
+    if args.mode == 'call':
+        report = await bench_calls(f"call-{args.requests}", args.requests, args.concurrency, args)
+        print_report(report)
+        reports.append(report)
+    else:
+        names = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+        for name in names:
+            report = await bench_workflow(f"sections-{name}", SCENARIOS[name], args)
+            print_report(report)
+            reports.append(report)
+    return reports
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='离线压测标书生成流程')
+    parser.add_argument('--mode', choices=['workflow', 'call'], default='workflow')
+    parser.add_argument('--scenario', choices=['all'] + list(SCENARIOS), default='all')
+    parser.add_argument('--requests', type=int, default=100, help='call 模式下的请求数')
+    parser.add_argument('--concurrency', type=int, default=15, help='call 模式下的并发数')
+    parser.add_argument('--retry-delay', type=float, default=0.5, help='覆盖 Config.RETRY_DELAY')
+    parser.add_argument('--timeout', type=float, default=Config.TIMEOUT, help='覆盖 Config.TIMEOUT')
+    parser.add_argument('--json', dest='json_path', help='将结果写入 JSON 文件')
+    parser.add_argument('--log-level', default='WARNING')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    results = asyncio.run(main(args))
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
@@ -12,6 +12,21 @@ import pathlib
 import logging
 from config import Config
 from prompts import Prompts
+from tracing import span
+from logging_setup import setup_logging, log_payload, truncate_payload
+import storage
+from document_store import DocumentStore, text_entry, fragment_entry
+from workspace import Workspace
+from outline import Outline, Chapter, Section, SubSection, OutlineIndex, position_key
+from context_assembler import ContextAssembler
+from chunker import iter_chunks
+from tokenizer import count_tokens, truncate_to_tokens
+from dedup import find_duplicates, sections_to_regenerate
+from coverage import analyze_coverage, outline_documents, parse_requirements, sections_to_cover
+from search_index import index_document_store
+from llm_scheduler import get_scheduler, request_priority
+from score_weights import section_weights, target_chars, token_budgets
+from model_router import section_task, TASK_OUTLINE
 import time
 import asyncio
 
@@ -29,122 +44,80 @@ for path in [
 ]:
     path.mkdir(parents=True, exist_ok=True)
 
-# 修改日志配置
-logging.basicConfig(level=logging.INFO)  # 设置根日志器级别为 INFO
-
-# 创建文件处理器，用于详细日志
-file_handler = logging.FileHandler(Config.LOG_DIR / 'app.log', encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-
-# 创建控制台处理器，只显示关键信息
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-# 配置根日志器
-root_logger = logging.getLogger()
-root_logger.handlers = []  # 清除之前的处理器
-root_logger.addHandler(file_handler)
-root_logger.addHandler(console_handler)
-
-# 配置第三方库的日志级别
-logging.getLogger('httpcore').setLevel(logging.WARNING)
-logging.getLogger('httpx').setLevel(logging.WARNING)
-logging.getLogger('openai').setLevel(logging.WARNING)
+# 日志：后台线程写文件，按大小轮转
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class OutlineNode:
-    title: str
-    level: int
-    content_desc: Optional[str] = None
-    children: List['OutlineNode'] = None
-    
-    def __post_init__(self):
-        if self.children is None:
-            self.children = []
-    
-    def to_dict(self):
-        return {
-            'title': self.title,
-            'level': self.level,
-            'content_desc': self.content_desc,
-            'children': [child.to_dict() for child in self.children] if self.children else []
-        }
-
 @dataclass
 class GenerationProgress:
     total_sections: int = 0
     completed_sections: int = 0
     current_section: str = ""
 
-@dataclass
-class SubSection:
-    sub_section_title: str
-    content_summary: str
-
-    def to_dict(self):
-        return {
-            'sub_section_title': self.sub_section_title,
-            'content_summary': self.content_summary
-        }
-
-@dataclass
-class Section:
-    section_title: str
-    sub_sections: List[SubSection]
-
-    def to_dict(self):
-        return {
-            'section_title': self.section_title,
-            'sub_sections': [sub.to_dict() for sub in self.sub_sections]
-        }
-
-@dataclass
-class Chapter:
-    chapter_title: str
-    sections: List[Section]
-
-    def to_dict(self):
-        return {
-            'chapter_title': self.chapter_title,
-            'sections': [section.to_dict() for section in self.sections]
-        }
-
-@dataclass
-class Outline:
-    body_paragraphs: List[Chapter]
-
-    def to_dict(self):
-        return {
-            'body_paragraphs': [chapter.to_dict() for chapter in self.body_paragraphs]
-        }
+@dataclass(frozen=True)
+class RunContext:
+    """
+    一次整篇生成中各小节共享的只读上下文
+
+    大纲 Markdown、技术要求、评分标准和格式化好的提示词前缀只构造一次，
+    每个小节任务只持有对它的引用，避免按小节数量复制整份大纲和输入文本。
+    """
+    outline_md: str
+    tech_content: str
+    score_content: str
+    prompt_prefix: str
+
+    @classmethod
+    def build(cls, outline_md: str, tech_content: str, score_content: str) -> 'RunContext':
+        return cls(
+            outline_md=outline_md,
+            tech_content=tech_content,
+            score_content=score_content,
+            prompt_prefix=Prompts.CONTENT_CONTEXT_USER.format(
+                tech_req_md=tech_content,
+                scoring_criteria_md=score_content,
+                full_outline_md=outline_md
+            )
+        )
 
 class BiddingWorkflow:
-    def __init__(self):
+    def __init__(self, workspace: Optional[Workspace] = None, priority: int = 1):
+        # 项目工作区，未指定时使用默认项目（inputs/、outputs/）
+        self.workspace = workspace or Workspace.for_project()
+        # 与其它同时运行的生成任务争用 LLM 并发名额时的权重
+        self.priority = priority
         self.tech_content = ""
         self.score_content = ""
         self.outline = None
+        self._outline_index = None
+        self.context_assembler = None
         self.generated_contents = {}
         self.llm_client = LLMClient()
         self.progress = GenerationProgress()
+        self.document_store = DocumentStore(self.workspace.sections_dir)
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
         return self
 
+    @property
+    def outline_index(self) -> OutlineIndex:
+        """当前大纲的展平索引，大纲被替换后自动重建"""
+        if self._outline_index is None or self._outline_index.outline is not self.outline:
+            self._outline_index = OutlineIndex(self.outline)
+        return self._outline_index
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
         if hasattr(self, 'llm_client'):
             await self.llm_client.close()
 
-    def load_input_files(self):
+    async def load_input_files(self):
         """加载技术要求和评分标准文件"""
         try:
-            tech_file = Config.INPUT_DIR / 'tech.md'
-            score_file = Config.INPUT_DIR / 'score.md'
+            tech_file = self.workspace.tech_file
+            score_file = self.workspace.score_file
             
             # 检查文件是否存在
             if not tech_file.exists():
@@ -162,13 +135,11 @@ class BiddingWorkflow:
                 logger.error("Score file is empty")
                 raise ValueError("Score file is empty")
             
-            with open(tech_file, 'r', encoding='utf-8') as f:
-                self.tech_content = f.read()
-                logger.info(f"Loaded tech file, size: {len(self.tech_content)} chars")
+            self.tech_content = await storage.read_text_async(tech_file)
+            logger.info(f"Loaded tech file, size: {len(self.tech_content)} chars")
             
-            with open(score_file, 'r', encoding='utf-8') as f:
-                self.score_content = f.read()
-                logger.info(f"Loaded score file, size: {len(self.score_content)} chars")
+            self.score_content = await storage.read_text_async(score_file)
+            logger.info(f"Loaded score file, size: {len(self.score_content)} chars")
             
         except Exception as e:
             logger.error(f"Error loading input files: {e}", exc_info=True)
@@ -225,16 +196,21 @@ class BiddingWorkflow:
                     return json.dumps(parsed, ensure_ascii=False)
                 except json.JSONDecodeError as e:
                     logger.error(f"Failed to fix JSON: {e}")
-                    logger.error(f"Problematic JSON:\n{cleaned}")
+                    logger.error(f"Problematic JSON:\n{truncate_payload(cleaned)}")
                     raise ValueError(f"Could not parse JSON response: {e}")
                 
         except Exception as e:
             logger.error(f"Error cleaning JSON response: {e}")
-            logger.error(f"Original response:\n{response}")
+            logger.error(f"Original response:\n{truncate_payload(response)}")
             raise
 
     async def generate_outline(self) -> str:
         """生成大纲"""
+        with span("generate_outline", root=True), \
+                get_scheduler().job(f"{self.workspace.project_id}:outline", self.priority):
+            return await self._generate_outline()
+
+    async def _generate_outline(self) -> str:
         try:
             logger.info("=== Starting Outline Generation ===")
             
@@ -263,7 +239,8 @@ class BiddingWorkflow:
             outline_json = await self.llm_client.generate_text_async(
                 messages=messages,
                 require_json=True,
-                require_outline=True
+                require_outline=True,
+                task=TASK_OUTLINE
             )
             
             if not outline_json:
@@ -271,7 +248,7 @@ class BiddingWorkflow:
                 return None
                 
             # 保存大纲
-            self.save_outline_json(outline_json)
+            await self.save_outline_json(outline_json)
             # Parse and log outline info
             parsed_outline = self.parse_outline_json(outline_json)
             if parsed_outline:
@@ -286,45 +263,12 @@ class BiddingWorkflow:
             logger.error(f"Error generating outline: {e}")
             raise
 
-    def split_long_text(self, text: str, max_length: int = 3000) -> List[str]:
-        """将长文本分割成较小的块，确保在句子边界处分割"""
-        if len(text) <= max_length:
+    def split_long_text(self, text: str, max_tokens: int = 3000, overlap_tokens: Optional[int] = None) -> List[str]:
+        """将长文本分割成不超过 max_tokens 的块，在行和句子边界处分割"""
+        if count_tokens(text) <= max_tokens:
             return [text]
-        
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        # 按句子分割文本
-        sentences = text.replace('\r', '').split('\n')
-        for sentence in sentences:
-            # 如果单个句子就超过了最大长度，需要强制分割
-            if len(sentence) > max_length:
-                if current_chunk:
-                    chunks.append('\n'.join(current_chunk))
-                    current_chunk = []
-                    current_length = 0
-                
-                # 按字符数分割长句子
-                for i in range(0, len(sentence), max_length):
-                    chunk = sentence[i:i + max_length]
-                    chunks.append(chunk)
-                continue
-            
-            # 检查添加当前句子是否会超过最大长度
-            if current_length + len(sentence) + 1 > max_length:
-                chunks.append('\n'.join(current_chunk))
-                current_chunk = [sentence]
-                current_length = len(sentence)
-            else:
-                current_chunk.append(sentence)
-                current_length += len(sentence) + 1
-        
-        # 添加最后一个块
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
-        
-        return chunks
+        return [chunk.text for chunk in iter_chunks(text.replace('\r', '').split('\n'), max_tokens, overlap_tokens,
+                                                     split_on_headings=False)]
 
     def parse_outline_json(self, outline_json: Union[str, dict]) -> Outline:
         """解析大模型返回的JSON格式大纲，转换为Outline结构"""
@@ -337,20 +281,18 @@ class BiddingWorkflow:
             if isinstance(outline_json, str):
                 try:
                     # 记录原始输入
-                    logger.debug("=== Input JSON String ===")
-                    logger.debug(outline_json)
-                    logger.debug("=== End Input JSON String ===")
+                    log_payload(logger, "outline_json", outline_json)
                     
                     data = json.loads(outline_json)
                     logger.debug("Successfully parsed JSON string")
                 except json.JSONDecodeError as e:
                     logger.error(f"Invalid JSON response: {e}")
-                    logger.debug(f"Problematic JSON: {outline_json}")
+                    logger.debug(f"Problematic JSON: {truncate_payload(outline_json)}")
                     raise
             else:
                 data = outline_json
             
-            logger.debug(f"Parsing outline data: {json.dumps(data, ensure_ascii=False)}")
+            log_payload(logger, "outline_data", data)
             
             # 验证必要的字段
             if not isinstance(data, dict):
@@ -401,15 +343,21 @@ class BiddingWorkflow:
             logger.error(f"Error parsing outline JSON: {e}", exc_info=True)
             raise
 
-    def generate_content_prompt(self, section: OutlineNode, context: str) -> str:
+    def generate_content_prompt(self, node_id: str, context: str) -> str:
         """生成内容生成阶段的prompt"""
-        return Prompts.CONTENT_PROMPT.format(
-            tech_content=self.tech_content,
-            score_content=self.score_content,
-            outline=self.outline_to_markdown(),
-            context=context,
-            section_title=section.title,
-            content_desc=section.content_desc
+        index = self.outline_index
+        node = index.node(node_id)
+        prompt = Prompts.CONTENT_CONTEXT_USER.format(
+            tech_req_md=self.tech_content,
+            scoring_criteria_md=self.score_content,
+            full_outline_md=self.outline_to_markdown()
+        )
+        if context:
+            prompt += Prompts.CONTENT_NEIGHBOUR_USER.format(neighbour_context=context)
+        return prompt + Prompts.CONTENT_SECTION_USER.format(
+            title=index.titles[node],
+            content_summary=index.summaries[node] or "",
+            min_chars=Config.SECTION_TARGET_CHARS
         )
 
     def outline_to_markdown(self) -> str:
@@ -428,40 +376,13 @@ class BiddingWorkflow:
         
         return "\n".join(result)
 
-    def get_context_for_section(self, current_section: OutlineNode) -> str:
-        """获取当前章节的相关上下文内容"""
-        context_parts = []
-        
-        # 获取当前章节的父章节路径
-        parent_titles = []
-        current_level = current_section.level
-        
-        def find_parents(node: OutlineNode, target: OutlineNode, path: List[str]):
-            if node == target:
-                return True
-            for child in node.children:
-                if find_parents(child, target, path):
-                    path.append(node.title)
-                    return True
-            return False
-        
-        if self.outline:
-            find_parents(self.outline, current_section, parent_titles)
-        
-        # 获取相关的已生成内容
-        for title in parent_titles:
-            if title in self.generated_contents:
-                context_parts.append(f"## {title}\n{self.generated_contents[title]}\n")
-        
-        # 限制上下文长度
-        max_context_length = 2000
-        context = "\n".join(context_parts)
-        if len(context) > max_context_length:
-            context = context[-max_context_length:]
-        
-        return context
+    def get_context_for_section(self, node_id: str) -> str:
+        """获取当前小节的相邻上下文：已完成的前序兄弟小节和上一节小节的摘要"""
+        if self.context_assembler is None:
+            return ""
+        return self.context_assembler.build(self.outline_index.node(node_id))
 
-    def save_outline(self):
+    async def save_outline(self):
         """保存大纲到文件"""
         if not self.outline:
             logger.error("No outline to save")
@@ -470,50 +391,45 @@ class BiddingWorkflow:
         try:
             # 保存JSON格式
             outline_dict = self.outline.to_dict()
-            json_path = Config.OUTLINE_DIR / 'outline.json'
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(outline_dict, f, ensure_ascii=False, indent=2)
+            json_path = self.workspace.outline_json
+            await storage.write_json_async(json_path, outline_dict)
             logger.info(f"Saved outline JSON to {json_path}")
             
             # 保存Markdown格式（用于展示）
             md_content = self.outline_to_markdown()
-            md_path = Config.OUTLINE_DIR / 'outline.md'
-            with open(md_path, 'w', encoding='utf-8') as f:
-                f.write(md_content)
+            md_path = self.workspace.outline_md
+            await storage.write_text_async(md_path, md_content)
             logger.info(f"Saved outline markdown to {md_path}")
             
         except Exception as e:
             logger.error(f"Error saving outline: {e}", exc_info=True)
             raise
 
-    def save_content(self, section_title: str, content: str):
-        """保存生成的内容"""
+    async def save_content(self, section_title: str, content: str):
+        """保存生成的内容（写入小节片段，content.md 由 _save_results_async 统一拼装）"""
+        is_new = section_title not in self.generated_contents
         self.generated_contents[section_title] = content
         
-        # 将所有内容按顺序写入一个文件
-        content_file = Config.OUTPUT_DIR / 'content.md'
-        
-        # 如果是第一个章节，先写入大纲
+        # 如果是第一个章节，骨架以大纲开头
         if len(self.generated_contents) == 1:
-            with open(content_file, 'w', encoding='utf-8') as f:
-                f.write("# 技术方案\n\n")
-                f.write(self.outline_to_markdown())
-                f.write("\n\n## 详细内容\n\n")
+            await self.document_store.reset([
+                text_entry("# 技术方案\n\n" + self.outline_to_markdown() + "\n\n## 详细内容\n\n")
+            ])
         
-        # 追加新内容
-        with open(content_file, 'a', encoding='utf-8') as f:
-            f.write(f"### {section_title}\n\n")
-            f.write(content)
-            f.write("\n\n")
-
-    def count_sections(self, node: OutlineNode) -> int:
-        count = 1 if node.level == 3 else 0
-        for child in node.children:
-            count += self.count_sections(child)
-        return count
+        if is_new:
+            await self.document_store.append_layout([fragment_entry(section_title, section_title)])
+        await self.document_store.put_section(section_title, section_title, content)
+
+    def count_sections(self) -> int:
+        """小节（三级标题）数量"""
+        return self.outline_index.count(level=3)
 
     async def generate_full_content_async(self) -> bool:
         """异步生成完整文档内容"""
+        with span("generate_full_content_async", root=True):
+            return await self._generate_full_content_async()
+
+    async def _generate_full_content_async(self) -> bool:
         start_time = time.time()
         try:
             if not self.outline:
@@ -522,59 +438,111 @@ class BiddingWorkflow:
 
             # logger.info("=== Starting Content Generation ===") # This will be logged right after total_sections
             
-            # 收集所有需要生成的章节
+            # 共享上下文只构造一次
+            context = RunContext.build(self.outline_to_markdown(), self.tech_content, self.score_content)
+
+            # 收集所有需要生成的章节，携带其在大纲中的 (章, 节, 小节) 下标
+            index = self.outline_index
             sections_to_generate = []
-            for chapter in self.outline.body_paragraphs:
-                for section in chapter.sections:
-                    for sub_section in section.sub_sections:
-                        sections_to_generate.append({
-                            'title': sub_section.sub_section_title,
-                            'content_summary': sub_section.content_summary,
-                            'chapter': chapter.chapter_title,
-                            'full_outline_md': self.outline_to_markdown(),
-                            'tech_req_md': self.tech_content,
-                            'scoring_criteria_md': self.score_content
-                        })
+            for position, node in index.iter_subsections():
+                sections_to_generate.append({
+                    'key': position_key(position),
+                    'position': position,
+                    'title': index.titles[node],
+                    'content_summary': index.summaries[node],
+                    'node': node,
+                    'chapter': index.titles[index.path(node)[0]],
+                    'context': context
+                })
+
+            # 评分权重：高分值小节优先生成，输出预算按分值比例分配
+            if Config.SCORE_WEIGHTING_ENABLED:
+                weights = section_weights(index, self.score_content)
+                budgets = token_budgets(weights, Config.MAX_TOKENS, Config.SECTION_MIN_TOKENS)
+                top_weight = max(weights.values(), default=None)
+                for section in sections_to_generate:
+                    budget = budgets[section['node']]
+                    section['weight'] = weights[section['node']]
+                    # 高分值小节用强模型，其余用快速模型（见 Config.MODEL_ROUTES）
+                    section['task'] = section_task(section['weight'], top_weight)
+                    section['max_tokens'] = budget
+                    section['min_chars'] = target_chars(budget, Config.MAX_TOKENS, Config.SECTION_TARGET_CHARS)
+                sections_to_generate.sort(key=lambda section: -section['weight'])
+
+            # 长小节分段并行生成：按要求字数决定段数
+            if Config.SUBCHUNK_ENABLED:
+                for section in sections_to_generate:
+                    min_chars = section.get('min_chars', Config.SECTION_TARGET_CHARS)
+                    if min_chars >= Config.SUBCHUNK_MIN_CHARS:
+                        section['paragraphs'] = min(
+                            Config.SUBCHUNK_MAX_PARAGRAPHS,
+                            max(2, round(min_chars / Config.SUBCHUNK_PARAGRAPH_CHARS))
+                        )
+
+            # 相邻小节上下文：节首先调度，同节后续小节等节首完成后再占用并发名额
+            assembler = None
+            if Config.NEIGHBOUR_CONTEXT_ENABLED:
+                assembler = ContextAssembler(index, Config.NEIGHBOUR_CONTEXT_TOKENS, Config.NEIGHBOUR_SUMMARY_TOKENS)
+                tasks_by_node = {section['node']: section for section in sections_to_generate}
+                sections_to_generate = [tasks_by_node[node] for node in assembler.schedule(list(tasks_by_node))]
+            self.context_assembler = assembler
 
             total_sections = len(sections_to_generate)
             logger.info(f"Starting full content generation for {total_sections} sections.")
+
+            # 写入文档骨架，之后每完成一个小节即落盘为独立片段
+            await self.document_store.reset(self._build_document_layout())
             # logger.info(f"Found {total_sections} sections to generate") # Redundant with the above
 
-            # 使用信号量控制并发LLM请求数量，防止超出API速率限制或本地资源耗尽。
-            # The limit of 15 is chosen to stay within typical free tier API limits (e.g., OpenRouter's ~16.67 req/min)
-            # considering Config.TIMEOUT for each request.
-            semaphore = asyncio.Semaphore(15)
-            
-            async def process_section_with_semaphore(section):
-                async with semaphore:
-                    result = await self.llm_client.generate_section_content_async(section)
-                    # 每次请求后添加很短的延迟
-                    await asyncio.sleep(0.05)  # 50ms 延迟
-                    return result
-
-            # 分批处理任务
-            results = []
-            batch_size = 15  # 每批处理15个请求
-            
-            for i in range(0, len(sections_to_generate), batch_size):
-                batch = sections_to_generate[i:i + batch_size]
-                batch_tasks = [process_section_with_semaphore(section) for section in batch]
-                
-                # 执行当前批次
-                batch_results = await asyncio.gather(*batch_tasks)
-                results.extend(batch_results)
-                
-                # 批次间等待
-                if i + batch_size < len(sections_to_generate):
-                    await asyncio.sleep(0.2)  # 每批次间等待200ms
-                
+            # 并发由进程级调度器控制：所有任务共享 Config.LLM_MAX_CONCURRENCY 个名额，
+            # 多个文档同时生成时按优先级加权轮转分配，不再各自开一个信号量、分批等待
+            completed = 0
+            contents: Dict[str, str] = {}
+
+            async def process_section(section):
+                nonlocal completed
+                content = None
+                try:
+                    if assembler:
+                        with span("dependency_wait", cat="wait", title=section['title']):
+                            await assembler.wait_for_dependency(section['node'])
+                        section = dict(section, neighbour_context=assembler.build(section['node']))
+                    # 排队时高分值小节的请求先发
+                    with request_priority(section.get('weight', 0.0)):
+                        result = await self.llm_client.generate_section_content_async(section)
+                    if "生成失败" not in result['content']:
+                        content = result['content']
+                finally:
+                    # 无论成败都要解除同节后续小节的等待
+                    if assembler:
+                        assembler.complete(section['node'], content)
+                await self.document_store.put_section(section['key'], result['title'], result['content'])
+                contents[section['key']] = result['content']
+
                 # 进度报告
-                completed = len(results)
-                logger.info(f"Progress: {completed}/{total_sections} sections completed")
-            
-            # 处理结果
-            organized_results = self._organize_results(results, sections_to_generate)
-            success = await self._save_results_async(organized_results)
+                completed += 1
+                if completed % 15 == 0 or completed == total_sections:
+                    logger.info(f"Progress: {completed}/{total_sections} sections completed")
+                return result
+
+            job_name = f"{self.workspace.project_id}:content"
+            with get_scheduler().job(job_name, self.priority):
+                with span("generate_sections", cat="wait", size=total_sections):
+                    results = await asyncio.gather(*(process_section(section) for section in sections_to_generate))
+                # 查重和覆盖检查是附加步骤，失败时只记录日志，已生成的小节照常拼装
+                if Config.DEDUP_ENABLED:
+                    try:
+                        await self._deduplicate_sections(sections_to_generate, contents)
+                    except Exception as e:
+                        logger.error(f"Duplicate check failed: {e}", exc_info=True)
+                if Config.COVERAGE_ENABLED:
+                    try:
+                        await self._check_coverage(sections_to_generate, contents)
+                    except Exception as e:
+                        logger.error(f"Coverage check failed: {e}", exc_info=True)
+            
+            # 拼装完整文档
+            success = await self._save_results_async()
             
             success_count = 0
             if success: # Only count if saving was generally successful
@@ -591,86 +559,144 @@ class BiddingWorkflow:
             logger.error(f"Error generating content: {e}")
             return False
 
-    def _organize_results(self, results: List[Dict], sections: List[Dict]) -> Dict:
+    async def _deduplicate_sections(self, sections: List[Dict], contents: Dict[str, str]):
         """
-        将从LLM获取的扁平化章节内容结果列表 (results) 与原始章节信息列表 (sections) 结合，
-        按章节标题 (chapter) 进行分组。
-        这使得后续能够按原始大纲的章节顺序来保存和组织生成的文档内容。
+        检测跨小节的近似重复段落，写出报告（duplicates.json）
+
+        Config.DEDUP_REGENERATE_ROUNDS > 0 时，每轮只重新生成重复双方中排序靠后的小节
+        （高分值、大纲靠前的小节保留），并在提示词中列出需要避开的段落。
         """
-        organized = {}
-        for result, section in zip(results, sections):
-            chapter = section['chapter']
-            if chapter not in organized:
-                organized[chapter] = []
-            organized[chapter].append(result)
-        return organized
-
-    async def _save_results_async(self, organized_results: Dict) -> bool:
-        """异步保存按章节组织的内容"""
-        try:
-            content_parts = []
-            for chapter, sections in organized_results.items():
-                # 添加章节标题
-                content_parts.append(f"# {chapter}\n\n")
-                
-                # 按二级标题分组
-                section_groups = {}
-                for section in sections:
-                    # 从标题中提取二级标题
-                    # 例如从 "1.1.1 xxx" 中提取 "1.1"
-                    section_number = '.'.join(section['title'].split()[:1][0].split('.')[:2])
-                    section_title = section['title']
-                    
-                    # 找到对应的二级标题文本
-                    section_prefix = section_number + ' '
-                    full_section_title = next(
-                        (title for title in section['title'].split('\n') if title.startswith(section_prefix)),
-                        section_prefix + '未知标题'
-                    )
-                    
-                    if section_number not in section_groups:
-                        section_groups[section_number] = {
-                            'title': full_section_title,
-                            'subsections': []
-                        }
-                    section_groups[section_number]['subsections'].append(section)
-                
-                # 按二级标题顺序输出内容
-                for section_number in sorted(section_groups.keys()):
-                    group = section_groups[section_number]
-                    # 添加二级标题
-                    content_parts.append(f"## {group['title']}\n\n")
-                    # 添加三级标题和内容
-                    for subsection in group['subsections']:
-                        content_parts.append(f"### {subsection['title']}\n\n{subsection['content']}\n\n")
-            
-            content = "\n".join(content_parts)
-            
-            with open(Config.OUTPUT_DIR / 'content.md', 'w', encoding='utf-8') as f:
-                f.write(content)
-            
+        # 保留优先级：评分权重高者优先，同权重按大纲顺序
+        order = [s['key'] for s in sorted(sections, key=lambda s: (-s.get('weight', 0.0), s['key']))]
+        by_key = {section['key']: section for section in sections}
+        loop = asyncio.get_running_loop()
+
+        pairs = []
+        for round_number in range(Config.DEDUP_REGENERATE_ROUNDS + 1):
+            with span("detect_duplicates", round=round_number):
+                pairs = await loop.run_in_executor(None, find_duplicates, list(contents.items()))
+            if not pairs or round_number == Config.DEDUP_REGENERATE_ROUNDS:
+                break
+            offenders = sections_to_regenerate(pairs, order)
+            logger.info(f"Regenerating {len(offenders)} sections with duplicated paragraphs (round {round_number + 1})")
+            await asyncio.gather(*(
+                self._regenerate_section(by_key[key], contents, avoid_content=self._bullet_list(duplicates))
+                for key, duplicates in offenders.items()
+            ))
+
+        if pairs:
+            logger.warning(f"{len(pairs)} near-duplicate paragraph pairs across sections, see {self.workspace.duplicates_file}")
+        await storage.write_json_async(self.workspace.duplicates_file, [pair.to_dict() for pair in pairs])
+
+    async def _check_coverage(self, sections: List[Dict], contents: Dict[str, str]):
+        """
+        检查技术要求和评分项在大纲与正文中的覆盖情况，写出覆盖矩阵（coverage.json）
+
+        Config.COVERAGE_REGENERATE 开启时，正文未覆盖的需求交给最相关的小节重新生成一次。
+        """
+        requirements = parse_requirements(self.tech_content, self.score_content)
+        if not requirements:
+            return
+        outline = outline_documents(self.outline_index)
+        by_key = {section['key']: section for section in sections}
+        loop = asyncio.get_running_loop()
+
+        def analyze():
+            content = [(key, by_key[key]['title'], contents[key]) for key in sorted(contents)]
+            return analyze_coverage(requirements, outline, content)
+
+        with span("check_coverage", size=len(requirements)):
+            report = await loop.run_in_executor(None, analyze)
+        assignments = sections_to_cover(report)
+        if assignments and Config.COVERAGE_REGENERATE:
+            logger.info(f"Regenerating {len(assignments)} sections to cover {len(report['uncovered']['content'])} requirements")
+            await asyncio.gather(*(
+                self._regenerate_section(by_key[key], contents, must_cover=self._bullet_list(texts))
+                for key, texts in assignments.items()
+            ))
+            with span("check_coverage", size=len(requirements)):
+                report = await loop.run_in_executor(None, analyze)
+
+        uncovered = report['uncovered']
+        if uncovered['outline'] or uncovered['content']:
+            logger.warning(f"Uncovered requirements: {len(uncovered['outline'])} in outline, "
+                           f"{len(uncovered['content'])} in content, see {self.workspace.coverage_file}")
+        await storage.write_json_async(self.workspace.coverage_file, report)
+
+    async def _regenerate_section(self, section: Dict, contents: Dict[str, str], **extra):
+        """带附加提示（avoid_content / must_cover）重新生成一个小节，失败时保留原内容"""
+        section = dict(section, **extra)
+        if self.context_assembler:
+            section['neighbour_context'] = self.context_assembler.build(section['node'])
+        with request_priority(section.get('weight', 0.0)):
+            result = await self.llm_client.generate_section_content_async(section)
+        if "生成失败" not in result['content']:
+            contents[section['key']] = result['content']
+            await self.document_store.put_section(section['key'], result['title'], result['content'])
+
+    @staticmethod
+    def _bullet_list(texts: List[str]) -> str:
+        """在 Config.REGENERATE_HINT_TOKENS 内逐条列出附加到提示词中的段落或要求"""
+        lines = []
+        remaining = Config.REGENERATE_HINT_TOKENS
+        for text in texts:
+            text = truncate_to_tokens(text, remaining)
+            if not text:
+                break
+            lines.append(f"- {text}")
+            remaining -= count_tokens(text)
+        return "\n".join(lines)
+
+    def _build_document_layout(self) -> List[Dict]:
+        """
+        按大纲顺序一次遍历构造文档骨架：章、节标题文本和小节片段引用。
+        小节按 (章, 节, 小节) 下标定位，不再从标题文本中解析编号。
+        """
+        index = self.outline_index
+        layout = []
+        for node, level in enumerate(index.levels):
+            if level == 1:
+                layout.append(text_entry(f"# {index.titles[node]}\n\n"))
+            elif level == 2:
+                layout.append(text_entry(f"## {index.titles[node]}\n\n"))
+            else:
+                layout.append(fragment_entry(index.node_id(node), index.titles[node]))
+        return layout
+
+    async def _save_results_async(self) -> bool:
+        """按文档骨架拼装已落盘的小节片段，原子写入 content.md"""
+        with span("_save_results_async", cat="io"):
+            try:
+                await self.document_store.write_document(self.workspace.content_file)
+            except Exception as e:
+                logger.error(f"Error saving results: {e}")
+                return False
+            if Config.SEARCH_INDEX_ENABLED:
+                await self._index_document()
             return True
-        except Exception as e:
-            logger.error(f"Error saving results: {e}")
-            return False
 
-    def save_outline_json(self, outline_json: str):
+    async def _index_document(self):
+        """把本项目的小节增量写入全文检索索引；索引失败不影响文档保存"""
+        with span("index_document", cat="io"):
+            try:
+                loop = asyncio.get_running_loop()
+                stats = await loop.run_in_executor(None, index_document_store, self.workspace.project_id, self.document_store)
+                logger.info(f"Search index updated for {self.workspace.project_id}: {stats}")
+            except Exception as e:
+                logger.warning(f"Failed to update search index: {e}")
+
+    async def save_outline_json(self, outline_json: str):
         """保存大纲 JSON 到文件"""
         try:
-            # 确保输出目录存在
-            Config.OUTLINE_DIR.mkdir(parents=True, exist_ok=True)
-            
-            # 保存 JSON 文件
-            json_file = Config.OUTLINE_DIR / 'outline.json'
-            with open(json_file, 'w', encoding='utf-8') as f:
-                f.write(outline_json)
+            # 保存 JSON 文件（原子写入，会自动创建输出目录）
+            json_file = self.workspace.outline_json
+            await storage.write_text_async(json_file, outline_json)
             logger.info(f"Saved outline JSON to {json_file}")
             
             # 同时保存一个 Markdown 格式的版本，方便查看
-            md_file = Config.OUTLINE_DIR / 'outline.md'
+            md_file = self.workspace.outline_md
             md_content = self._convert_outline_to_markdown(outline_json)
-            with open(md_file, 'w', encoding='utf-8') as f:
-                f.write(md_content)
+            await storage.write_text_async(md_file, md_content)
             logger.info(f"Saved outline Markdown to {md_file}")
             
         except Exception as e:
@@ -704,13 +730,3 @@ class BiddingWorkflow:
         except Exception as e:
             logger.error(f"Error converting outline to markdown: {e}")
             raise
-
-def dict_to_outline(data: dict) -> OutlineNode:
-    node = OutlineNode(
-        title=data['title'],
-        level=data['level'],
-        content_desc=data.get('content_desc')
-    )
-    if data.get('children'):
-        node.children = [dict_to_outline(child) for child in data['children']]
-    return node
\ No newline at end of file
@@ -0,0 +1,126 @@
+# chunker.py
+
+"""
+流式分块
+
+逐行读入文本，用列表缓冲拼块，每行只处理一次，整体为线性复杂度：
+- 块大小按 tokenizer 的真实 token 数计算，与模型上下文上限对应
+- 遇到章节标题（数字、"第"或 # 开头的行）时另起一块，标题作为新块的第一行和块标题
+- 超长的行先按句末标点（。！？!?）拆成句子，仍超长的句子再按 token 截断，不会切在字符中间
+- overlap_tokens > 0 时，新块开头重复上一块末尾不超过该 token 数的完整句子（不跨章节标题）
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from config import Config
+from tokenizer import get_tokenizer
+
+_SENTENCE_END = re.compile(r'(?<=[。！？!?])')
+
+
+@dataclass
+class Chunk:
+    text: str
+    title: str
+    tokens: int
+
+
+def is_heading(line: str) -> bool:
+    """与原分块逻辑一致：以数字、"第"或 # 开头的行视为章节标题"""
+    return bool(line) and (line[0].isdigit() or line.startswith('第') or line.startswith('#'))
+
+
+def _split_long(text: str, max_tokens: int, tokenizer) -> Iterator[Tuple[str, int]]:
+    """把超过 max_tokens 的一行拆成句子，仍超长的句子按 token 切段（一次遍历，不反复计数剩余部分）"""
+    for sentence in _SENTENCE_END.split(text):
+        if not sentence:
+            continue
+        tokens = tokenizer.count(sentence)
+        if tokens <= max_tokens:
+            yield sentence, tokens
+            continue
+        # 没有句末标点的长行（如 PDF 导入时合并的行）
+        for piece, piece_tokens in tokenizer.split(sentence, max_tokens):
+            piece = piece.strip()
+            if piece:
+                yield piece, piece_tokens
+
+
+def iter_chunks(lines: Iterable[str], max_tokens: int, overlap_tokens: Optional[int] = None,
+                split_on_headings: bool = True) -> Iterator[Chunk]:
+    """
+    从行迭代器中产出不超过 max_tokens 的块
+
+    Args:
+        lines: 文本行（可以是文件对象等惰性迭代器）
+        max_tokens: 每块的 token 上限
+        overlap_tokens: 相邻块重叠的 token 数，默认取 Config.CHUNK_OVERLAP_TOKENS
+        split_on_headings: 是否在章节标题处另起一块
+    """
+    if overlap_tokens is None:
+        overlap_tokens = Config.CHUNK_OVERLAP_TOKENS
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    tokenizer = get_tokenizer()
+
+    # 缓冲区中的单元：(文本, token 数, 是否为新行的开头)
+    units: List[Tuple[str, int, bool]] = []
+    used = 0
+    title = ""
+
+    def emit() -> Optional[Chunk]:
+        parts = []
+        for text, _, new_line in units:
+            if parts and new_line:
+                parts.append('\n')
+            parts.append(text)
+        text = "".join(parts).strip()
+        return Chunk(text, title, used) if text else None
+
+    def carry() -> Tuple[List[Tuple[str, int, bool]], int]:
+        """上一块末尾用于重叠的单元"""
+        kept, total = [], 0
+        for unit in reversed(units):
+            if total + unit[1] > overlap_tokens:
+                break
+            kept.append(unit)
+            total += unit[1]
+        kept.reverse()
+        if kept:
+            kept[0] = (kept[0][0], kept[0][1], True)
+        return kept, total
+
+    for line in lines:
+        line = line.strip()
+        if split_on_headings and is_heading(line):
+            chunk = emit()
+            if chunk:
+                yield chunk
+            units, used = [], 0
+            title = line
+
+        tokens = tokenizer.count(line)
+        pieces = [(line, tokens)] if tokens <= max_tokens else list(_split_long(line, max_tokens, tokenizer))
+        for index, (text, tokens) in enumerate(pieces):
+            if units and used + tokens > max_tokens:
+                chunk = emit()
+                if chunk:
+                    yield chunk
+                units, used = carry() if overlap_tokens else ([], 0)
+                if used + tokens > max_tokens:
+                    units, used = [], 0
+            units.append((text, tokens, index == 0))
+            used += tokens
+
+    chunk = emit()
+    if chunk:
+        yield chunk
+
+
+def split_text(text: str, max_tokens: int, overlap_tokens: Optional[int] = None,
+               split_on_headings: bool = True) -> List[Chunk]:
+    """把整段文本分块"""
+    if not text:
+        return []
+    return list(iter_chunks(text.splitlines(), max_tokens, overlap_tokens, split_on_headings))
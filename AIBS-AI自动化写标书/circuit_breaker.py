@@ -0,0 +1,182 @@
+# circuit_breaker.py
+
+"""
+按模型熔断
+
+供应商故障时，每个待生成的小节都会各自重试 MAX_RETRIES 次并退避等待，一个不可用的地址要耗上几分钟
+才会放弃，期间还占着并发名额。每个 (API 地址, 模型) 有一个熔断器：
+- closed（正常）：统计最近 Config.CIRCUIT_WINDOW_SECONDS 秒内的请求，失败比例或慢请求比例超过阈值时转为 open
+- open（熔断）：请求立即失败（CircuitOpenError），不再发出网络请求和退避等待；
+  按任务路由时跳过该模型，直接使用备选模型
+- half_open（半开）：熔断 Config.CIRCUIT_OPEN_SECONDS 秒后放行少量试探请求，成功则恢复 closed，失败则重新 open
+
+429 限流由重试逻辑按 Retry-After 等待，不计入失败。
+Config.CIRCUIT_BREAKER_ENABLED 为 False 时仍统计健康状况，但不拦截请求。
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，请求未发出"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit for {name} is open")
+        self.name = name
+
+
+class Attempt:
+    """一次请求在熔断器中的记账，只记录一次结果"""
+
+    def __init__(self, breaker: 'CircuitBreaker', probe: bool):
+        self.breaker = breaker
+        self.probe = probe
+        self.started = breaker.clock()
+        self.finished = False
+
+    def start(self):
+        """实际发出请求时调用，耗时从这里开始计算（不含排队等待并发名额的时间）"""
+        self.started = self.breaker.clock()
+
+    def succeed(self):
+        self._finish(True)
+
+    def fail(self):
+        self._finish(False)
+
+    def release(self):
+        """不计入统计（如 429 限流、请求被取消），只归还试探名额"""
+        self._finish(None)
+
+    def _finish(self, ok: Optional[bool]):
+        if not self.finished:
+            self.finished = True
+            self.breaker._record(self, ok, self.breaker.clock() - self.started)
+
+
+class CircuitBreaker:
+    """单个 (API 地址, 模型) 的熔断器"""
+
+    def __init__(self, name: str, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.probes = 0  # 进行中的试探请求数
+        # 最近请求：(完成时间, 是否失败, 是否慢请求)
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+
+    def acquire(self) -> Optional[Attempt]:
+        """申请发出一次请求，熔断中返回 None"""
+        if self.state == OPEN and self.clock() - self.opened_at >= Config.CIRCUIT_OPEN_SECONDS:
+            self.state = HALF_OPEN
+            logger.info(f"Circuit for {self.name} is half-open, probing")
+        enforce = Config.CIRCUIT_BREAKER_ENABLED
+        if self.state == OPEN:
+            return None if enforce else Attempt(self, probe=False)
+        if self.state == HALF_OPEN:
+            if enforce and self.probes >= Config.CIRCUIT_HALF_OPEN_PROBES:
+                return None
+            self.probes += 1
+            return Attempt(self, probe=True)
+        return Attempt(self, probe=False)
+
+    @property
+    def available(self) -> bool:
+        """是否可能放行请求（路由时用来跳过熔断中的模型）"""
+        if not Config.CIRCUIT_BREAKER_ENABLED or self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return self.clock() - self.opened_at >= Config.CIRCUIT_OPEN_SECONDS
+        return self.probes < Config.CIRCUIT_HALF_OPEN_PROBES
+
+    def _record(self, attempt: Attempt, ok: Optional[bool], latency: float):
+        if attempt.probe:
+            self.probes -= 1
+        if ok is None:
+            return
+        now = self.clock()
+        slow = latency >= Config.CIRCUIT_SLOW_SECONDS
+        self._window.append((now, not ok, slow))
+        self._prune(now)
+        if attempt.probe and self.state == HALF_OPEN:
+            if ok and not slow:
+                self.state = CLOSED
+                self._window.clear()
+                logger.info(f"Circuit for {self.name} closed after successful probe")
+            else:
+                self._open(now, "probe failed")
+        elif self.state == CLOSED:
+            requests, failures, slow_calls = self._counts()
+            if requests >= Config.CIRCUIT_MIN_REQUESTS:
+                if failures / requests >= Config.CIRCUIT_ERROR_RATE:
+                    self._open(now, f"{failures}/{requests} requests failed")
+                elif slow_calls / requests >= Config.CIRCUIT_SLOW_RATE:
+                    self._open(now, f"{slow_calls}/{requests} requests took over {Config.CIRCUIT_SLOW_SECONDS}s")
+
+    def _open(self, now: float, reason: str):
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        logger.warning(f"Circuit for {self.name} opened ({reason}), "
+                       f"failing fast for {Config.CIRCUIT_OPEN_SECONDS}s")
+
+    def _prune(self, now: float):
+        while self._window and now - self._window[0][0] > Config.CIRCUIT_WINDOW_SECONDS:
+            self._window.popleft()
+
+    def _counts(self) -> Tuple[int, int, int]:
+        return (len(self._window),
+                sum(1 for _, failed, _ in self._window if failed),
+                sum(1 for _, _, slow in self._window if slow))
+
+    def stats(self) -> Dict:
+        now = self.clock()
+        self._prune(now)
+        requests, failures, slow_calls = self._counts()
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, Config.CIRCUIT_OPEN_SECONDS - (now - self.opened_at)), 1)
+        return {
+            'name': self.name,
+            'state': self.state,
+            'requests': requests,
+            'failures': failures,
+            'slow': slow_calls,
+            'error_rate': round(failures / requests, 3) if requests else 0.0,
+            'retry_in': retry_in,
+            'times_opened': self.times_opened
+        }
+
+
+# (API 地址, 模型) -> 熔断器，进程内所有 LLMClient 共用
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+
+def get_breaker(api_base: str, model: str) -> CircuitBreaker:
+    key = (api_base, model)
+    if key not in _breakers:
+        _breakers[key] = CircuitBreaker(f"{model} @ {api_base}")
+    return _breakers[key]
+
+
+def breaker_stats() -> List[Dict]:
+    """各模型的熔断状态与最近请求的统计"""
+    return [dict(breaker.stats(), api_base=api_base, model=model)
+            for (api_base, model), breaker in _breakers.items()]
+
+
+def reset_breakers():
+    _breakers.clear()
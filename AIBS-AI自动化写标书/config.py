@@ -1,6 +1,5 @@
 import os
 from pathlib import Path
-import logging
 
 class Config:
     BASE_DIR = Path(__file__).parent  # 修改为 bidding 目录
@@ -9,7 +8,9 @@ class Config:
     INPUT_DIR = BASE_DIR / "inputs"  # bidding/inputs
     OUTPUT_DIR = BASE_DIR / "outputs"  # bidding/outputs
     OUTLINE_DIR = OUTPUT_DIR / "outline"  # bidding/outputs/outline
+    SECTIONS_DIR = OUTPUT_DIR / "sections"  # bidding/outputs/sections，按小节存储的正文片段
     LOG_DIR = BASE_DIR / "logs"  # bidding/logs
+    PROJECTS_DIR = BASE_DIR / "projects"  # bidding/projects，默认项目以外的项目工作区
     
     # LLM 配置
     LLM_API_KEY = os.getenv('LLM_API_KEY', 'YOUR_API_KEY_NOT_SET_IN_ENV')
@@ -21,11 +22,23 @@ class Config:
     TEMPERATURE = 0.7
     TOP_P = 0.1
     TIMEOUT = 30  # Default total request timeout for LLM calls in seconds
+    LLM_MAX_CONCURRENCY = 15  # 整个进程同时进行的 LLM 请求上限，所有生成任务共享
+    LLM_COALESCE_ENABLED = True  # 合并同时进行的完全相同的请求（重复点击、多人操作同一项目）
     
     # 重试配置
     RETRY_DELAY = 2
     RETRY_BACKOFF = 1.5
     
+    # 熔断：按 (API 地址, 模型) 统计最近请求，失败或慢请求过多时暂停使用该模型（见 circuit_breaker.py）
+    CIRCUIT_BREAKER_ENABLED = True  # 关闭后仍统计健康状况（/api/llm_health），但不拦截请求
+    CIRCUIT_WINDOW_SECONDS = 60  # 统计窗口
+    CIRCUIT_MIN_REQUESTS = 5  # 窗口内请求数不少于该值才判断是否熔断
+    CIRCUIT_ERROR_RATE = 0.5  # 失败比例不低于该值时熔断
+    CIRCUIT_SLOW_SECONDS = 25  # 耗时不低于该值的请求记为慢请求（请求超时为 TIMEOUT）
+    CIRCUIT_SLOW_RATE = 0.8  # 慢请求比例不低于该值时熔断
+    CIRCUIT_OPEN_SECONDS = 30  # 熔断多久后放行试探请求
+    CIRCUIT_HALF_OPEN_PROBES = 1  # 半开状态同时放行的试探请求数
+    
     # API 配置
     REQUEST_TIMEOUT = 30
     
@@ -35,13 +48,101 @@ class Config:
         'http': "http://127.0.0.1:33210",
         'https': "http://127.0.0.1:33210"  # HTTPS 也使用 HTTP 代理
     }
-
-# 修改日志级别为 DEBUG
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(Config.LOG_DIR / 'app.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-) 
\ No newline at end of file
+    
+    # 相邻小节上下文：生成小节时附带本节及上一节已完成小节的摘要
+    NEIGHBOUR_CONTEXT_ENABLED = True
+    NEIGHBOUR_CONTEXT_TOKENS = 800  # 上下文总预算
+    NEIGHBOUR_SUMMARY_TOKENS = 200  # 每个小节摘要的上限
+    
+    # 对话模式历史：固定消息 + 最近若干轮原文 + 更早轮次的滚动摘要
+    CHAT_HISTORY_TOKENS = 12000  # 每次请求的历史预算
+    CHAT_KEEP_TURNS = 2  # 原样保留的最近轮数
+    CHAT_TURN_SUMMARY_TOKENS = 150  # 单轮摘要上限
+    CHAT_SUMMARY_TOKENS = 1500  # 滚动摘要总上限
+    
+    # 日志配置
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+    LOG_MAX_BYTES = 5 * 1024 * 1024  # app.log 单个文件上限，超出后轮转
+    LOG_BACKUP_COUNT = 3
+    LOG_PAYLOAD_CHARS = 500  # 日志中提示词/响应正文的截断长度
+    LOG_PAYLOAD_SAMPLE_RATE = 0.1  # 记录正文（截断后）的采样比例，其余只记录长度
+    LOG_PAYLOAD_CAPTURE = os.getenv('LOG_PAYLOAD_CAPTURE', '0') == '1'  # 完整正文另存为压缩文件
+    LOG_PAYLOAD_FILE = LOG_DIR / "payloads.jsonl.gz"
+    
+    # 模型路由：按任务选择模型，列表第一个为首选，其余依次作为失败时的备选（见 model_router.py）
+    # 例：'section_low': [{'model': 'qwen/qwen-2.5-7b-instruct'}, {'model': LLM_MODEL}]
+    #     'section_high': [{'model': 'gpt-4o', 'api_base': 'https://api.openai.com/v1', 'api_key_env': 'OPENAI_API_KEY'}]
+    MODEL_ROUTES = {
+        'outline': [],
+        'section_high': [],
+        'section_low': [],
+        'chat': [],
+        'repair': [],
+        'plan': [],
+    }
+    SECTION_HIGH_TIER_RATIO = 0.6  # 评分权重不低于最高权重该比例的小节走 section_high
+    
+    # 评分权重：按 score.md 分值排定小节生成顺序并分配输出 token 预算
+    SCORE_WEIGHTING_ENABLED = True
+    SECTION_MIN_TOKENS = 2048  # 低分值小节的 max_tokens 下限（上限为 MAX_TOKENS）
+    SECTION_TARGET_CHARS = 5000  # 最高分值小节要求的正文字数，其余小节按预算比例缩减
+    
+    # 长小节分段并行生成：先用一次快速调用拟定段落提纲，再并发生成各段并按顺序拼接
+    SUBCHUNK_ENABLED = False
+    SUBCHUNK_MIN_CHARS = 3000  # 要求字数不低于该值的小节才分段
+    SUBCHUNK_PARAGRAPH_CHARS = 1000  # 每段的目标字数，据此决定段数
+    SUBCHUNK_MAX_PARAGRAPHS = 6
+    SUBCHUNK_PLAN_TOKENS = 1024  # 提纲调用的 max_tokens
+    
+    # 跨小节近似重复检测（字符 n-gram + MinHash LSH），结果写入 outputs/duplicates.json
+    DEDUP_ENABLED = True
+    DEDUP_REGENERATE_ROUNDS = 0  # 检测后重新生成重复小节的轮数，0 表示只报告
+    DEDUP_SHINGLE_SIZE = 5  # 字符 n-gram 长度
+    DEDUP_NUM_PERM = 64  # MinHash 哈希函数个数
+    DEDUP_BANDS = 16  # LSH 分带数（每带 DEDUP_NUM_PERM / DEDUP_BANDS 行）
+    DEDUP_THRESHOLD = 0.5  # 段落 Jaccard 相似度不低于该值视为重复
+    DEDUP_MIN_CHARS = 50  # 短于该字数的段落不参与检测
+    
+    # 需求覆盖检查（BM25），结果写入 outputs/coverage.json
+    COVERAGE_ENABLED = True
+    COVERAGE_TOP_K = 3  # 每条需求列出的最相关小节数
+    # 需求的词（按 IDF 加权）在相关小节中出现的比例不低于该值视为已覆盖；大纲只有标题和内容边界，阈值较低
+    COVERAGE_MIN_RATIO = {'outline': 0.3, 'content': 0.5}
+    COVERAGE_REGENERATE = False  # 是否让最相关的小节重新生成，补充未覆盖的需求
+    REGENERATE_HINT_TOKENS = 600  # 重新生成时提示词中列出的重复段落或未覆盖要求的 token 上限
+    
+    # 历史标书全文检索（SQLite FTS5），每次拼装 content.md 时增量索引
+    SEARCH_INDEX_ENABLED = True
+    SEARCH_INDEX_FILE = PROJECTS_DIR / "search.db"  # 跨项目的全文索引，放在项目工作区目录下
+    SEARCH_SNIPPET_CHARS = 120  # 检索结果片段长度
+    
+    # 页面轮询接口的响应缓存：按文件修改时间/文档版本失效，支持 ETag/304 和 gzip/br 压缩
+    HTTP_CACHE_MAX_ENTRIES = 64  # 内存中缓存的响应体个数（按最近使用淘汰）
+    HTTP_COMPRESS_MIN_BYTES = 1024  # 小于该字节数的响应不压缩
+    HTTP_GZIP_LEVEL = 6
+    
+    # 招标文件导入（PDF 需安装 pypdf）：上传流式写盘，在工作进程中逐页抽取文本
+    INGEST_MAX_BYTES = 200 * 1024 * 1024  # 上传文件大小上限（其余接口仍受 MAX_CONTENT_LENGTH 限制）
+    INGEST_BODY_TIMEOUT = 600  # 接收上传内容的超时时间（秒）
+    INGEST_WRITE_BUFFER = 1024 * 1024  # 攒够该字节数写一次盘
+    INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', max(1, min(4, (os.cpu_count() or 2) - 1))))
+    INGEST_PAGES_PER_TASK = 16  # PDF 每个解析任务的页数
+    JOB_HISTORY = 50  # 内存中保留的已结束后台任务数
+    
+    # Word 导出：按小节流式写入 docx；安装 mermaid-cli（npm i -g @mermaid-js/mermaid-cli）后 mermaid 图表渲染为图片
+    DOCX_TOC = True  # 文档开头插入目录域
+    DOCX_MERMAID_CLI = os.getenv('MERMAID_CLI', 'mmdc')  # 为空时不渲染，保留图表源码
+    DOCX_MERMAID_TIMEOUT = 60  # 单个图表的渲染超时（秒）
+    
+    # spaCy 后处理进程池：每个工作进程各加载一份模型（trf 模型约占数百 MB 内存），0 表示在线程中解析
+    NLP_WORKERS = int(os.getenv('NLP_WORKERS', max(1, min(4, (os.cpu_count() or 2) - 1))))
+    NLP_BATCH_SIZE = 32  # nlp.pipe 的批大小
+    
+    # 分词与分块：estimate 为不依赖模型的估算，tiktoken:<encoding> 按模型编码精确计数（需安装 tiktoken）
+    TOKENIZER = os.getenv('TOKENIZER', 'estimate')
+    CHUNK_OVERLAP_TOKENS = 0  # 长文本分块时相邻块重叠的 token 数
+    
+    # 链路追踪配置（导出 Chrome trace-event JSON，可用 Perfetto 打开）
+    TRACE_ENABLED = os.getenv('TRACE_ENABLED', '0') == '1'
+    TRACE_DIR = LOG_DIR / "traces"  # bidding/logs/traces
+ 
\ No newline at end of file
@@ -0,0 +1,111 @@
+# context_assembler.py
+
+"""
+相邻小节上下文组装
+
+每个小节生成完成后做一次抽取式摘要（取各段首句，限制在固定 token 数内）并缓存；
+生成后续小节时，按"同节中已完成的前序兄弟小节 → 上一节已完成的小节"的优先级，
+在 token 预算内挑选摘要，按大纲顺序拼成上下文，放进提示词。
+
+调度上只让同一节的后续小节等待本节首个小节（节首）完成：
+各节的节首之间互不依赖、全部并行，整次生成的依赖链长度为 2，不会退化成逐节串行。
+"""
+
+import asyncio
+import logging
+import re
+from typing import Dict, List, Optional
+
+from outline import OutlineIndex
+from tokenizer import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])')
+
+
+def extractive_summary(text: str, max_tokens: int) -> str:
+    """抽取式摘要：依次取每段的首句，直到达到 token 上限"""
+    sentences = []
+    used = 0
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip().lstrip('#').strip()
+        if not paragraph:
+            continue
+        first = next((s.strip() for s in _SENTENCE_END.split(paragraph) if s.strip()), "")
+        tokens = count_tokens(first)
+        if used + tokens > max_tokens:
+            if not sentences:
+                sentences.append(truncate_to_tokens(first, max_tokens))
+            break
+        sentences.append(first)
+        used += tokens
+    return "".join(sentences)
+
+
+class ContextAssembler:
+    """为每个小节组装已完成相邻小节的摘要上下文"""
+
+    def __init__(self, index: OutlineIndex, budget_tokens: int, summary_tokens: int):
+        self.index = index
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        # 节点下标 -> 摘要，每个小节只摘要一次
+        self._summaries: Dict[int, str] = {}
+        # 节点下标 -> 完成事件
+        self._done: Dict[int, asyncio.Event] = {}
+
+    def _event(self, node: int) -> asyncio.Event:
+        if node not in self._done:
+            self._done[node] = asyncio.Event()
+        return self._done[node]
+
+    def dependency(self, node: int) -> Optional[int]:
+        """生成该小节前需要等待的小节：本节的节首（节首自身无依赖）"""
+        first = self.index.siblings(node)[0]
+        return None if first == node else first
+
+    def schedule(self, nodes: List[int]) -> List[int]:
+        """调度顺序：先全部节首，再其余小节，各自保持传入的顺序（大纲顺序或评分权重顺序）"""
+        leads = [node for node in nodes if self.dependency(node) is None]
+        followers = [node for node in nodes if self.dependency(node) is not None]
+        return leads + followers
+
+    async def wait_for_dependency(self, node: int):
+        dependency = self.dependency(node)
+        if dependency is not None:
+            await self._event(dependency).wait()
+
+    def complete(self, node: int, content: Optional[str]):
+        """记录小节完成；生成失败时传入 None，只解除等待，不提供摘要"""
+        if content and node not in self._summaries:
+            self._summaries[node] = extractive_summary(content, self.summary_tokens)
+        self._event(node).set()
+
+    def candidates(self, node: int) -> List[int]:
+        """按优先级排列的候选小节：前序兄弟（由近及远），然后上一节的小节（由近及远）"""
+        index = self.index
+        siblings = index.siblings(node)
+        position = index.positions[node][-1]
+        result = list(reversed(siblings[:position]))
+        previous_section = index.previous_sibling(index.parents[node])
+        if previous_section is not None:
+            result.extend(reversed(index.children[previous_section]))
+        return result
+
+    def build(self, node: int) -> str:
+        """在 token 预算内拼装已完成相邻小节的摘要，按大纲顺序输出"""
+        chosen = []
+        remaining = self.budget_tokens
+        for candidate in self.candidates(node):
+            summary = self._summaries.get(candidate)
+            if not summary:
+                continue
+            entry = f"{self.index.titles[candidate]}：{summary}"
+            tokens = count_tokens(entry)
+            if tokens > remaining:
+                continue
+            chosen.append((candidate, entry))
+            remaining -= tokens
+        chosen.sort()
+        return "\n".join(entry for _, entry in chosen)
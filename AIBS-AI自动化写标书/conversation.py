@@ -0,0 +1,96 @@
+# conversation.py
+
+"""
+对话模式的历史管理
+
+按顺序逐段生成时，每次请求都会带上完整对话历史，不加控制时提示词随段数线性增长、
+总 token 呈平方增长。ConversationHistory 在 token 预算内组装消息：
+- 固定消息（system、背景信息初始化那一轮）始终保留
+- 最近 keep_turns 轮原样保留
+- 更早的轮次在移出窗口时做一次抽取式摘要并缓存，合并为一条滚动摘要消息
+这样长时间顺序生成时，每次请求的提示词大小基本恒定。
+"""
+
+import logging
+from typing import Dict, List
+
+from context_assembler import extractive_summary
+from tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationHistory:
+    """带 token 预算的对话历史"""
+
+    def __init__(self, budget_tokens: int, keep_turns: int, turn_summary_tokens: int, summary_tokens: int):
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        self.turn_summary_tokens = turn_summary_tokens
+        self.summary_tokens = summary_tokens
+        self.pinned: List[Dict] = []
+        # 尚未摘要的轮次，每轮为若干条消息（user 及其 assistant 回复）
+        self.turns: List[List[Dict]] = []
+        # 已移出窗口的轮次摘要，按时间顺序，每轮只摘要一次
+        self.summaries: List[str] = []
+
+    def start(self, system_role: str):
+        self.pinned = [{"role": "system", "content": system_role}]
+        self.turns = []
+        self.summaries = []
+
+    def add(self, role: str, content: str):
+        """追加一条消息；user 消息开启新的一轮"""
+        message = {"role": role, "content": content}
+        if role == "user" or not self.turns:
+            self.turns.append([message])
+        else:
+            self.turns[-1].append(message)
+
+    def pin_last_turn(self):
+        """把最近一轮固定下来（如背景信息初始化），之后不会被摘要或丢弃"""
+        if self.turns:
+            self.pinned.extend(self.turns.pop())
+
+    def discard_last_message(self):
+        """撤销最后一条消息（请求失败时移除未得到回复的 user 消息）"""
+        if self.turns:
+            self.turns[-1].pop()
+            if not self.turns[-1]:
+                self.turns.pop()
+
+    @staticmethod
+    def _tokens(messages: List[Dict]) -> int:
+        return sum(count_tokens(message['content']) for message in messages)
+
+    def _summarize_oldest_turn(self):
+        turn = self.turns.pop(0)
+        title = next((m['content'] for m in turn if m['role'] == 'user'), "")
+        title = title.strip().split('\n')[0][:50]
+        reply = "\n".join(m['content'] for m in turn if m['role'] == 'assistant')
+        self.summaries.append(f"{title}：{extractive_summary(reply, self.turn_summary_tokens)}")
+
+    def _summary_message(self) -> List[Dict]:
+        """由近及远选取不超过 summary_tokens 的摘要，按时间顺序合并为一条消息"""
+        chosen = []
+        remaining = self.summary_tokens
+        for summary in reversed(self.summaries):
+            tokens = count_tokens(summary)
+            if tokens > remaining:
+                break
+            chosen.append(summary)
+            remaining -= tokens
+        if not chosen:
+            return []
+        chosen.reverse()
+        return [{"role": "system", "content": "此前已完成内容的摘要：\n" + "\n".join(chosen)}]
+
+    def messages(self) -> List[Dict]:
+        """组装本次请求的消息列表"""
+        # 超出保留轮数的轮次先摘要；仍超预算时继续摘要，但至少保留当前这一轮
+        while len(self.turns) > self.keep_turns:
+            self._summarize_oldest_turn()
+        while len(self.turns) > 1 and self._tokens(
+                self.pinned + self._summary_message() + [m for turn in self.turns for m in turn]) > self.budget_tokens:
+            self._summarize_oldest_turn()
+        return self.pinned + self._summary_message() + [m for turn in self.turns for m in turn]
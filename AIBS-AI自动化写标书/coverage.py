@@ -0,0 +1,224 @@
+# coverage.py
+
+"""
+需求覆盖检查
+
+把 tech.md 中的每条技术要求和 score.md 中的每个评分项当作一条"需求"，
+在大纲（小节标题 + 内容边界）和已生成的正文上分别建倒排索引，用 BM25 为每条需求找出最相关的小节，
+得到"需求 → 小节"的覆盖矩阵，并标出没有被覆盖的需求。
+
+分词：连续的中文取字符二元组，字母数字串整体作为一个词（小写）。
+是否覆盖：需求的词在最相关的几个小节（Config.COVERAGE_TOP_K）中合计的出现比例（按 IDF 加权）
+不低于 Config.COVERAGE_MIN_RATIO 中对应的阈值；一条需求常由相邻的几个小节共同回应。
+只看出现与否而不看 BM25 绝对分值，因为不同需求之间的 BM25 分值不可比。
+
+分词、建索引和查询都在 numpy 中按数组计算，整篇文档也能在一秒内完成，可作为每次生成的检查步骤。
+"""
+
+import math
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from outline import OutlineIndex, position_key
+from score_weights import parse_scoring_items
+
+_ASCII_WORD = re.compile(r'[A-Za-z0-9]+')
+_ITEM_SPLIT = re.compile(r'[:：]')
+
+# 短于该字数的行视为分类标题（如"硬件要求"、"二、技术要求"），不作为需求
+MIN_REQUIREMENT_CHARS = 12
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 词编号：中文二元组为 (前字码位 << 21) | 后字码位，单字为其码位，字母数字词为 _WORD_BASE + crc32
+_WORD_BASE = np.uint64(1 << 62)
+_CJK_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF))
+
+
+def term_ids(text: str) -> np.ndarray:
+    """
+    文本的词编号序列：连续的中文取字符二元组（单字串取单字），字母数字串整体小写
+
+    中文部分整体在 numpy 中按码位计算，不逐字调用 Python 代码。
+    """
+    codes = np.frombuffer((text or "").encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    cjk = np.zeros(len(codes), dtype=bool)
+    for low, high in _CJK_RANGES:
+        cjk |= (codes >= low) & (codes <= high)
+    pairs = cjk[:-1] & cjk[1:]
+    bigrams = ((codes[:-1] << np.uint64(21)) | codes[1:])[pairs]
+    previous = np.concatenate(([False], cjk[:-1]))
+    following = np.concatenate((cjk[1:], [False]))
+    singles = codes[cjk & ~previous & ~following]
+    words = np.fromiter((_WORD_BASE + np.uint64(zlib.crc32(word.lower().encode())) for word in _ASCII_WORD.findall(text or "")),
+                        dtype=np.uint64)
+    return np.concatenate((bigrams, singles, words))
+
+
+@dataclass
+class Requirement:
+    id: str
+    source: str  # tech / score
+    name: str
+    text: str
+    category: Optional[str] = None
+
+
+def parse_requirements(tech_md: str, score_md: str = "") -> List[Requirement]:
+    """解析技术要求条目和评分项"""
+    requirements = []
+    category = None
+    for line in (tech_md or "").splitlines():
+        line = line.strip().lstrip('#>*-').strip()
+        if not line:
+            continue
+        if len(line) < MIN_REQUIREMENT_CHARS:
+            category = line
+            continue
+        name = _ITEM_SPLIT.split(line, 1)[0] if _ITEM_SPLIT.search(line) else line[:MIN_REQUIREMENT_CHARS]
+        requirements.append(Requirement(f"tech-{len(requirements) + 1}", 'tech', name.strip(), line, category))
+
+    for number, item in enumerate(parse_scoring_items(score_md or ""), 1):
+        requirements.append(Requirement(f"score-{number}", 'score', item.name,
+                                        f"{item.name}：{item.description}" if item.description else item.name,
+                                        item.category))
+    return requirements
+
+
+class BM25Index:
+    """
+    小节文本上的倒排索引
+
+    所有 (词, 文档, 词频) 按词编号排序后连续存放，每个词的倒排表是其中一段，
+    并预先算好 BM25 的词频权重；查询时按词取出倒排段，向量化累加分值。
+    """
+
+    def __init__(self, documents: Sequence[Tuple[str, str, str]]):
+        """documents: (key, 标题, 文本) 序列"""
+        self.keys = [key for key, _, _ in documents]
+        self.titles = [title for _, title, _ in documents]
+        per_doc = [np.unique(term_ids(f"{title}\n{text}"), return_counts=True) for _, title, text in documents]
+        lengths = np.array([counts.sum() for _, counts in per_doc], dtype=np.float64)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (lengths.mean() if len(lengths) and lengths.mean() else 1))
+
+        ids = np.concatenate([ids for ids, _ in per_doc]) if per_doc else np.zeros(0, dtype=np.uint64)
+        tfs = np.concatenate([counts for _, counts in per_doc]).astype(np.float64) if per_doc else np.zeros(0)
+        docs = np.repeat(np.arange(len(per_doc)), [len(ids) for ids, _ in per_doc]) if per_doc else np.zeros(0, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        ids, tfs, docs = ids[order], tfs[order], docs[order]
+        self._terms, starts = np.unique(ids, return_index=True)
+        self._bounds = np.append(starts, len(ids))
+        self._docs = docs
+        self._weights = tfs * (BM25_K1 + 1) / (tfs + norms[docs]) if len(docs) else tfs
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def search(self, query: str, top_k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        返回按 BM25 分值从高到低的 [(文档下标, 分值)]，以及这些文档合起来的匹配比例
+
+        匹配比例为查询词在前 top_k 个文档中出现的比例（按 IDF 加权）。
+        """
+        n = len(self)
+        query_terms = np.unique(term_ids(query))
+        positions = np.searchsorted(self._terms, query_terms)
+        found = positions < len(self._terms)
+        found[found] = self._terms[positions[found]] == query_terms[found]
+        positions = positions[found]
+        starts, ends = self._bounds[positions], self._bounds[positions + 1]
+        df = ends - starts
+        idf = np.log((n - df + 0.5) / (df + 0.5) + 1)
+        total = idf.sum() + math.log((n + 0.5) / 0.5 + 1) * int((~found).sum())
+
+        # 把各查询词的倒排段拼成一个下标数组，一次累加出所有文档的分值
+        entries = np.repeat(starts - np.concatenate(([0], np.cumsum(df)[:-1])), df) + np.arange(df.sum())
+        owner = np.repeat(np.arange(len(df)), df)
+        docs = self._docs[entries]
+        scores = np.bincount(docs, weights=self._weights[entries] * idf[owner], minlength=n)
+
+        top = [int(doc) for doc in np.argsort(-scores, kind='stable')[:top_k] if scores[doc] > 0]
+        present = idf[np.unique(owner[np.isin(docs, top)])].sum()
+        return [(doc, float(scores[doc])) for doc in top], (float(present / total) if total else 0.0)
+
+
+@dataclass
+class Coverage:
+    """一条需求在大纲或正文中的覆盖情况"""
+    covered: bool
+    ratio: float
+    matches: List[Dict] = field(default_factory=list)
+
+
+def _cover(index: BM25Index, requirement: Requirement, min_ratio: float) -> Coverage:
+    hits, ratio = index.search(requirement.text, Config.COVERAGE_TOP_K) if len(index) else ([], 0.0)
+    matches = [{'key': index.keys[doc], 'title': index.titles[doc], 'score': round(score, 3)} for doc, score in hits]
+    ratio = round(ratio, 3)
+    return Coverage(ratio >= min_ratio, ratio, matches)
+
+
+def outline_documents(index: OutlineIndex) -> List[Tuple[str, str, str]]:
+    """大纲中每个小节的 (key, 标题, 内容边界)"""
+    return [(position_key(position), index.titles[node], index.summaries[node] or "")
+            for position, node in index.iter_subsections()]
+
+
+def analyze_coverage(requirements: Sequence[Requirement],
+                     outline: Optional[Sequence[Tuple[str, str, str]]] = None,
+                     content: Optional[Sequence[Tuple[str, str, str]]] = None) -> Dict:
+    """
+    计算覆盖矩阵
+
+    Args:
+        requirements: 需求列表（parse_requirements 的结果）
+        outline: 大纲小节 (key, 标题, 内容边界)，见 outline_documents
+        content: 已生成小节 (key, 标题, 正文)
+
+    Returns:
+        {'requirements': [...], 'uncovered': {'outline': [需求 id], 'content': [需求 id]}}
+    """
+    indexes = {}
+    if outline is not None:
+        indexes['outline'] = BM25Index(outline)
+    if content is not None:
+        indexes['content'] = BM25Index(content)
+
+    rows = []
+    uncovered = {name: [] for name in indexes}
+    for requirement in requirements:
+        row = {
+            'id': requirement.id,
+            'source': requirement.source,
+            'name': requirement.name,
+            'text': requirement.text,
+            'category': requirement.category
+        }
+        for name, index in indexes.items():
+            coverage = _cover(index, requirement, Config.COVERAGE_MIN_RATIO[name])
+            row[name] = {'covered': coverage.covered, 'ratio': coverage.ratio, 'matches': coverage.matches}
+            if not coverage.covered:
+                uncovered[name].append(requirement.id)
+        rows.append(row)
+    return {'requirements': rows, 'uncovered': uncovered}
+
+
+def sections_to_cover(report: Dict, target: str = 'content') -> Dict[str, List[str]]:
+    """
+    未覆盖的需求交给最相关的小节补写
+
+    Returns:
+        小节 key -> 需要补充覆盖的需求原文
+    """
+    assignments: Dict[str, List[str]] = defaultdict(list)
+    for row in report['requirements']:
+        coverage = row.get(target)
+        if coverage and not coverage['covered'] and coverage['matches']:
+            assignments[coverage['matches'][0]['key']].append(row['text'])
+    return dict(assignments)
@@ -0,0 +1,157 @@
+# dedup.py
+
+"""
+跨小节近似重复检测
+
+并行生成的小节共享同一份背景信息，常出现几乎逐字重复的段落。这里用字面相似度检测：
+- 每个小节按行切成段落，去掉空白和标点后取字符 n-gram（Config.DEDUP_SHINGLE_SIZE）作为特征集合
+- 对每个段落计算 MinHash 签名，再按 LSH 分带分桶，只有落入同一个桶的段落才成为候选对
+- 候选对用精确的 Jaccard 相似度复核，不低于 Config.DEDUP_THRESHOLD 的记为重复
+
+全文段落只各处理一次，候选对数量与重复程度相关而与段落数的平方无关，可以覆盖整篇文档。
+检测结果可交给工作流，只重新生成重复双方中排序靠后的小节（见 sections_to_regenerate）。
+"""
+
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config import Config
+
+_NON_TEXT = re.compile(r'[\W_]+')
+# 梅森素数 2^31-1，保证 a * hash + b 在 uint64 内不溢出
+_PRIME = np.uint64((1 << 31) - 1)
+
+
+@dataclass
+class DuplicatePair:
+    """两个小节中近似重复的一对段落"""
+    key: str
+    paragraph: int
+    other_key: str
+    other_paragraph: int
+    similarity: float
+    text: str
+    other_text: str
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def split_paragraphs(content: str) -> List[str]:
+    """按行切分段落，去掉标题行和过短的段落"""
+    paragraphs = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if len(_NON_TEXT.sub('', line)) >= Config.DEDUP_MIN_CHARS:
+            paragraphs.append(line)
+    return paragraphs
+
+
+def shingles(text: str, size: Optional[int] = None) -> Set[str]:
+    """去掉空白和标点后的字符 n-gram 集合"""
+    size = size or Config.DEDUP_SHINGLE_SIZE
+    text = _NON_TEXT.sub('', text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """用 num_perm 个形如 (a * x + b) mod p 的哈希函数计算 MinHash 签名"""
+
+    def __init__(self, num_perm: Optional[int] = None, seed: int = 1):
+        self.num_perm = num_perm or Config.DEDUP_NUM_PERM
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(_PRIME), self.num_perm).astype(np.uint64)
+        self.b = rng.randint(0, int(_PRIME), self.num_perm).astype(np.uint64)
+
+    def signature(self, features: Set[str]) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in features), dtype=np.uint64, count=len(features))
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % _PRIME).min(axis=1)
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicates(sections: Iterable[Tuple[str, str]], threshold: Optional[float] = None,
+                    bands: Optional[int] = None) -> List[DuplicatePair]:
+    """
+    检测不同小节之间的近似重复段落
+
+    Args:
+        sections: (小节 key, 正文) 序列
+        threshold: Jaccard 相似度阈值，默认 Config.DEDUP_THRESHOLD
+        bands: LSH 分带数，默认 Config.DEDUP_BANDS；带越多召回越高、候选越多
+
+    Returns:
+        按相似度从高到低排列的重复段落对
+    """
+    threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+    bands = bands or Config.DEDUP_BANDS
+    hasher = MinHasher()
+    rows = max(1, hasher.num_perm // bands)
+
+    # 段落：(小节 key, 段落序号, 原文, 特征集合)
+    paragraphs: List[Tuple[str, int, str, Set[str]]] = []
+    buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+    for key, content in sections:
+        for number, text in enumerate(split_paragraphs(content or "")):
+            features = shingles(text)
+            if not features:
+                continue
+            pid = len(paragraphs)
+            paragraphs.append((key, number, text, features))
+            signature = hasher.signature(features)
+            for band in range(bands):
+                buckets[(band, signature[band * rows:(band + 1) * rows].tobytes())].append(pid)
+
+    candidates: Set[Tuple[int, int]] = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                # 只报告不同小节之间的重复
+                if paragraphs[first][0] != paragraphs[second][0]:
+                    candidates.add((first, second))
+
+    pairs = []
+    for first, second in candidates:
+        key, number, text, features = paragraphs[first]
+        other_key, other_number, other_text, other_features = paragraphs[second]
+        similarity = _jaccard(features, other_features)
+        if similarity >= threshold:
+            pairs.append(DuplicatePair(key, number, other_key, other_number, round(similarity, 3), text, other_text))
+    pairs.sort(key=lambda pair: (-pair.similarity, pair.key, pair.paragraph))
+    return pairs
+
+
+def sections_to_regenerate(pairs: Sequence[DuplicatePair], order: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    决定需要重新生成的小节
+
+    每对重复中保留在 order 里靠前的小节（如高分值或大纲靠前的小节），重新生成另一方。
+
+    Returns:
+        小节 key -> 需要避免重复的段落原文（来自保留的一方）
+    """
+    rank = {key: i for i, key in enumerate(order)}
+    offenders: Dict[str, List[str]] = defaultdict(list)
+    for pair in pairs:
+        if rank.get(pair.key, len(rank)) <= rank.get(pair.other_key, len(rank)):
+            loser, kept_text = pair.other_key, pair.text
+        else:
+            loser, kept_text = pair.key, pair.other_text
+        if kept_text not in offenders[loser]:
+            offenders[loser].append(kept_text)
+    return dict(offenders)
@@ -0,0 +1,307 @@
+# document_store.py
+
+"""
+按小节存储的文档
+
+每个完成的小节立即写成独立的片段文件（原子写入），并在只追加的 index.log 中记一行，
+小节一完成就已落盘；content.md 由文档骨架（layout.json）+ 片段按大纲顺序拼装，
+未变化的片段直接使用内存缓存，重新拼装只需读取变化过的小节。
+生成过程中也可以随时拼装出"目前已完成部分"的文档。
+
+目录结构（默认 outputs/sections/）：
+    layout.json     文档骨架：标题文本与片段引用的有序列表
+    index.log       只追加日志，每行一个 JSON：
+                    {"reset": true, "version", "generation"}  第一行，本轮生成的开始
+                    {"key", "title", "file", "version"}       写入/覆盖一个小节
+                    reset 时整个文件原子替换为新的第一行，日志只记录当前一轮，不会无限增长；
+                    读取方比较第一行的 generation，不同即说明文件已被替换，从头回放
+    <key>.md        小节正文
+
+同一个实例会被多个请求共用（app.py 按项目缓存），refresh 和各读取方法在线程池中执行，
+内存状态（index、layout、日志读取位置）的读写都持有 _state_lock。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+_SAFE_KEY = re.compile(r'^[0-9A-Za-z_.-]+$')
+
+
+def text_entry(text: str) -> Dict:
+    """骨架中的固定文本（章、节标题等）"""
+    return {'type': 'text', 'text': text}
+
+
+def fragment_entry(key: str, title: str) -> Dict:
+    """骨架中的小节片段引用"""
+    return {'type': 'fragment', 'key': key, 'title': title}
+
+
+class DocumentStore:
+    """小节片段存储与文档拼装"""
+
+    def __init__(self, root: os.PathLike):
+        self.root = Path(root)
+        self.layout_file = self.root / 'layout.json'
+        self.index_file = self.root / 'index.log'
+        self.layout: List[Dict] = []
+        self.index: Dict[str, Dict] = {}
+        # 单调递增的版本号，每写入一个小节加一
+        self.version = 0
+        # 最近一次 reset 的版本号，早于它的增量请求需要整体重取
+        self.reset_version = 0
+        # key -> (version, 渲染后的片段文本)
+        self._cache: Dict[str, Tuple[int, str]] = {}
+        self._log_offset = 0
+        # 已读取的 index.log 的 generation（第一行 reset 记录中的随机 ID）
+        self._generation: Optional[str] = None
+        self._layout_mtime = 0.0
+        # 串行化本实例的写操作（协程之间）
+        self._lock = asyncio.Lock()
+        # 保护内存状态（线程之间），可重入：render 内部会调用 _fragment_text
+        self._state_lock = threading.RLock()
+
+    @staticmethod
+    def fragment_filename(key: str) -> str:
+        if _SAFE_KEY.match(key):
+            return f"{key}.md"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.md'
+
+    def _apply(self, entry: Dict):
+        if entry.get('reset'):
+            self.index = {}
+            self.reset_version = entry['version']
+        else:
+            self.index[entry['key']] = entry
+        self.version = max(self.version, entry['version'])
+
+    def refresh(self) -> 'DocumentStore':
+        """
+        同步磁盘上的最新状态
+
+        同一 generation 的 index.log 只追加，因此只需读取上次位置之后新增的行；
+        layout.json 仅在修改时间变化时重新读取。
+        """
+        with self._state_lock:
+            return self._refresh()
+
+    def _refresh(self) -> 'DocumentStore':
+        try:
+            layout_mtime = self.layout_file.stat().st_mtime
+        except FileNotFoundError:
+            layout_mtime = 0.0
+        if layout_mtime != self._layout_mtime:
+            self.layout = json.loads(storage.read_text(self.layout_file)) if layout_mtime else []
+            self._layout_mtime = layout_mtime
+
+        try:
+            with open(self.index_file, 'rb') as f:
+                generation = self._read_generation(f.readline())
+                if generation != self._generation:
+                    # 日志已在 reset 时被替换（或首次读取），从头回放
+                    self._generation = generation
+                    self._log_offset = 0
+                    self.index = {}
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return self
+        # 只消费完整的行，进程中断留下的半行等下次再读
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except (json.JSONDecodeError, KeyError):
+                logger.warning(f"Skipping malformed index line in {self.index_file}")
+        self._log_offset += end
+        return self
+
+    @staticmethod
+    def _read_generation(first_line: bytes) -> Optional[str]:
+        if not first_line.endswith(b'\n'):
+            return None
+        try:
+            return json.loads(first_line).get('generation')
+        except (json.JSONDecodeError, AttributeError):
+            return None
+
+    async def refresh_async(self) -> 'DocumentStore':
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.refresh)
+
+    def _append_log(self, entry: Dict):
+        storage.append_text(self.index_file, json.dumps(entry, ensure_ascii=False) + '\n')
+        self._log_offset = self.index_file.stat().st_size
+
+    async def _locked(self, func, *args):
+        """在线程池中持有 _state_lock 执行 func"""
+        def run():
+            with self._state_lock:
+                return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, run)
+
+    async def reset(self, layout: List[Dict]):
+        """开始新一轮生成：删除旧片段，把日志替换为一条新的 reset 记录，并写入新的骨架"""
+        async with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            await self._locked(self._reset, list(layout))
+
+    def _reset(self, layout: List[Dict]):
+        self._refresh()
+        for entry in self.index.values():
+            try:
+                (self.root / entry['file']).unlink()
+            except FileNotFoundError:
+                pass
+        self.version += 1
+        self._generation = uuid.uuid4().hex
+        entry = {'reset': True, 'version': self.version, 'generation': self._generation}
+        # 用只含本条记录的新文件原子替换旧日志，之前各轮的记录不再保留
+        storage.atomic_write_text(self.index_file, json.dumps(entry) + '\n')
+        self._log_offset = self.index_file.stat().st_size
+        self.reset_version = self.version
+        self.index = {}
+        self._cache = {}
+        self._write_layout(layout)
+
+    async def append_layout(self, entries: List[Dict]):
+        """向骨架末尾追加条目"""
+        async with self._lock:
+            await self._locked(lambda: self._write_layout(self.layout + list(entries)))
+
+    def _write_layout(self, layout: List[Dict]):
+        storage.atomic_write_json(self.layout_file, layout)
+        # 换成新列表而不是原地修改，已交给调用方的骨架不受影响
+        self.layout = layout
+        self._layout_mtime = self.layout_file.stat().st_mtime
+
+    async def put_section(self, key: str, title: str, content: str) -> int:
+        """写入（或覆盖）一个小节片段，返回其版本号"""
+        filename = self.fragment_filename(key)
+        await storage.write_text_async(self.root / filename, content)
+        async with self._lock:
+            return await self._locked(self._put_entry, key, title, filename, content)
+
+    def _put_entry(self, key: str, title: str, filename: str, content: str) -> int:
+        self.version += 1
+        entry = {'key': key, 'title': title, 'file': filename, 'version': self.version}
+        self._append_log(entry)
+        self.index[key] = entry
+        self._cache[key] = (entry['version'], self._render_fragment(title, content))
+        return entry['version']
+
+    @staticmethod
+    def _render_fragment(title: str, content: str) -> str:
+        return f"### {title}\n\n{content}\n\n"
+
+    def _fragment_text(self, key: str) -> Optional[str]:
+        with self._state_lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            cached = self._cache.get(key)
+            if cached and cached[0] == entry['version']:
+                return cached[1]
+            content = storage.read_text(self.root / entry['file'])
+            rendered = self._render_fragment(entry['title'], content)
+            self._cache[key] = (entry['version'], rendered)
+            return rendered
+
+    def sections(self) -> List[Tuple[str, str, str]]:
+        """已完成小节的 (key, 标题, 正文)，按骨架顺序"""
+        with self._state_lock:
+            result = []
+            for item in self.layout:
+                if item['type'] != 'fragment':
+                    continue
+                entry = self.index.get(item['key'])
+                if entry is not None:
+                    result.append((item['key'], entry['title'], storage.read_text(self.root / entry['file'])))
+            return result
+
+    def read_section(self, key: str) -> Optional[Tuple[str, str]]:
+        """读取一个小节的 (标题, 正文)，不经过渲染缓存，供导出等一次性遍历使用"""
+        with self._state_lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            return entry['title'], storage.read_text(self.root / entry['file'])
+
+    async def sections_async(self) -> List[Tuple[str, str, str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.sections)
+
+    def changes_since(self, since: int) -> Dict:
+        """
+        版本 since 之后写入的小节，供页面轮询时增量拉取
+
+        since 早于最近一次 reset（已开始新一轮生成）或晚于当前版本时返回全部小节并标记 full，
+        调用方应丢弃已有内容。骨架较小且可能随生成追加，每次都完整返回。
+        """
+        with self._state_lock:
+            full = since < self.reset_version or since > self.version
+            entries = sorted((entry for entry in self.index.values() if full or entry['version'] > since),
+                             key=lambda entry: entry['version'])
+            return {
+                'version': self.version,
+                'full': full,
+                'layout': self.layout,
+                'sections': [{
+                    'key': entry['key'],
+                    'title': entry['title'],
+                    'version': entry['version'],
+                    'content': storage.read_text(self.root / entry['file'])
+                } for entry in entries]
+            }
+
+    async def changes_since_async(self, since: int) -> Dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.changes_since, since)
+
+    def revision(self) -> Tuple[int, int, float]:
+        """(版本号, 骨架条目数, 骨架修改时间)，任一变化都意味着 render() 的结果可能不同"""
+        with self._state_lock:
+            return self.version, len(self.layout), self._layout_mtime
+
+    def render(self) -> str:
+        """按骨架顺序拼装文档，未完成的小节跳过"""
+        with self._state_lock:
+            parts = []
+            for item in self.layout:
+                if item['type'] == 'text':
+                    parts.append(item['text'])
+                else:
+                    text = self._fragment_text(item['key'])
+                    if text is not None:
+                        parts.append(text)
+            return "\n".join(parts)
+
+    async def render_async(self) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.render)
+
+    async def write_document(self, path: os.PathLike):
+        """拼装并原子写入完整文档（content.md）"""
+        await storage.write_text_async(path, await self.render_async())
+
+    def last_modified(self) -> float:
+        """片段索引最后一次写入的时间戳，用于判断 content.md 是否落后"""
+        try:
+            return self.index_file.stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
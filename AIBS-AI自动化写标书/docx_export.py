@@ -0,0 +1,438 @@
+# docx_export.py
+
+"""
+导出 Word 文档
+
+按文档骨架依次读取小节片段，边转换边写入 docx（zip）中的 word/document.xml：
+- 同一时间内存中只有一个小节的内容，不构造整篇文档的对象模型，上千页的文档也能导出
+- 骨架中的章、节和小节标题对应"标题 1/2/3"样式（可在 Word 导航窗格和目录中显示），
+  小节正文里的 markdown 标题从"标题 4"开始
+- 支持段落、粗体、行内代码、列表、引用、表格和代码块；mermaid 图表在安装了 mermaid-cli（mmdc）时
+  渲染为图片嵌入，否则保留源码并注明
+- 先写入临时文件，完成后再替换目标文件，导出中途失败不会留下不完整的文档
+
+不依赖 python-docx，只用标准库拼写 WordprocessingML。
+"""
+
+import logging
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from config import Config
+from document_store import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# A4 纸，页边距 2.54cm（单位：twip，1/1440 英寸）
+_PAGE_WIDTH, _PAGE_HEIGHT, _MARGIN = 11906, 16838, 1440
+# 图片最大宽度（EMU，1 英寸 = 914400），即版心宽度
+_MAX_IMAGE_EMU = (_PAGE_WIDTH - 2 * _MARGIN) * 635
+_EMU_PER_PIXEL = 9525
+# 正文样式首行缩进两字，标题、列表等样式需要显式取消
+_NO_INDENT = '<w:ind w:firstLineChars="0" w:firstLine="0"/>'
+
+_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"'
+)
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Default Extension="png" ContentType="image/png"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>"""
+
+_PACKAGE_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+
+def _style(style_id: str, name: str, props: str = "", run: str = "", based_on: str = "Normal",
+           kind: str = "paragraph") -> str:
+    based = f'<w:basedOn w:val="{based_on}"/>' if based_on else ''
+    return (f'<w:style w:type="{kind}" w:styleId="{style_id}"><w:name w:val="{name}"/>{based}'
+            f'<w:qFormat/><w:pPr>{props}</w:pPr><w:rPr>{run}</w:rPr></w:style>')
+
+
+def _heading_style(level: int, size: int) -> str:
+    return _style(f'Heading{level}', f'heading {level}',
+                  f'<w:keepNext/><w:spacing w:before="{360 - level * 40}" w:after="120"/>{_NO_INDENT}'
+                  f'<w:outlineLvl w:val="{level - 1}"/>',
+                  f'<w:rFonts w:ascii="Arial" w:hAnsi="Arial" w:eastAsia="黑体"/><w:b/><w:sz w:val="{size}"/>')
+
+
+_STYLES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+           '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+           '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Times New Roman" w:hAnsi="Times New Roman" '
+           'w:eastAsia="宋体"/><w:sz w:val="24"/><w:lang w:eastAsia="zh-CN"/></w:rPr></w:rPrDefault>'
+           '<w:pPrDefault><w:pPr><w:spacing w:after="120" w:line="360" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+           '</w:docDefaults>'
+           + _style('Normal', 'Normal', '<w:ind w:firstLineChars="200" w:firstLine="480"/>', based_on='')
+           + ''.join(_heading_style(level, size) for level, size in ((1, 36), (2, 32), (3, 28), (4, 26), (5, 24), (6, 24)))
+           + _style('ListParagraph', 'List Paragraph', '<w:ind w:left="480" w:firstLineChars="0" w:firstLine="0"/>')
+           + _style('Quote', 'Quote', '<w:ind w:left="480" w:firstLineChars="0" w:firstLine="0"/>',
+                    '<w:i/><w:color w:val="595959"/>')
+           + _style('Code', 'Code', '<w:shd w:val="clear" w:color="auto" w:fill="F2F2F2"/>'
+                    f'<w:spacing w:after="0" w:line="240" w:lineRule="auto"/>{_NO_INDENT}',
+                    '<w:rFonts w:ascii="Consolas" w:hAnsi="Consolas" w:eastAsia="宋体"/><w:sz w:val="20"/>')
+           + _style('Caption', 'caption', f'{_NO_INDENT}<w:jc w:val="center"/>', '<w:sz w:val="20"/>')
+           + _style('TOCHeading', 'TOC Heading', f'{_NO_INDENT}<w:jc w:val="center"/>',
+                    '<w:rFonts w:eastAsia="黑体"/><w:b/><w:sz w:val="32"/>')
+           + '<w:style w:type="table" w:styleId="TableGrid"><w:name w:val="Table Grid"/><w:tblPr><w:tblBorders>'
+           + ''.join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+                     for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+           + '</w:tblBorders></w:tblPr></w:style></w:styles>')
+
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f￾￿]')
+_INLINE = re.compile(r'(\*\*[^*\n]+\*\*|`[^`\n]+`)')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_BULLET = re.compile(r'^\s*[-*+•]\s+(.*)$')
+_NUMBERED = re.compile(r'^\s*(\d+[.、)）])\s*(.*)$')
+_TABLE_SEPARATOR = re.compile(r'^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$')
+_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w+-]*)')
+
+
+def _text(text: str) -> str:
+    return escape(_INVALID_XML.sub('', text))
+
+
+def _run(text: str, props: str = "") -> str:
+    rpr = f'<w:rPr>{props}</w:rPr>' if props else ''
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{_text(text)}</w:t></w:r>'
+
+
+def _inline_runs(text: str) -> str:
+    """把 **粗体** 和 `代码` 转为带格式的 run"""
+    runs = []
+    for part in _INLINE.split(text):
+        if not part:
+            continue
+        if part.startswith('**') and part.endswith('**') and len(part) > 4:
+            runs.append(_run(part[2:-2], '<w:b/>'))
+        elif part.startswith('`') and part.endswith('`') and len(part) > 2:
+            runs.append(_run(part[1:-1], '<w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/>'))
+        else:
+            runs.append(_run(part))
+    return "".join(runs)
+
+
+def _paragraph(runs: str, style: Optional[str] = None) -> str:
+    ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{ppr}{runs}</w:p>'
+
+
+def _png_size(data: bytes) -> Optional[tuple]:
+    if data[:8] != b'\x89PNG\r\n\x1a\n' or len(data) < 24:
+        return None
+    return struct.unpack('>II', data[16:24])
+
+
+def mmdc_renderer() -> Optional[Callable[[str], Optional[bytes]]]:
+    """安装了 mermaid-cli 时返回把 mermaid 源码渲染为 PNG 的函数，否则返回 None"""
+    command = shutil.which(Config.DOCX_MERMAID_CLI) if Config.DOCX_MERMAID_CLI else None
+    if not command:
+        return None
+
+    def render(source: str) -> Optional[bytes]:
+        with tempfile.TemporaryDirectory() as tmp:
+            source_file, image_file = Path(tmp) / 'chart.mmd', Path(tmp) / 'chart.png'
+            source_file.write_text(source, encoding='utf-8')
+            try:
+                subprocess.run([command, '-i', str(source_file), '-o', str(image_file), '-b', 'white'],
+                               check=True, capture_output=True, timeout=Config.DOCX_MERMAID_TIMEOUT)
+                return image_file.read_bytes()
+            except (subprocess.SubprocessError, OSError) as e:
+                logger.warning(f"Failed to render mermaid chart: {e}")
+                return None
+
+    return render
+
+
+class DocxWriter:
+    """
+    流式写出 docx
+
+    用法：
+        with DocxWriter(path) as writer:
+            writer.heading("第一章", 1)
+            writer.markdown(lines, heading_floor=4)
+    """
+
+    def __init__(self, path: os.PathLike, mermaid_renderer: Optional[Callable[[str], Optional[bytes]]] = None):
+        self.path = Path(path)
+        self.mermaid_renderer = mermaid_renderer
+        self.stats = {'paragraphs': 0, 'tables': 0, 'images': 0, 'mermaid_preserved': 0}
+        self._temp = self.path.with_name(self.path.name + '.part')
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._document = None
+        self._media_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._images: List[str] = []
+
+    def __enter__(self) -> 'DocxWriter':
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._zip = zipfile.ZipFile(self._temp, 'w', zipfile.ZIP_DEFLATED)
+        self._document = self._zip.open('word/document.xml', 'w', force_zip64=True)
+        self._media_dir = tempfile.TemporaryDirectory()
+        self._write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {_NAMESPACES}><w:body>')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._finish()
+                os.replace(self._temp, self.path)
+        finally:
+            if self._document and not self._document.closed:
+                self._document.close()
+            self._zip.close()
+            self._media_dir.cleanup()
+            if exc_type is not None:
+                self._temp.unlink(missing_ok=True)
+
+    def _write(self, xml: str):
+        self._document.write(xml.encode('utf-8'))
+
+    def _finish(self):
+        self._write(f'<w:sectPr><w:pgSz w:w="{_PAGE_WIDTH}" w:h="{_PAGE_HEIGHT}"/>'
+                    f'<w:pgMar w:top="{_MARGIN}" w:right="{_MARGIN}" w:bottom="{_MARGIN}" w:left="{_MARGIN}" '
+                    f'w:header="851" w:footer="992" w:gutter="0"/></w:sectPr></w:body></w:document>')
+        self._document.close()
+        # 图片在正文写完后才能写入（zip 同一时间只能写一个成员），渲染时暂存在临时目录
+        relationships = ['<Relationship Id="rIdStyles" '
+                         'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+                         'Target="styles.xml"/>']
+        for number, image in enumerate(self._images, 1):
+            self._zip.write(image, f'word/media/image{number}.png')
+            relationships.append(f'<Relationship Id="rIdImage{number}" '
+                                 'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" '
+                                 f'Target="media/image{number}.png"/>')
+        self._zip.writestr('word/_rels/document.xml.rels',
+                           '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                           '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                           + "".join(relationships) + '</Relationships>')
+        self._zip.writestr('word/styles.xml', _STYLES)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', _PACKAGE_RELS)
+
+    def paragraph(self, text: str, style: Optional[str] = None):
+        self._write(_paragraph(_inline_runs(text), style))
+        self.stats['paragraphs'] += 1
+
+    def heading(self, text: str, level: int):
+        self._write(_paragraph(_run(text.strip()), f'Heading{min(max(level, 1), 6)}'))
+
+    def toc(self, title: str = "目录"):
+        """插入目录域（在 Word 中右键"更新域"后生成）"""
+        self._write(_paragraph(_run(title), 'TOCHeading'))
+        self._write('<w:p><w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                    '<w:r><w:instrText xml:space="preserve"> TOC \\o "1-3" \\h \\z \\u </w:instrText></w:r>'
+                    '<w:r><w:fldChar w:fldCharType="separate"/></w:r>'
+                    + _run('右键此处选择"更新域"生成目录')
+                    + '<w:r><w:fldChar w:fldCharType="end"/></w:r></w:p>'
+                    '<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def table(self, rows: List[List[str]]):
+        """首行作为表头（跨页时重复）"""
+        if not rows:
+            return
+        columns = max(len(row) for row in rows)
+        width = (_PAGE_WIDTH - 2 * _MARGIN) // columns
+        parts = ['<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="0" w:type="auto"/></w:tblPr><w:tblGrid>',
+                 f'<w:gridCol w:w="{width}"/>' * columns, '</w:tblGrid>']
+        for number, row in enumerate(rows):
+            parts.append('<w:tr><w:trPr><w:tblHeader/></w:trPr>' if number == 0 else '<w:tr>')
+            for cell in row + [''] * (columns - len(row)):
+                runs = _run(cell, '<w:b/>') if number == 0 else _inline_runs(cell)
+                parts.append(f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>'
+                             f'<w:p><w:pPr>{_NO_INDENT}</w:pPr>{runs}</w:p></w:tc>')
+            parts.append('</w:tr>')
+        parts.append('</w:tbl><w:p/>')
+        self._write("".join(parts))
+        self.stats['tables'] += 1
+
+    def code(self, lines: List[str]):
+        for line in lines or ['']:
+            self._write(_paragraph(_run(line), 'Code'))
+
+    def image(self, data: bytes, caption: Optional[str] = None) -> bool:
+        size = _png_size(data)
+        if not size or not all(size):
+            return False
+        number = len(self._images) + 1
+        image_file = os.path.join(self._media_dir.name, f'image{number}.png')
+        with open(image_file, 'wb') as f:
+            f.write(data)
+        self._images.append(image_file)
+        cx = size[0] * _EMU_PER_PIXEL
+        cy = size[1] * _EMU_PER_PIXEL
+        if cx > _MAX_IMAGE_EMU:
+            cx, cy = _MAX_IMAGE_EMU, cy * _MAX_IMAGE_EMU // cx
+        name = quoteattr(f'图{number}')
+        self._write(
+            f'<w:p><w:pPr>{_NO_INDENT}<w:jc w:val="center"/></w:pPr><w:r><w:drawing>'
+            f'<wp:inline distT="0" distB="0" distL="0" distR="0"><wp:extent cx="{cx}" cy="{cy}"/>'
+            f'<wp:docPr id="{number}" name={name}/>'
+            '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+            f'<pic:nvPicPr><pic:cNvPr id="{number}" name={name}/><pic:cNvPicPr/></pic:nvPicPr>'
+            f'<pic:blipFill><a:blip r:embed="rIdImage{number}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+            f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr>'
+            '</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>')
+        if caption:
+            self._write(_paragraph(_run(caption), 'Caption'))
+        self.stats['images'] += 1
+        return True
+
+    def mermaid(self, lines: List[str]):
+        """能渲染时嵌入图片，否则保留源码"""
+        data = self.mermaid_renderer("\n".join(lines)) if self.mermaid_renderer else None
+        if data and self.image(data):
+            return
+        self._write(_paragraph(_run('（mermaid 图表源码，可粘贴到 mermaid 编辑器中查看）'), 'Caption'))
+        self.code(lines)
+        self.stats['mermaid_preserved'] += 1
+
+    def markdown(self, lines: Iterable[str], heading_floor: int = 1):
+        """
+        逐行转换 markdown
+
+        Args:
+            heading_floor: markdown 标题的最高样式级别，小节正文中传 4，避免与骨架的章节标题混淆
+        """
+        table: List[List[str]] = []
+        fence: Optional[str] = None
+        fence_lang = ''
+        block: List[str] = []
+
+        for raw in lines:
+            line = raw.rstrip('\r\n')
+            if fence is not None:
+                if line.strip().startswith(fence):
+                    self._fenced(block, fence_lang)
+                    fence, block = None, []
+                else:
+                    block.append(line)
+                continue
+
+            stripped = line.strip()
+            if table and not stripped.startswith('|'):
+                self.table(table)
+                table = []
+
+            fence_match = _FENCE.match(line)
+            if fence_match:
+                fence, fence_lang = fence_match.group(1), fence_match.group(2).lower()
+                continue
+            if not stripped or re.fullmatch(r'[-*_]{3,}', stripped):
+                continue
+            if stripped.startswith('|'):
+                if not _TABLE_SEPARATOR.match(stripped):
+                    table.append([cell.strip() for cell in stripped.strip('|').split('|')])
+                continue
+            heading = _HEADING.match(stripped)
+            if heading:
+                self.heading(heading.group(2), max(len(heading.group(1)), heading_floor))
+                continue
+            bullet = _BULLET.match(line)
+            if bullet:
+                self.paragraph('• ' + bullet.group(1), 'ListParagraph')
+                continue
+            numbered = _NUMBERED.match(line)
+            if numbered and numbered.group(2):
+                self.paragraph(f"{numbered.group(1)} {numbered.group(2)}", 'ListParagraph')
+                continue
+            if stripped.startswith('>'):
+                self.paragraph(stripped.lstrip('> ').strip(), 'Quote')
+                continue
+            self.paragraph(stripped)
+
+        if table:
+            self.table(table)
+        if fence is not None:
+            # 未闭合的代码块
+            self._fenced(block, fence_lang)
+
+    def _fenced(self, lines: List[str], lang: str):
+        if lang == 'mermaid':
+            self.mermaid(lines)
+        else:
+            self.code(lines)
+
+
+def _heading_entry(text: str) -> Optional[tuple]:
+    match = _HEADING.match(text.strip())
+    return (match.group(2), len(match.group(1))) if match else None
+
+
+def export_docx(store, path: os.PathLike, content_file: Optional[os.PathLike] = None,
+                on_progress: Optional[Callable[[int, int], None]] = None,
+                mermaid_renderer: Optional[Callable[[str], Optional[bytes]]] = None) -> Dict:
+    """
+    把文档导出为 docx
+
+    优先按 DocumentStore 的骨架逐个读取小节片段；没有骨架时（如旧版本生成的文档）逐行转换 content_file。
+
+    Returns:
+        导出统计（段落、表格、图片数等）
+    """
+    store.refresh()
+    fragments = [item for item in store.layout if item['type'] == 'fragment']
+    with DocxWriter(path, mermaid_renderer) as writer:
+        if Config.DOCX_TOC:
+            writer.toc()
+        if fragments:
+            done = 0
+            for item in store.layout:
+                if item['type'] == 'text':
+                    heading = _heading_entry(item['text'])
+                    if heading:
+                        writer.heading(*heading)
+                    else:
+                        writer.markdown(item['text'].splitlines())
+                    continue
+                section = store.read_section(item['key'])
+                if section is not None:
+                    title, content = section
+                    writer.heading(title, 3)
+                    writer.markdown(content.splitlines(), heading_floor=4)
+                done += 1
+                if on_progress:
+                    on_progress(done, len(fragments))
+        elif content_file and Path(content_file).exists():
+            with open(content_file, encoding='utf-8') as f:
+                writer.markdown(f)
+        else:
+            raise FileNotFoundError("没有可导出的文档内容，请先生成文档")
+    stats = dict(writer.stats, sections=len(fragments), bytes=Path(path).stat().st_size)
+    logger.info(f"Exported {path}: {stats}")
+    return stats
+
+
+def export_workspace(workspace, job=None) -> Dict:
+    """
+    导出项目文档到 outputs/content.docx（在线程中执行）
+
+    使用独立的 DocumentStore 读取片段，不与请求处理中共用的实例互相干扰。
+    """
+    def progress(done: int, total: int):
+        if job:
+            job.update(done / max(total, 1), f"已导出 {done}/{total} 个小节")
+
+    stats = export_docx(DocumentStore(workspace.sections_dir), workspace.docx_file, workspace.content_file, progress, mmdc_renderer())
+    stats['file'] = workspace.docx_file.name
+    return stats
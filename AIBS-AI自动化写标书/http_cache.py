@@ -0,0 +1,142 @@
+# http_cache.py
+
+"""
+轮询接口的响应缓存与条件请求
+
+页面在长时间生成过程中反复轮询文档、大纲和输入文件，而这些内容大多数时候没有变化：
+- ResponseCache 按"数据戳"（文件修改时间/大小、文档版本号等）缓存序列化后的 JSON 响应体，
+  数据戳不变就不再读文件、拼装和序列化
+- 响应带 ETag（响应体哈希）和 Last-Modified，请求带 If-None-Match / If-Modified-Since 且未变化时返回 304
+- 按 Accept-Encoding 压缩：优先 br（需安装 brotli），其次 gzip；压缩结果随响应体一起缓存
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from quart import Response, request
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只提供 gzip
+    brotli = None
+
+
+@dataclass
+class CachedBody:
+    """序列化后的响应体及其校验信息"""
+    body: bytes
+    etag: str
+    last_modified: float
+    _encoded: Dict[str, bytes] = field(default_factory=dict, repr=False)
+
+    def encoded(self, encoding: str) -> bytes:
+        """按编码取压缩后的响应体（首次压缩后缓存）"""
+        if encoding not in self._encoded:
+            if encoding == 'br':
+                self._encoded[encoding] = brotli.compress(self.body)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=Config.HTTP_GZIP_LEVEL)
+        return self._encoded[encoding]
+
+
+def make_body(data: Any, last_modified: float = 0.0) -> CachedBody:
+    """把数据序列化为 JSON 响应体，ETag 取响应体的哈希"""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return CachedBody(body, hashlib.sha1(body).hexdigest()[:20], last_modified)
+
+
+def file_stamp(*paths: os.PathLike) -> Tuple[Tuple[int, int], ...]:
+    """文件的 (修改时间 ns, 大小) 元组，文件不存在记为 (0, 0)"""
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamps.append((0, 0))
+    return tuple(stamps)
+
+
+def file_mtime(*paths: os.PathLike) -> float:
+    """几个文件中最晚的修改时间，均不存在时为 0"""
+    return max((ns / 1e9 for ns, _ in file_stamp(*paths)), default=0.0)
+
+
+class ResponseCache:
+    """按 (接口, 项目) 缓存响应体，数据戳变化时重新生成"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or Config.HTTP_CACHE_MAX_ENTRIES
+        self._entries: 'OrderedDict[Hashable, Tuple[Hashable, CachedBody]]' = OrderedDict()
+
+    async def get(self, key: Hashable, stamp: Hashable,
+                  build: Callable[[], Awaitable[Tuple[Any, float]]]) -> CachedBody:
+        """
+        取缓存的响应体
+
+        Args:
+            key: 缓存键，如 ('show_document', project_id)
+            stamp: 数据戳，与缓存时不同即视为失效
+            build: 缓存失效时调用，返回 (要序列化的数据, 最后修改时间)
+        """
+        cached = self._entries.get(key)
+        if cached and cached[0] == stamp:
+            self._entries.move_to_end(key)
+            return cached[1]
+        data, last_modified = await build()
+        body = make_body(data, last_modified)
+        self._entries[key] = (stamp, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _not_modified(body: CachedBody) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(body.etag)
+    if request.if_modified_since and body.last_modified:
+        # HTTP 日期精确到秒
+        return int(body.last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+def _choose_encoding(size: int) -> Optional[str]:
+    if size < Config.HTTP_COMPRESS_MIN_BYTES:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def json_response(body: CachedBody) -> Response:
+    """按当前请求的条件头和 Accept-Encoding 生成 200/304 响应"""
+    if _not_modified(body):
+        response = Response(b'', status=304)
+    else:
+        encoding = _choose_encoding(len(body.body))
+        response = Response(body.encoded(encoding) if encoding else body.body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    # 同一内容的不同压缩版本共用一个 ETag，因此用弱校验
+    response.set_etag(body.etag, weak=True)
+    if body.last_modified:
+        response.last_modified = datetime.fromtimestamp(body.last_modified, tz=timezone.utc)
+    # 允许浏览器缓存，但每次使用前都要向服务端确认
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
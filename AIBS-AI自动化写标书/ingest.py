@@ -0,0 +1,548 @@
+# ingest.py
+
+"""
+招标文件导入
+
+把上传的 PDF / DOCX / XLSX 招标文件转换为工作区的 tech.md 和 score.md：
+1. 上传内容按块流式写入 inputs/uploads/，不在内存中缓存整个文件
+2. 在工作进程中逐页抽取文本（PDF 按页段分给多个进程并行；DOCX、XLSX 用 iterparse 流式解析 XML，
+   DOCX 按分页符、XLSX 按工作表分页），不阻塞事件循环
+3. 清理页眉页脚、页码和目录行，PDF 中被折行打断的句子重新接上，表格转为"| 单元格 |"行
+4. 按章节标题识别"技术要求/采购需求"和"评分标准/评标办法"两类章节（标题层级嵌套时以最近的为准），
+   评分表的每一行整理成"评分项（N分）：评分标准"，与 score_weights.parse_scoring_items 的格式一致
+
+抽取出的全文另存为 inputs/source.md，未识别到的部分可以从中手动摘取。
+PDF 解析需要安装 pypdf；DOCX、XLSX 只用标准库。
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import zipfile
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterable, Callable, Dict, List, Optional, Tuple
+from xml.etree.ElementTree import iterparse
+
+import storage
+from config import Config
+from score_weights import parse_scoring_items
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ('pdf', 'docx', 'xlsx')
+
+# 章节标题中出现这些词时，该章节归为技术要求或评分标准（先判断评分，"技术评分"归评分）
+SCORE_KEYWORDS = ('评分', '评标办法', '评审办法', '评标标准', '评审标准', '评审因素', '评分细则')
+TECH_KEYWORDS = ('技术要求', '技术规格', '技术参数', '技术需求', '技术规范', '采购需求', '需求说明',
+                 '项目需求', '服务要求', '采购内容')
+
+# 标题最长字数，更长的行视为正文
+MAX_HEADING_CHARS = 40
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_S = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_HEADING_STYLE = re.compile(r'^(?:heading|标题)\s*(\d)$', re.IGNORECASE)
+_CN_NUM = '一二三四五六七八九十百零〇两'
+_HEADING_PATTERNS = (
+    (re.compile(rf'^第[{_CN_NUM}\d]+[章部篇]'), 1),
+    (re.compile(rf'^第[{_CN_NUM}\d]+节'), 2),
+    (re.compile(rf'^[{_CN_NUM}]+[、.．]'), 2),
+    (re.compile(rf'^[（(][{_CN_NUM}]+[）)]'), 3),
+    (re.compile(r'^\d+[、.．]?(?=\s*\D)'), 3),
+    (re.compile(r'^\d+[.．]\d+(?=[\s、.．]*\D)'), 4),
+)
+_MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s*')
+_PAGE_NUMBER = re.compile(r'^[-—–\s]*(?:第\s*\d+\s*页(?:\s*[,，/]?\s*共\s*\d+\s*页)?|\d+\s*/\s*\d+|page\s*\d+(?:\s*of\s*\d+)?|\d+)[-—–\s]*$',
+                          re.IGNORECASE)
+_TOC_LINE = re.compile(r'(?:\.{3,}|…{2,}|·{3,}|-{4,})\s*\d+\s*$')
+_SENTENCE_END = re.compile(r'[。；;：:！？!?）)」”]$')
+_LIST_ITEM = re.compile(rf'^(?:[-*•●■◆]|\d+[、.．)）]|[（(]\d+[）)]|[{_CN_NUM}]+[、.．])')
+_POINTS = re.compile(r'^(\d+(?:\.\d+)?)\s*分?$')
+_POINTS_HEADER = ('分值', '分数', '权重', '满分', '得分')
+
+
+class IngestError(ValueError):
+    """上传的文件无法导入（格式不支持、缺少解析库或没有文字内容）"""
+
+
+# ---------- 文件抽取（在工作进程中执行） ----------
+
+def detect_format(path: os.PathLike) -> str:
+    """按扩展名和文件头判断格式"""
+    suffix = Path(path).suffix.lower().lstrip('.')
+    if suffix not in SUPPORTED_FORMATS:
+        raise IngestError(f"不支持的文件格式：{suffix or '无扩展名'}，请上传 PDF、DOCX 或 XLSX")
+    with open(path, 'rb') as f:
+        magic = f.read(5)
+    if suffix == 'pdf' and magic != b'%PDF-':
+        raise IngestError("文件不是有效的 PDF")
+    if suffix in ('docx', 'xlsx') and not magic.startswith(b'PK'):
+        raise IngestError(f"文件不是有效的 {suffix.upper()}（旧版 .doc/.xls 请先另存为新格式）")
+    return suffix
+
+
+def _load_pypdf():
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise IngestError("解析 PDF 需要安装 pypdf：pip install pypdf")
+    return PdfReader
+
+
+def pdf_page_count(path: str) -> int:
+    return len(_load_pypdf()(path).pages)
+
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """抽取 PDF 第 start ~ end-1 页的文本"""
+    reader = _load_pypdf()(path)
+    pages = []
+    for number in range(start, min(end, len(reader.pages))):
+        try:
+            pages.append(reader.pages[number].extract_text() or "")
+        except Exception as e:
+            logger.warning(f"Failed to extract page {number + 1} of {path}: {e}")
+            pages.append("")
+    return pages
+
+
+def _docx_paragraph(paragraph) -> Tuple[str, bool]:
+    """段落文本（标题样式加上 # 前缀）及段内是否有分页"""
+    parts = []
+    page_break = False
+    for node in paragraph.iter():
+        if node.tag == _W + 't':
+            parts.append(node.text or "")
+        elif node.tag == _W + 'tab':
+            parts.append(' ')
+        elif node.tag == _W + 'br':
+            if node.get(_W + 'type') == 'page':
+                page_break = True
+            else:
+                parts.append('\n')
+        elif node.tag == _W + 'lastRenderedPageBreak':
+            page_break = True
+    text = "".join(parts).strip()
+    style = paragraph.find(f'{_W}pPr/{_W}pStyle')
+    match = _HEADING_STYLE.match(style.get(_W + 'val', '')) if style is not None else None
+    if text and match:
+        text = '#' * int(match.group(1)) + ' ' + text
+    return text, page_break
+
+
+def _table_row(cells: List[str]) -> Optional[str]:
+    cells = [re.sub(r'\s+', ' ', cell).replace('|', '/').strip() for cell in cells]
+    if not any(cells):
+        return None
+    return "| " + " | ".join(cells) + " |"
+
+
+def extract_docx_pages(path: str) -> List[str]:
+    """流式解析 word/document.xml，按分页符分页；表格按行转为 | 单元格 | 形式"""
+    pages: List[str] = []
+    lines: List[str] = []
+    depth = 0
+    with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as f:
+        for event, elem in iterparse(f, events=('start', 'end')):
+            if elem.tag == _W + 'tbl':
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 0:
+                    for row in elem.iter(_W + 'tr'):
+                        text = _table_row([" ".join(filter(None, (_docx_paragraph(p)[0] for p in cell.iter(_W + 'p'))))
+                                           for cell in row.findall(_W + 'tc')])
+                        if text:
+                            lines.append(text)
+                    elem.clear()
+            elif event == 'end' and elem.tag == _W + 'p' and depth == 0:
+                text, page_break = _docx_paragraph(elem)
+                if text:
+                    lines.append(text)
+                if page_break and lines:
+                    pages.append("\n".join(lines))
+                    lines = []
+                elem.clear()
+    if lines:
+        pages.append("\n".join(lines))
+    return pages
+
+
+def _column_index(ref: str) -> int:
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def extract_xlsx_pages(path: str) -> List[str]:
+    """流式解析各工作表，每个工作表一页"""
+    pages = []
+    with zipfile.ZipFile(path) as archive:
+        names = set(archive.namelist())
+        shared: List[str] = []
+        if 'xl/sharedStrings.xml' in names:
+            with archive.open('xl/sharedStrings.xml') as f:
+                for _, elem in iterparse(f):
+                    if elem.tag == _S + 'si':
+                        shared.append("".join(t.text or "" for t in elem.iter(_S + 't')))
+                        elem.clear()
+        with archive.open('xl/_rels/workbook.xml.rels') as f:
+            targets = {rel.get('Id'): rel.get('Target') for _, rel in iterparse(f) if rel.tag == _REL + 'Relationship'}
+        with archive.open('xl/workbook.xml') as f:
+            sheets = [(sheet.get('name'), targets.get(sheet.get(_R + 'id')))
+                      for _, sheet in iterparse(f) if sheet.tag == _S + 'sheet']
+
+        for name, target in sheets:
+            if not target:
+                continue
+            member = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            if member not in names:
+                continue
+            lines = [f"# {name}"]
+            with archive.open(member) as f:
+                for _, elem in iterparse(f):
+                    if elem.tag != _S + 'row':
+                        continue
+                    cells: Dict[int, str] = {}
+                    for position, cell in enumerate(elem.iter(_S + 'c')):
+                        kind = cell.get('t')
+                        if kind == 'inlineStr':
+                            value = "".join(t.text or "" for t in cell.iter(_S + 't'))
+                        else:
+                            node = cell.find(_S + 'v')
+                            value = node.text if node is not None and node.text else ""
+                            if kind == 's' and value:
+                                value = shared[int(value)]
+                        column = _column_index(cell.get('r', '')) if cell.get('r') else position
+                        cells[column] = value
+                    if cells:
+                        text = _table_row([cells.get(i, "") for i in range(max(cells) + 1)])
+                        if text:
+                            lines.append(text)
+                    elem.clear()
+            pages.append("\n".join(lines))
+    return pages
+
+
+def _extract(path: str, kind: str, start: int = 0, end: int = 0) -> List[str]:
+    if kind == 'pdf':
+        return extract_pdf_pages(path, start, end)
+    if kind == 'docx':
+        return extract_docx_pages(path)
+    return extract_xlsx_pages(path)
+
+
+def _create_executor(workers: int) -> Executor:
+    if workers > 0:
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest')
+
+
+async def extract_pages(path: os.PathLike, on_progress: Optional[Callable[[int, int], None]] = None,
+                        workers: Optional[int] = None) -> List[str]:
+    """
+    在工作进程中抽取各页文本
+
+    Args:
+        on_progress: 每完成一批页面时以 (已完成页数, 总页数) 调用
+        workers: 进程数，默认 Config.INGEST_WORKERS；0 表示在线程中解析
+    """
+    path = str(path)
+    kind = detect_format(path)
+    workers = Config.INGEST_WORKERS if workers is None else workers
+    loop = asyncio.get_running_loop()
+    executor = _create_executor(workers)
+    try:
+        if kind != 'pdf':
+            pages = await loop.run_in_executor(executor, _extract, path, kind)
+            if on_progress:
+                on_progress(len(pages), len(pages))
+            return pages
+
+        total = await loop.run_in_executor(executor, pdf_page_count, path)
+        size = Config.INGEST_PAGES_PER_TASK
+        done = 0
+
+        async def run(start: int) -> List[str]:
+            nonlocal done
+            pages = await loop.run_in_executor(executor, _extract, path, kind, start, start + size)
+            done += len(pages)
+            if on_progress:
+                on_progress(done, total)
+            return pages
+
+        batches = await asyncio.gather(*(run(start) for start in range(0, total, size)))
+        return [page for batch in batches for page in batch]
+    finally:
+        executor.shutdown(wait=False)
+
+
+# ---------- 清理与章节识别 ----------
+
+def heading_level(line: str) -> int:
+    """章节标题的层级（1 为最高），不是标题时返回 0"""
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1))
+    if len(line) > MAX_HEADING_CHARS or line.startswith('|') or re.search(r'[。；;，,]$', line):
+        return 0
+    for pattern, level in _HEADING_PATTERNS:
+        if pattern.match(line):
+            return level
+    return 0
+
+
+def classify_heading(line: str) -> Optional[str]:
+    """标题归属：'score'、'tech' 或 None"""
+    if any(keyword in line for keyword in SCORE_KEYWORDS):
+        return 'score'
+    if any(keyword in line for keyword in TECH_KEYWORDS):
+        return 'tech'
+    return None
+
+
+def _repeated_margins(pages: List[List[str]]) -> set:
+    """在多数页面的首尾两行重复出现的行（数字视为相同），即页眉页脚"""
+    if len(pages) < 4:
+        return set()
+    counter = Counter()
+    for lines in pages:
+        counter.update({re.sub(r'\d+', '#', line) for line in lines[:2] + lines[-2:]})
+    return {line for line, count in counter.items() if count >= len(pages) / 2}
+
+
+def clean_lines(pages: List[str], pdf: bool = False) -> List[str]:
+    """
+    把各页文本整理成行，去掉目录行
+
+    PDF 的页眉页脚和页码混在正文里，另外去掉页面首尾的页码和多数页面重复的行，
+    并把没有句末标点的折行与下一行接上；DOCX 的页眉页脚在单独的部件中，不做这些处理。
+    """
+    page_lines = [[line.strip() for line in page.splitlines() if line.strip()] for page in pages]
+    margins = _repeated_margins(page_lines) if pdf else set()
+    result: List[str] = []
+    for lines in page_lines:
+        for index, line in enumerate(lines):
+            at_margin = pdf and (index < 2 or index >= len(lines) - 2)
+            if at_margin and (re.sub(r'\d+', '#', line) in margins or _PAGE_NUMBER.match(line)):
+                continue
+            if _TOC_LINE.search(line):
+                continue
+            previous = result[-1] if result else ""
+            if (pdf and previous and not _SENTENCE_END.search(previous) and not heading_level(previous)
+                    and not previous.startswith('|') and not line.startswith('|')
+                    and not heading_level(line) and not _LIST_ITEM.match(line)):
+                result[-1] = previous + line
+            else:
+                result.append(line)
+    return result
+
+
+def split_regions(lines: List[str]) -> Dict[str, List[Tuple[str, int]]]:
+    """
+    按章节标题把行分到技术要求和评分标准两类
+
+    用标题栈跟踪当前所在的章节：遇到标题时弹出同级及更低级的标题，
+    若该标题可归类则入栈；当前行归属于栈顶（最近的可归类标题）。
+
+    Returns:
+        {'tech': [(行, 标题层级或 0)], 'score': [...]}
+    """
+    regions: Dict[str, List[Tuple[str, int]]] = {'tech': [], 'score': []}
+    stack: List[Tuple[str, int]] = []
+    for line in lines:
+        level = heading_level(line)
+        if level:
+            while stack and stack[-1][1] >= level:
+                stack.pop()
+            kind = classify_heading(line)
+            if kind:
+                stack.append((kind, level))
+        if stack:
+            regions[stack[-1][0]].append((line, level))
+    return regions
+
+
+def _table_cells(line: str) -> Optional[List[str]]:
+    if line.startswith('|') and line.endswith('|') and len(line) > 1:
+        return [cell.strip() for cell in line[1:-1].split('|')]
+    return None
+
+
+def _markdown_heading(line: str, level: int) -> str:
+    return '#' * min(level, 3) + ' ' + _MARKDOWN_HEADING.sub('', line)
+
+
+def normalize_tech(region: List[Tuple[str, int]]) -> str:
+    """技术要求章节：标题转为 markdown 标题，表格行转为"第一列：其余列"的条目"""
+    out = []
+    for line, level in region:
+        cells = _table_cells(line)
+        if level:
+            out.append(_markdown_heading(line, level))
+        elif cells is not None:
+            cells = [cell for cell in cells if cell]
+            if len(cells) > 1 and not cells[0].isdigit():
+                out.append(f"{cells[0]}：{'；'.join(cells[1:])}")
+            elif cells:
+                out.append("；".join(cells[1:] if cells[0].isdigit() and len(cells) > 1 else cells))
+        else:
+            out.append(line)
+    return "\n\n".join(out)
+
+
+def normalize_score(region: List[Tuple[str, int]]) -> str:
+    """评分章节：评分表每行整理成"评分项（N分）：评分标准"，分值列由表头（分值/分数/权重）或"N分"单元格确定"""
+    out = []
+    points_column: Optional[int] = None
+    for line, level in region:
+        cells = _table_cells(line)
+        if level:
+            out.append(_markdown_heading(line, level))
+            continue
+        if cells is None:
+            out.append(line)
+            continue
+        header = next((i for i, cell in enumerate(cells) if any(word in cell for word in _POINTS_HEADER)), None)
+        if header is not None and not any(_POINTS.match(cell) for cell in cells):
+            points_column = header
+            continue
+        column = points_column if points_column is not None and points_column < len(cells) \
+            and _POINTS.match(cells[points_column]) else None
+        if column is None:
+            column = next((i for i, cell in enumerate(cells) if re.match(r'^\d+(?:\.\d+)?\s*分$', cell)), None)
+        if column is None:
+            column = next((i for i, cell in reversed(list(enumerate(cells))) if i > 0 and _POINTS.match(cell)), None)
+        texts = [cell for i, cell in enumerate(cells) if i != column and cell and not cell.isdigit()]
+        if column is None or not texts:
+            if texts:
+                out.append("：".join(texts))
+            continue
+        points = _POINTS.match(cells[column]).group(1)
+        description = "；".join(texts[1:])
+        out.append(f"{texts[0]}（{points}分）：{description}" if description else f"{texts[0]}（{points}分）")
+    return "\n\n".join(out)
+
+
+@dataclass
+class IngestResult:
+    source_md: str
+    tech_md: str
+    score_md: str
+    pages: int
+    warnings: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict:
+        return {
+            'pages': self.pages,
+            'source_chars': len(self.source_md),
+            'tech_chars': len(self.tech_md),
+            'score_items': len(parse_scoring_items(self.score_md)) if self.score_md else 0,
+            'warnings': self.warnings
+        }
+
+
+def build_inputs(pages: List[str], pdf: bool = False) -> IngestResult:
+    """从各页文本整理出 source.md、tech.md、score.md"""
+    lines = clean_lines(pages, pdf)
+    if not lines:
+        raise IngestError("没有抽取到文字内容（扫描件需先做 OCR）")
+    regions = split_regions(lines)
+    tech_md = normalize_tech(regions['tech'])
+    score_md = normalize_score(regions['score'])
+    warnings = []
+    if not tech_md:
+        warnings.append("未识别到技术要求章节，tech.md 未修改，请从 source.md 中手动摘取")
+    if not score_md:
+        warnings.append("未识别到评分标准章节，score.md 未修改，请从 source.md 中手动摘取")
+    elif not parse_scoring_items(score_md):
+        warnings.append("评分章节中没有识别出带分值的评分项，请检查 score.md")
+    return IngestResult("\n\n".join(lines), tech_md, score_md, len(pages), warnings)
+
+
+# ---------- 上传与导入 ----------
+
+def upload_path(workspace, filename: str) -> Path:
+    """上传文件的保存路径：inputs/uploads/<时间>-<文件名>"""
+    name = re.sub(r'[\\/:*?"<>|\s]+', '_', Path(filename or '').name).strip('._') or 'upload'
+    return workspace.upload_dir / f"{datetime.now():%Y%m%d%H%M%S}-{name}"
+
+
+async def save_stream(chunks: AsyncIterable[bytes], path: Path, max_bytes: Optional[int] = None) -> int:
+    """
+    把上传内容流式写入文件，先写临时文件，完成后再改名
+
+    攒够 Config.INGEST_WRITE_BUFFER 字节才在线程中写一次盘，返回写入的字节数。
+    """
+    max_bytes = max_bytes or Config.INGEST_MAX_BYTES
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + '.part')
+    loop = asyncio.get_running_loop()
+    buffer = bytearray()
+    total = 0
+    f = await loop.run_in_executor(None, open, temp, 'wb')
+    try:
+        async for chunk in chunks:
+            total += len(chunk)
+            if total > max_bytes:
+                raise IngestError(f"文件超过 {max_bytes // (1024 * 1024)}MB 上限")
+            buffer.extend(chunk)
+            if len(buffer) >= Config.INGEST_WRITE_BUFFER:
+                await loop.run_in_executor(None, f.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await loop.run_in_executor(None, f.write, bytes(buffer))
+        await loop.run_in_executor(None, f.close)
+        os.replace(temp, path)
+    except BaseException:
+        f.close()
+        temp.unlink(missing_ok=True)
+        raise
+    return total
+
+
+async def ingest_file(path: os.PathLike, workspace, job=None) -> Dict:
+    """
+    解析已保存的招标文件并写入工作区输入
+
+    Args:
+        job: 后台任务（jobs.Job），用于报告进度
+
+    Returns:
+        导入概况（页数、字数、评分项数和警告）
+    """
+    kind = detect_format(path)
+
+    def progress(done: int, total: int):
+        if job:
+            job.update(0.9 * done / max(total, 1), f"已解析 {done}/{total} 页")
+
+    pages = await extract_pages(path, progress)
+    if job:
+        job.update(message="识别技术要求和评分标准")
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, build_inputs, pages, kind == 'pdf')
+
+    workspace.ensure()
+    await storage.write_text_async(workspace.source_file, result.source_md)
+    if result.tech_md:
+        await storage.write_text_async(workspace.tech_file, result.tech_md)
+    if result.score_md:
+        await storage.write_text_async(workspace.score_file, result.score_md)
+    summary = result.summary()
+    summary['filename'] = Path(path).name
+    logger.info(f"Ingested {path} into {workspace.project_id}: {summary}")
+    return summary
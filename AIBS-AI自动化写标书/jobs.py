@@ -0,0 +1,120 @@
+# jobs.py
+
+"""
+后台任务
+
+导入招标文件、导出文档等耗时操作不在请求处理函数里完成：接口登记一个任务后立即返回任务 ID，
+任务在事件循环中后台执行，页面轮询 /api/jobs/<job_id> 查看进度和结果。
+任务只保存在内存中，已结束的任务最多保留 Config.JOB_HISTORY 个。
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    project_id: str
+    status: str = PENDING
+    progress: float = 0.0  # 0 ~ 1
+    message: str = ''
+    result: Any = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=_now)
+    finished_at: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None):
+        """任务执行过程中更新进度"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class JobRegistry:
+    """登记和执行后台任务"""
+
+    def __init__(self, max_history: Optional[int] = None):
+        self.max_history = max_history or Config.JOB_HISTORY
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, kind: str, project_id: str, func: Callable[[Job], Awaitable[Any]]) -> Job:
+        """
+        登记并启动任务
+
+        Args:
+            func: 接收 Job 的协程函数，可调用 job.update() 报告进度，返回值作为任务结果
+        """
+        job = Job(uuid.uuid4().hex[:12], kind, project_id)
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.ensure_future(self._run(job, func))
+        self._prune()
+        return job
+
+    async def _run(self, job: Job, func: Callable[[Job], Awaitable[Any]]):
+        job.status = RUNNING
+        try:
+            job.result = await func(job)
+            job.status = DONE
+            job.progress = 1.0
+        except asyncio.CancelledError:
+            job.status, job.error = FAILED, "任务已取消"
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.kind} {job.id} failed: {e}", exc_info=True)
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished_at = _now()
+            self._tasks.pop(job.id, None)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, project_id: Optional[str] = None, kind: Optional[str] = None) -> List[Job]:
+        """按登记时间从新到旧列出任务"""
+        return [job for job in reversed(self._jobs.values())
+                if (project_id is None or job.project_id == project_id) and (kind is None or job.kind == kind)]
+
+    def running(self, project_id: str, kind: str) -> Optional[Job]:
+        """项目中正在执行的同类任务"""
+        return next((job for job in self.list(project_id, kind) if not job.finished), None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+    async def cancel_all(self):
+        """停止服务时取消尚未结束的任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,207 @@
+# llm_scheduler.py
+
+"""
+进程级 LLM 并发调度
+
+整个进程共用一份供应商并发额度（Config.LLM_MAX_CONCURRENCY），所有 LLM 请求都要先
+从调度器领取名额。多个生成任务（job）同时运行时，按赤字轮转（Deficit Round Robin）
+在有排队请求的任务之间分配空闲名额：每轮给任务的赤字计数加上与其优先级成正比的配额，
+赤字足够时才放行该任务的下一个请求。这样：
+- 两份文档同时生成时总并发仍不超过额度，不会因为各自开满并发而集体 429
+- 大任务不会饿死小任务，高优先级任务按权重获得更多名额
+
+当前任务通过 ContextVar 传递：在 job() 上下文内创建的协程（包括 gather 出的子任务）
+发出的请求都记在该任务名下；不在任何任务内的请求归入默认任务。
+同一任务内排队的请求按 request_priority() 设置的优先级发放（高者先），同优先级先到先得。
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_current_job: ContextVar[Optional['Job']] = ContextVar('llm_job', default=None)
+_request_priority: ContextVar[float] = ContextVar('llm_request_priority', default=0.0)
+_job_ids = itertools.count(1)
+_waiter_seq = itertools.count()
+
+
+@contextmanager
+def request_priority(priority: float):
+    """上下文内发出的请求在所属任务的队列中按该优先级排序（默认 0）"""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ('future', 'cost', 'key')
+
+    def __init__(self, future: asyncio.Future, cost: float, priority: float):
+        self.future = future
+        self.cost = cost
+        self.key = (-priority, next(_waiter_seq))
+
+    def __lt__(self, other: '_Waiter') -> bool:
+        return self.key < other.key
+
+
+class Job:
+    """一个生成任务在调度器中的记账"""
+
+    def __init__(self, name: str, priority: int):
+        self.id = next(_job_ids)
+        self.name = name
+        self.priority = max(1, int(priority))
+        self.deficit = 0.0
+        # 排队中的请求（小顶堆，堆顶为优先级最高、最早到达的请求）
+        self.waiters: List[_Waiter] = []
+        self.in_flight = 0
+        self.granted = 0
+
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'priority': self.priority,
+            'waiting': len(self.waiters),
+            'in_flight': self.in_flight,
+            'granted': self.granted
+        }
+
+
+class LLMScheduler:
+    """按优先级加权的赤字轮转调度器"""
+
+    def __init__(self, capacity: int, quantum: float = 1.0):
+        self.capacity = capacity
+        self.quantum = quantum
+        self.free = capacity
+        self.jobs: Dict[int, Job] = {}
+        # 有排队请求的任务，按轮转顺序
+        self._ring: Deque[Job] = deque()
+        self._default_job: Optional[Job] = None
+
+    def register(self, name: str, priority: int = 1) -> Job:
+        job = Job(name, priority)
+        self.jobs[job.id] = job
+        return job
+
+    def unregister(self, job: Job):
+        self.jobs.pop(job.id, None)
+
+    @contextmanager
+    def job(self, name: str, priority: int = 1):
+        """在上下文内发出的 LLM 请求都记在该任务名下"""
+        job = self.register(name, priority)
+        token = _current_job.set(job)
+        try:
+            yield job
+        finally:
+            _current_job.reset(token)
+            self.unregister(job)
+
+    def current_job(self) -> Job:
+        job = _current_job.get()
+        if job is not None:
+            return job
+        if self._default_job is None:
+            self._default_job = self.register('default')
+        return self._default_job
+
+    async def acquire(self, job: Optional[Job] = None, cost: float = 1.0):
+        """领取一个并发名额；没有空闲名额或已有其它请求排队时进入排队"""
+        job = job or self.current_job()
+        if self.free > 0 and not self._ring:
+            self._grant(job)
+            return job
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost, _request_priority.get())
+        heapq.heappush(job.waiters, waiter)
+        if job not in self._ring:
+            self._ring.append(job)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 名额已发放但调用方被取消，归还名额
+                self.release(job)
+            elif waiter in job.waiters:
+                # 取消与 release() 在同一轮事件循环中发生时，_dispatch 可能已把它移出队列
+                job.waiters.remove(waiter)
+                heapq.heapify(job.waiters)
+            raise
+        return job
+
+    def release(self, job: Job):
+        job.in_flight -= 1
+        self.free += 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, job: Optional[Job] = None, cost: float = 1.0):
+        job = await self.acquire(job, cost)
+        try:
+            yield job
+        finally:
+            self.release(job)
+
+    def _grant(self, job: Job):
+        self.free -= 1
+        job.in_flight += 1
+        job.granted += 1
+
+    def _dispatch(self):
+        """把空闲名额按赤字轮转分给排队中的任务"""
+        while self.free > 0 and self._ring:
+            job = self._ring[0]
+            if not job.waiters:
+                job.deficit = 0.0
+                self._ring.popleft()
+                continue
+            head = job.waiters[0]
+            if head.future.done():
+                # 已取消但尚未从队列中移除的请求
+                heapq.heappop(job.waiters)
+                continue
+            if job.deficit < head.cost:
+                # 本轮配额用完，补充配额后轮到下一个任务
+                job.deficit += self.quantum * job.priority
+                self._ring.rotate(-1)
+                continue
+            heapq.heappop(job.waiters)
+            job.deficit -= head.cost
+            self._grant(job)
+            head.future.set_result(None)
+            if not job.waiters:
+                job.deficit = 0.0
+                self._ring.popleft()
+
+    def stats(self) -> Dict:
+        return {
+            'capacity': self.capacity,
+            'free': self.free,
+            'jobs': [job.stats() for job in self.jobs.values()]
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """当前事件循环的全局调度器（不同事件循环各自一份，便于测试和脚本多次 asyncio.run）"""
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = LLMScheduler(Config.LLM_MAX_CONCURRENCY)
+        _scheduler_loop = loop
+    return _scheduler
@@ -3,22 +3,80 @@ from openai import OpenAI
 from config import Config
 import logging
 import json
-from prompts import Prompts
+from prompts import Prompts, ContentBlock
+from nlp_pool import get_nlp_pool
+from tracing import span
+from llm_scheduler import get_scheduler
+from circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from logging_setup import log_payload, truncate_payload
+from conversation import ConversationHistory
+from model_router import ModelRoute, routes_for, TASK_DEFAULT, TASK_CHAT, TASK_REPAIR, TASK_SECTION_HIGH, TASK_PLAN
 import time
 import asyncio
+import hashlib
 import aiohttp
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
 import re
 import ssl
 
 logger = logging.getLogger(__name__)
 
+class _Flight:
+    """一个进行中的合并请求：共享的请求任务和仍在等待结果的调用方数"""
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+# 进行中的请求：请求指纹 -> 合并请求（进程内所有 LLMClient 共用）
+_inflight: Dict[str, _Flight] = {}
+
+# 后台延迟关闭会话的任务：事件循环只弱引用任务，这里持有引用直到任务结束，防止任务被回收
+_closing: Set[asyncio.Task] = set()
+
+def is_client_error(status: int) -> bool:
+    """请求本身有问题（参数错误、超出上下文长度等）的状态码：重试无用，也不说明供应商不可用"""
+    return 400 <= status < 500 and status not in (408, 429)
+
+def request_fingerprint(route: ModelRoute, api_base: str, api_key: str, messages: list, require_json: bool = False,
+                        require_outline: bool = False, max_tokens: Optional[int] = None) -> str:
+    """模型、API 地址与密钥、采样参数和消息内容都相同的请求指纹相同（api_base/api_key 为实际使用的值）"""
+    payload = json.dumps({
+        "model": route.model,
+        "api_base": api_base,
+        "api_key": hashlib.sha256((api_key or '').encode('utf-8')).hexdigest(),
+        "max_tokens": route.cap_tokens(max_tokens),
+        "temperature": Config.TEMPERATURE,
+        "top_p": Config.TOP_P,
+        "require_json": require_json,
+        "require_outline": require_outline,
+        "messages": messages
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class InvalidJSONResponse(ValueError):
+    """要求 JSON 时模型返回了无法解析的内容"""
+
+    def __init__(self, message: str, content: str):
+        super().__init__(message)
+        self.content = content
+
 class LLMClient:
     def __init__(self):
         self.api_key = os.getenv('LLM_API_KEY', Config.LLM_API_KEY)
         self.base_url = os.getenv('LLM_API_BASE', Config.LLM_API_BASE)
         self.session = None
-        self.messages = []
+        # 路由到其它 API 地址/密钥时使用的会话：(base_url, api_key) -> session
+        self.route_sessions = {}
+        # 本客户端发起的合并请求（在本客户端的会话上执行），关闭会话前要等它们结束
+        self._leading: Set[asyncio.Task] = set()
+        self.history = ConversationHistory(
+            Config.CHAT_HISTORY_TOKENS,
+            Config.CHAT_KEEP_TURNS,
+            Config.CHAT_TURN_SUMMARY_TOKENS,
+            Config.CHAT_SUMMARY_TOKENS
+        )
         logger.info("LLM client initialized successfully")
 
     async def __aenter__(self):
@@ -33,169 +91,326 @@ class LLMClient:
     async def _ensure_session(self):
         """确保 session 存在且有效"""
         if self.session is None or self.session.closed:
-            # 配置 SSL 上下文
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            
-            # 配置连接超时
-            timeout = aiohttp.ClientTimeout(
-                total=Config.TIMEOUT,  # Overall timeout for the entire operation (resolve, connect, send, headers, body)
-                connect=10,          # Max time to establish a connection
-                sock_read=20         # Max time to read a portion of the response body
-            )
-            
-            # 确保 base_url 以斜杠结尾
-            base_url = self.base_url
-            if not base_url.endswith('/'):
-                base_url += '/'
-            
-            # 配置连接器
-            connector_kwargs = {
-                'ssl': ssl_context,
-                'limit': 15,  # 调整并发连接数
-                'force_close': True,
-                'enable_cleanup_closed': True
-            }
-            
-            connector = aiohttp.TCPConnector(**connector_kwargs)
-            
-            # 创建会话
-            session_kwargs = {
-                'base_url': base_url,
-                'headers': {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                'timeout': timeout,
-                'connector': connector
-            }
-            
-            # 如果使用代理，添加代理配置到会话
-            if Config.USE_PROXY:
-                session_kwargs['proxy'] = Config.PROXY_URLS['https']
-                logger.info(f"Using proxy: {Config.PROXY_URLS}")
-            
-            self.session = aiohttp.ClientSession(**session_kwargs)
-            
-            logger.info(f"Created new session with base URL: {base_url}")
+            self.session = self._create_session(self.base_url, self.api_key)
+
+    async def _session_for(self, route: ModelRoute) -> aiohttp.ClientSession:
+        """路由对应的会话：未指定 API 地址和密钥的路由共用默认会话"""
+        base_url = route.api_base or self.base_url
+        api_key = route.api_key or self.api_key
+        if (base_url, api_key) == (self.base_url, self.api_key):
+            await self._ensure_session()
+            return self.session
+        session = self.route_sessions.get((base_url, api_key))
+        if session is None or session.closed:
+            session = self._create_session(base_url, api_key)
+            self.route_sessions[(base_url, api_key)] = session
+        return session
+
+    def _create_session(self, base_url: str, api_key: str) -> aiohttp.ClientSession:
+        """创建指向 base_url 的会话"""
+        # 配置 SSL 上下文
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        
+        # 配置连接超时
+        timeout = aiohttp.ClientTimeout(
+            total=Config.TIMEOUT,  # Overall timeout for the entire operation (resolve, connect, send, headers, body)
+            connect=10,          # Max time to establish a connection
+            sock_read=20         # Max time to read a portion of the response body
+        )
+        
+        # 确保 base_url 以斜杠结尾
+        if not base_url.endswith('/'):
+            base_url += '/'
+        
+        # 配置连接器
+        connector_kwargs = {
+            'ssl': ssl_context,
+            'limit': 15,  # 调整并发连接数
+            'force_close': True,
+            'enable_cleanup_closed': True
+        }
+        
+        connector = aiohttp.TCPConnector(**connector_kwargs)
+        
+        # 创建会话
+        session_kwargs = {
+            'base_url': base_url,
+            'headers': {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            'timeout': timeout,
+            'connector': connector
+        }
+        
+        # 如果使用代理，添加代理配置到会话
+        if Config.USE_PROXY:
+            session_kwargs['proxy'] = Config.PROXY_URLS['https']
+            logger.info(f"Using proxy: {Config.PROXY_URLS}")
+        
+        logger.info(f"Created new session with base URL: {base_url}")
+        return aiohttp.ClientSession(**session_kwargs)
+
+    def _breaker_for(self, route: ModelRoute) -> CircuitBreaker:
+        return get_breaker(route.api_base or self.base_url, route.model)
+
+    async def _backoff_sleep(self, wait_time: float, breaker: Optional[CircuitBreaker] = None):
+        """重试前的退避等待（单独记录 span，便于区分等待与网络耗时）"""
+        if breaker is not None and not breaker.available:
+            # 该模型已熔断，等待后重试也会被拒绝，直接放弃
+            raise CircuitOpenError(breaker.name)
+        with span("retry_backoff", cat="wait", wait_time=wait_time):
+            await asyncio.sleep(wait_time)
+
+    async def _call_llm_async(self, messages: list, require_json: bool = False, require_outline: bool = False,
+                              max_tokens: Optional[int] = None, task: str = TASK_DEFAULT) -> Optional[str]:
+        """
+        按任务路由调用 LLM：依次尝试该任务配置的模型，首选模型重试耗尽仍失败时换下一个。
+        熔断中的模型直接跳过（见 circuit_breaker.py）。
+        要求 JSON 而模型返回了非法 JSON 时，先交给 repair 任务的模型修复。
+        """
+        all_routes = routes_for(task)
+        routes = [route for route in all_routes if self._breaker_for(route).available]
+        if len(routes) < len(all_routes):
+            skipped = [route.model for route in all_routes if route not in routes]
+            logger.warning(f"Skipping models with open circuit for task '{task}': {skipped}")
+        for i, route in enumerate(routes):
+            try:
+                content = await self._call_model_async(route, messages, require_json, require_outline, max_tokens)
+            except InvalidJSONResponse as e:
+                content = None
+                if task != TASK_REPAIR:
+                    content = await self._repair_json_async(e.content)
+            except CircuitOpenError as e:
+                logger.warning(str(e))
+                content = None
+            if content:
+                return content
+            if i + 1 < len(routes):
+                logger.warning(f"Model {route.model} failed for task '{task}', falling back to {routes[i + 1].model}")
+        logger.error(f"All models failed or are unavailable for task '{task}' "
+                     f"({len(routes)}/{len(all_routes)} tried)")
+        return None
+
+    async def _repair_json_async(self, content: str) -> Optional[str]:
+        """用 repair 任务的模型修复非法 JSON"""
+        logger.info("Asking repair model to fix invalid JSON response")
+        return await self._call_llm_async([
+            {"role": "system", "content": Prompts.JSON_REPAIR_SYSTEM_ROLE},
+            {"role": "user", "content": content}
+        ], require_json=True, task=TASK_REPAIR)
+
+    async def _call_model_async(self, route: ModelRoute, messages: list, require_json: bool = False,
+                                require_outline: bool = False, max_tokens: Optional[int] = None) -> Optional[str]:
+        """
+        调用单个模型，合并同时进行的相同请求（single-flight）
+
+        页面重复点击或多人同时操作同一项目时，会同时发出完全相同的请求。指纹相同的请求只向模型发送一次，
+        其余调用方等待同一个任务并得到相同的结果（包括 InvalidJSONResponse 等异常）。
+        调用方通过 shield 等待：某个调用方被取消不会中断其它调用方共享的请求，所有调用方都取消后才取消请求。
+        请求在发起方的会话上执行，发起方 close() 时会等请求结束再关闭会话。
+        """
+        if not Config.LLM_COALESCE_ENABLED:
+            return await self._request_model_async(route, messages, require_json, require_outline, max_tokens)
+
+        key = request_fingerprint(route, route.api_base or self.base_url, route.api_key or self.api_key,
+                                  messages, require_json, require_outline, max_tokens)
+        loop = asyncio.get_running_loop()
+        flight = _inflight.get(key)
+        if flight is not None and not flight.task.done() and flight.task.get_loop() is loop:
+            logger.info(f"Coalescing identical in-flight request to {route.model}")
+            with span("llm_coalesced", cat="wait", model=route.model):
+                return await self._await_flight(flight)
+
+        task = loop.create_task(self._request_model_async(route, messages, require_json, require_outline, max_tokens))
+        flight = _inflight[key] = _Flight(task)
+        self._leading.add(task)
+
+        def forget(done: asyncio.Task):
+            self._leading.discard(done)
+            if _inflight.get(key) is flight:
+                del _inflight[key]
+            # 所有调用方都已取消时，避免"异常未被获取"的警告
+            if not done.cancelled():
+                done.exception()
+
+        task.add_done_callback(forget)
+        return await self._await_flight(flight)
+
+    @staticmethod
+    async def _await_flight(flight: _Flight) -> Optional[str]:
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 所有调用方都已取消，不再需要这次请求
+                flight.task.cancel()
 
-    async def _call_llm_async(self, messages: list, require_json: bool = False, require_outline: bool = False) -> Optional[str]:
+    async def _request_model_async(self, route: ModelRoute, messages: list, require_json: bool = False,
+                                   require_outline: bool = False, max_tokens: Optional[int] = None) -> Optional[str]:
         """
-        异步调用 LLM API。
+        异步调用单个模型。
         包含重试逻辑，当请求超时、遇到速率限制 (429) 或其他可重试的服务器错误时，
         会使用指数退避策略进行重试 (Retry with exponential backoff).
+        每次尝试的结果计入该模型的熔断器，熔断中抛出 CircuitOpenError，不再继续重试。
         """
-        await self._ensure_session()
+        session = await self._session_for(route)
+        scheduler = get_scheduler()
+        breaker = self._breaker_for(route)
         retry_count = 0
         
         # Retry loop with exponential backoff
         while retry_count <= Config.MAX_RETRIES:
+            # 每次尝试都要经熔断器放行，熔断中立即失败，不再发请求和退避等待
+            attempt = breaker.acquire()
+            if attempt is None:
+                raise CircuitOpenError(breaker.name)
             try:
                 request_params = {
-                    "model": Config.LLM_MODEL,
+                    "model": route.model,
                     "messages": messages,
                     "temperature": Config.TEMPERATURE,
-                    "max_tokens": Config.MAX_TOKENS,
+                    "max_tokens": route.cap_tokens(max_tokens),
                     "top_p": Config.TOP_P
                 }
 
-                logger.info(f"Sending request to LLM. Model: {Config.LLM_MODEL}, Messages count: {len(messages)}")
-                logger.debug(f"Sending request with params: {json.dumps(request_params, ensure_ascii=False)}")
-
-                async with self.session.post(
-                    "chat/completions",
-                    json=request_params,
-                    timeout=Config.TIMEOUT
-                ) as response:
-                    # 首先记录原始响应
-                    response_text = await response.text()
-                    logger.debug(f"Raw API response: {response_text}")
+                logger.info(f"Sending request to LLM. Model: {route.model}, Messages count: {len(messages)}")
+                log_payload(logger, "llm_request", request_params)
+
+                # 从进程级调度器领取并发名额，多个生成任务共享同一份供应商额度
+                with span("llm_slot_wait", cat="wait"):
+                    job = await scheduler.acquire()
+                retry_wait = None  # 需要退避重试时的等待秒数，归还并发名额后再等待
+                try:
+                    attempt.start()
+                    with span("llm_attempt", cat="llm", attempt=retry_count + 1, model=route.model):
+                        async with session.post(
+                            "chat/completions",
+                            json=request_params,
+                            timeout=Config.TIMEOUT
+                        ) as response:
+                            # 首先记录原始响应
+                            response_text = await response.text()
+                            log_payload(logger, "llm_response", response_text)
                     
-                    # Check response status
-                    if response.status == 429:
-                        logger.warning(f"Rate limit hit (429). Raw response: {response_text}")
-                        retry_after = response.headers.get("Retry-After")
-                        wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** retry_count) # Default backoff
-                        if retry_after:
-                            try:
-                                wait_time = int(retry_after)
-                                logger.info(f"Using Retry-After header: waiting for {wait_time} seconds.")
-                            except ValueError:
-                                logger.warning(f"Could not parse Retry-After header: '{retry_after}'. Falling back to exponential backoff.")
+                            # Check response status
+                            if response.status == 429:
+                                attempt.release()
+                                logger.warning(f"Rate limit hit (429). Raw response: {truncate_payload(response_text)}")
+                                retry_after = response.headers.get("Retry-After")
+                                wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** retry_count) # Default backoff
+                                if retry_after:
+                                    try:
+                                        wait_time = int(retry_after)
+                                        logger.info(f"Using Retry-After header: waiting for {wait_time} seconds.")
+                                    except ValueError:
+                                        logger.warning(f"Could not parse Retry-After header: '{retry_after}'. Falling back to exponential backoff.")
                         
-                        retry_count += 1
-                        if retry_count <= Config.MAX_RETRIES:
-                            logger.warning(f"Rate limit: Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
-                            await asyncio.sleep(wait_time)
-                            continue 
-                        else:
-                            logger.error("Request failed after maximum retries due to rate limiting.")
-                            return None
-                    elif response.status != 200:
-                        logger.error(f"API returned status {response.status}: {response_text}")
-                        # This is a non-429, non-200 error. Decide if retry is appropriate.
-                        # The ClientResponseError handler below might also catch this if aiohttp raises it.
-                        # For now, let's treat it as a server error and use the generic retry mechanism.
-                        # This could be made more specific (e.g. only retry on 5xx errors)
-                        # The aiohttp.ClientResponseError exception below will handle cases where aiohttp itself raises an error.
-                        # If aiohttp does not raise an exception for this status, this code handles the retry.
+                                retry_count += 1
+                                if retry_count <= Config.MAX_RETRIES:
+                                    logger.warning(f"Rate limit: Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
+                                    retry_wait = wait_time
+                                else:
+                                    logger.error("Request failed after maximum retries due to rate limiting.")
+                                    return None
+                            elif is_client_error(response.status):
+                                # 4xx（408/429 除外）由请求本身引起，不重试，也不计入熔断
+                                attempt.release()
+                                logger.error(f"API rejected the request with status {response.status}, not retrying: "
+                                             f"{truncate_payload(response_text)}")
+                                return None
+                            elif response.status != 200:
+                                attempt.fail()
+                                logger.error(f"API returned status {response.status}: {truncate_payload(response_text)}")
+                                # This is a non-429, non-200 error. Decide if retry is appropriate.
+                                # The ClientResponseError handler below might also catch this if aiohttp raises it.
+                                # For now, let's treat it as a server error and use the generic retry mechanism.
+                                # This could be made more specific (e.g. only retry on 5xx errors)
+                                # The aiohttp.ClientResponseError exception below will handle cases where aiohttp itself raises an error.
+                                # If aiohttp does not raise an exception for this status, this code handles the retry.
                         
-                        # Fall through to general retry logic in exception handlers if this status also causes an exception,
-                        # or handle retry here if it doesn't.
-                        # To avoid potential double retries if an exception IS raised by aiohttp for this status,
-                        # we can just log here and let the exception handlers manage retries for actual exceptions.
-                        # However, if aiohttp doesn't raise an exception for e.g. a 500 that returns a body,
-                        # we would need a retry here.
-                        # Let's assume for now that critical errors that should be retried will be raised as exceptions by aiohttp
-                        # or are handled by specific status checks like 429.
-                        # So, if it's not 200 and not 429, and aiohttp hasn't raised an exception, it's an unexpected success-like failure.
-                        # For robustness, we might still want to retry a few times.
-                        retry_count += 1
-                        if retry_count <= Config.MAX_RETRIES:
-                            wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** (retry_count - 1))
-                            logger.warning(f"API error {response.status}. Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
-                            await asyncio.sleep(wait_time)
-                            continue
-                        else:
-                            logger.error(f"Request failed after maximum retries due to API error {response.status}.")
-                            return None
-
-                    # Successful response (200 OK)
-                    result = json.loads(response_text)
+                                # Fall through to general retry logic in exception handlers if this status also causes an exception,
+                                # or handle retry here if it doesn't.
+                                # To avoid potential double retries if an exception IS raised by aiohttp for this status,
+                                # we can just log here and let the exception handlers manage retries for actual exceptions.
+                                # However, if aiohttp doesn't raise an exception for e.g. a 500 that returns a body,
+                                # we would need a retry here.
+                                # Let's assume for now that critical errors that should be retried will be raised as exceptions by aiohttp
+                                # or are handled by specific status checks like 429.
+                                # So, if it's not 200 and not 429, and aiohttp hasn't raised an exception, it's an unexpected success-like failure.
+                                # For robustness, we might still want to retry a few times.
+                                retry_count += 1
+                                if retry_count <= Config.MAX_RETRIES:
+                                    wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** (retry_count - 1))
+                                    logger.warning(f"API error {response.status}. Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
+                                    retry_wait = wait_time
+                                else:
+                                    logger.error(f"Request failed after maximum retries due to API error {response.status}.")
+                                    return None
+                            else:
+                                # Successful response (200 OK)
+                                try:
+                                    result = json.loads(response_text)
+                                except json.JSONDecodeError:
+                                    # 聚合平台出错时常以 200 返回 HTML 或错误页，计为供应商失败
+                                    attempt.fail()
+                                    logger.error(f"Response body is not JSON: {truncate_payload(response_text)}")
+                                    raise ValueError("Invalid response body")
                     
-                    # 提取内容
-                    if "choices" in result and result["choices"] and "message" in result["choices"][0]:
-                        content = result["choices"][0]["message"]["content"].strip()
+                                # 提取内容
+                                if "choices" in result and result["choices"] and "message" in result["choices"][0]:
+                                    content = result["choices"][0]["message"]["content"].strip()
+                                    # 拿到正文才算供应商正常；正文不是合法 JSON 属于模型输出问题，不计入熔断
+                                    attempt.succeed()
                         
-                        # 如果需要 JSON 格式，尝试解析
-                        if require_json:
-                            try:
-                                if content.startswith('```'):
-                                    content = re.sub(r'^```(?:json)?\s*|\s*```\s*$', '', content)
-                                json_obj = json.loads(content)
-                                content = json.dumps(json_obj, ensure_ascii=False, indent=2)
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Invalid JSON in response: {e}. Content: {content}") # Already logs content
-                                raise
+                                    # 如果需要 JSON 格式，尝试解析
+                                    if require_json:
+                                        try:
+                                            if content.startswith('```'):
+                                                content = re.sub(r'^```(?:json)?\s*|\s*```\s*$', '', content)
+                                            json_obj = json.loads(content)
+                                            content = json.dumps(json_obj, ensure_ascii=False, indent=2)
+                                        except json.JSONDecodeError as e:
+                                            logger.error(f"Invalid JSON in response: {e}. Content: {truncate_payload(content)}")
+                                            raise InvalidJSONResponse(str(e), content)
                         
-                        logger.info(f"Received response from LLM. Content length: {len(content)} chars")
-                        return content
-                    else:
-                        logger.error(f"Unexpected response structure: {result}")
-                        raise ValueError("Invalid response structure")
+                                    logger.info(f"Received response from LLM. Content length: {len(content)} chars")
+                                    return content
+                                else:
+                                    attempt.fail()
+                                    logger.error(f"Unexpected response structure: {truncate_payload(str(result))}")
+                                    raise ValueError("Invalid response structure")
+                finally:
+                    scheduler.release(job)
+
+                if retry_wait is not None:
+                    await self._backoff_sleep(retry_wait, breaker)
+                    continue
 
             except asyncio.TimeoutError:
+                attempt.fail()
                 retry_count += 1
                 if retry_count <= Config.MAX_RETRIES:
                     wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** (retry_count - 1)) # Consistent variable name
                     logger.warning(f"Request timeout. Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
-                    await asyncio.sleep(wait_time)
+                    await self._backoff_sleep(wait_time, breaker)
                     # No continue here, the loop structure will handle it.
                 else:
                     logger.error("Request failed after maximum retries due to timeout.")
                     return None
             except aiohttp.ClientResponseError as e: # Catching specific aiohttp client errors
                 logger.error(f"AIOHTTP ClientResponseError: {e.status} - {e.message}. Response headers: {e.headers}")
+                if is_client_error(e.status):
+                    attempt.release()
+                    logger.error(f"Request rejected with status {e.status}, not retrying.")
+                    return None
+                if e.status == 429:
+                    attempt.release()
+                else:
+                    attempt.fail()
                 # Handle 429 specifically if it's raised as ClientResponseError
                 if e.status == 429:
                     retry_after = e.headers.get("Retry-After")
@@ -210,7 +425,7 @@ class LLMClient:
                     retry_count += 1
                     if retry_count <= Config.MAX_RETRIES:
                         logger.warning(f"Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
-                        await asyncio.sleep(wait_time)
+                        await self._backoff_sleep(wait_time, breaker)
                         continue # Continue to next retry iteration
                     else:
                         logger.error("Request failed after maximum retries due to rate limiting (ClientResponseError).")
@@ -220,39 +435,71 @@ class LLMClient:
                     if retry_count <= Config.MAX_RETRIES:
                         wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** (retry_count - 1))
                         logger.warning(f"ClientResponseError {e.status}. Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
-                        await asyncio.sleep(wait_time)
+                        await self._backoff_sleep(wait_time, breaker)
                         continue
                     else:
                         logger.error(f"Request failed after maximum retries due to ClientResponseError {e.status}.")
                         return None
+            except aiohttp.ClientConnectionError as e:
+                # 连接被拒绝、DNS 失败、连接中断等，与超时一样重试
+                attempt.fail()
+                retry_count += 1
+                if retry_count <= Config.MAX_RETRIES:
+                    wait_time = Config.RETRY_DELAY * (Config.RETRY_BACKOFF ** (retry_count - 1))
+                    logger.warning(f"Connection error: {e}. Retrying in {wait_time} seconds... (Attempt {retry_count}/{Config.MAX_RETRIES})")
+                    await self._backoff_sleep(wait_time, breaker)
+                else:
+                    logger.error(f"Request failed after maximum retries due to connection error: {e}")
+                    return None
+            except (InvalidJSONResponse, CircuitOpenError):
+                raise
             except Exception as e: # General exception catch, should be more specific if possible
+                attempt.fail()
                 logger.error(f"An unexpected error occurred: {e}", exc_info=True)
                 # This general exception might not be suitable for retry, depends on the error.
                 # For now, let's not retry on general exceptions to avoid retry loops on non-transient issues.
                 # Consider if specific exceptions should be caught and retried.
                 # raise # Or return None, depending on desired behavior for unexpected errors
                 return None # For now, return None on unhandled exceptions within the retry loop
+            finally:
+                # 请求被取消等未记录结果的情况，归还熔断器的试探名额
+                attempt.release()
 
     async def generate_section_content_async(self, section: Dict) -> Dict:
         """异步生成单个章节内容"""
+        with span("generate_section_content_async", cat="llm", title=section['title']):
+            return await self._generate_section_content(section)
+
+    async def _generate_section_content(self, section: Dict) -> Dict:
         try:
             # 开始生成
             logger.info(f"=== Generating content for section: {section['title']} ===")
             #logger.info(f"Content boundary: {section['content_summary'][:100]}...")  # 只显示前100个字符
             start_time = time.time()
 
-            prompt = Prompts.CONTENT_SECTION_USER.format(
-                tech_req_md=section['tech_req_md'],
-                scoring_criteria_md=section['scoring_criteria_md'],
-                full_outline_md=section['full_outline_md'],
-                title=section['title'],
-                content_summary=section['content_summary']
-            )
-            
-            content = await self._call_llm_async([
-                {"role": "system", "content": Prompts.CONTENT_SYSTEM_ROLE},
-                {"role": "user", "content": prompt}
-            ])
+            # 背景信息前缀由整篇生成的共享上下文预先格式化，这里只拼接小节部分
+            prefix = section['context'].prompt_prefix
+            if section.get('neighbour_context'):
+                prefix += Prompts.CONTENT_NEIGHBOUR_USER.format(neighbour_context=section['neighbour_context'])
+            if section.get('avoid_content'):
+                prefix += Prompts.CONTENT_AVOID_USER.format(duplicates=section['avoid_content'])
+            if section.get('must_cover'):
+                prefix += Prompts.CONTENT_COVER_USER.format(requirements=section['must_cover'])
+
+            content = None
+            if section.get('paragraphs'):
+                # 长小节：拟定提纲后各段并行生成，提纲失败时退回整节生成
+                content = await self._generate_by_paragraphs(section, prefix)
+            if not content:
+                prompt = prefix + Prompts.CONTENT_SECTION_USER.format(
+                    title=section['title'],
+                    content_summary=section['content_summary'],
+                    min_chars=section.get('min_chars', Config.SECTION_TARGET_CHARS)
+                )
+                content = await self._call_llm_async([
+                    {"role": "system", "content": Prompts.CONTENT_SYSTEM_ROLE},
+                    {"role": "user", "content": prompt}
+                ], max_tokens=section.get('max_tokens'), task=section.get('task', TASK_SECTION_HIGH))
 
             # 完成生成
             elapsed_time = time.time() - start_time
@@ -273,6 +520,86 @@ class LLMClient:
                 'content': f"生成失败：{str(e)}"
             }
 
+    async def _plan_paragraphs(self, section: Dict, prefix: str) -> Optional[List[Dict]]:
+        """一次快速调用拟定小节的段落提纲：[{'title', 'points'}]"""
+        prompt = prefix + Prompts.SECTION_PLAN_USER.format(
+            title=section['title'],
+            content_summary=section['content_summary'],
+            count=section['paragraphs']
+        )
+        with span("plan_section", cat="llm", title=section['title']):
+            plan = await self._call_llm_async([
+                {"role": "system", "content": Prompts.CONTENT_SYSTEM_ROLE},
+                {"role": "user", "content": prompt}
+            ], require_json=True, max_tokens=Config.SUBCHUNK_PLAN_TOKENS, task=TASK_PLAN)
+        if not plan:
+            return None
+        try:
+            paragraphs = json.loads(plan).get('paragraphs') or []
+        except (json.JSONDecodeError, AttributeError):
+            return None
+        paragraphs = [
+            {'title': str(p.get('title', '')).strip(), 'points': str(p.get('points', '')).strip()}
+            for p in paragraphs if isinstance(p, dict) and p.get('title')
+        ]
+        return paragraphs[:section['paragraphs']] if len(paragraphs) >= 2 else None
+
+    async def _generate_by_paragraphs(self, section: Dict, prefix: str) -> Optional[str]:
+        """
+        分段并行生成长小节
+
+        单次长输出的耗时取决于整段解码，分段后取决于最长的一段；某段失败也不会丢掉其它段。
+        各段按提纲顺序拼接，再经 Prompts.optimize_overlapping 做连贯性处理。
+        """
+        plan = await self._plan_paragraphs(section, prefix)
+        if not plan:
+            logger.warning(f"Paragraph planning failed for {section['title']}, generating it in one call")
+            return None
+
+        count = len(plan)
+        plan_md = "\n".join(f"{i + 1}. {p['title']}：{p['points']}" for i, p in enumerate(plan))
+        min_chars = section.get('min_chars', Config.SECTION_TARGET_CHARS)
+        section_tokens = section.get('max_tokens') or Config.MAX_TOKENS
+        # 每段预算留出余量，但不超过整节预算
+        paragraph_tokens = min(section_tokens, max(1024, section_tokens * 2 // count))
+        task = section.get('task', TASK_SECTION_HIGH)
+
+        async def generate_paragraph(i: int, paragraph: Dict) -> Optional[str]:
+            prompt = prefix + Prompts.SECTION_PARAGRAPH_USER.format(
+                title=section['title'],
+                content_summary=section['content_summary'],
+                plan=plan_md,
+                index=i + 1,
+                paragraph_title=paragraph['title'],
+                points=paragraph['points'],
+                min_chars=max(200, int(round(min_chars / count, -2)))
+            )
+            with span("generate_paragraph", cat="llm", title=section['title'], index=i + 1):
+                return await self._call_llm_async([
+                    {"role": "system", "content": Prompts.CONTENT_SYSTEM_ROLE},
+                    {"role": "user", "content": prompt}
+                ], max_tokens=paragraph_tokens, task=task)
+
+        texts = await asyncio.gather(*(generate_paragraph(i, p) for i, p in enumerate(plan)))
+        if not any(texts):
+            return None
+        failed = sum(1 for text in texts if not text)
+        if failed:
+            logger.warning(f"{failed}/{count} paragraphs failed for {section['title']}")
+
+        blocks = [
+            ContentBlock(content=text or f"（本段内容缺失，请手动补充：{paragraph['title']}）", title=paragraph['title'])
+            for paragraph, text in zip(plan, texts)
+        ]
+        # 连贯性处理用到 spaCy，在解析进程池中执行，避免阻塞事件循环
+        try:
+            blocks = await get_nlp_pool().optimize_overlapping(blocks)
+        except Exception as e:
+            # 缺少 spaCy 模型、解析进程池异常等：保留已生成的各段，直接按顺序拼接
+            logger.error(f"Coherence pass failed for {section['title']}, joining paragraphs as generated: {e}",
+                         exc_info=True)
+        return "\n\n".join(block.content for block in blocks)
+
     async def generate_content_init_async(self, tech_content: str, score_content: str, outline: str) -> bool:
         """初始化内容生成的背景信息"""
         try:
@@ -282,33 +609,55 @@ class LLMClient:
                 outline=outline
             )
             self.start_new_chat(Prompts.CONTENT_SYSTEM_ROLE)
-            response = await self.generate_chat_text_async(prompt)
+            response = await self.generate_chat_text_async(prompt, pin=True)
             return bool(response)
         except Exception as e:
             logger.error(f"Error initializing content generation: {e}")
             return False
 
     async def close(self):
-        """关闭会话"""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            self.session = None
+        """关闭会话；本客户端发起的合并请求还有其它调用方在等待时，请求结束后再在后台关闭"""
+        sessions = [session for session in [self.session, *self.route_sessions.values()]
+                    if session and not session.closed]
+        self.session = None
+        self.route_sessions = {}
+        pending = [task for task in self._leading if not task.done()]
+        if pending:
+            task = asyncio.ensure_future(self._close_sessions(sessions, pending))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        else:
+            await self._close_sessions(sessions)
+
+    @staticmethod
+    async def _close_sessions(sessions: List[aiohttp.ClientSession], pending: List[asyncio.Task] = ()):
+        if pending:
+            await asyncio.wait(pending)
+        for session in sessions:
+            await session.close()
+
+    @property
+    def messages(self) -> list:
+        """当前对话在 token 预算内的消息列表"""
+        return self.history.messages()
 
     def start_new_chat(self, system_role: str):
         """开始新的对话"""
-        self.messages = [{"role": "system", "content": system_role}]
+        self.history.start(system_role)
         
     def add_message(self, role: str, content: str):
         """添加消息到对话历史"""
-        self.messages.append({"role": role, "content": content})
+        self.history.add(role, content)
         
-    async def generate_text_async(self, prompt=None, system_role=None, messages=None, require_json=False, require_outline=False) -> str:
+    async def generate_text_async(self, prompt=None, system_role=None, messages=None, require_json=False, require_outline=False,
+                                  task=TASK_DEFAULT) -> str:
         """异步生成文本
         :param prompt: 单条提示词
         :param system_role: 系统角色设定
         :param messages: 完整的消息列表（如果提供，则忽略 prompt 和 system_role）
         :param require_json: 是否要求 JSON 格式响应
         :param require_outline: 是否要求大纲格式（包含 body_paragraphs 字段）
+        :param task: 任务类型，决定使用的模型（见 model_router）
         """
         try:
             if messages is None:
@@ -317,18 +666,24 @@ class LLMClient:
                     {"role": "user", "content": prompt}
                 ]
             
-            return await self._call_llm_async(messages, require_json=require_json, require_outline=require_outline)
+            return await self._call_llm_async(messages, require_json=require_json, require_outline=require_outline, task=task)
         except Exception as e:
             logger.error(f"Error in generate_text: {e}", exc_info=True)
             return None
             
-    async def generate_chat_text_async(self, prompt: str) -> str:
-        """异步在现有对话中生成文本（用于内容生成）"""
+    async def generate_chat_text_async(self, prompt: str, pin: bool = False) -> str:
+        """异步在现有对话中生成文本（用于内容生成）
+        :param pin: 是否固定这一轮（背景信息初始化），固定的轮次不会被摘要
+        """
         try:
             self.add_message("user", prompt)
-            response = await self._call_llm_async(self.messages, require_json=False)
+            response = await self._call_llm_async(self.messages, require_json=False, task=TASK_CHAT)
             if response:
                 self.add_message("assistant", response)
+                if pin:
+                    self.history.pin_last_turn()
+            else:
+                self.history.discard_last_message()
             return response
         except Exception as e:
             logger.error(f"Error in generate_chat_text: {e}", exc_info=True)
@@ -0,0 +1,168 @@
+# logging_setup.py
+
+"""
+日志配置
+
+- 所有日志先进入内存队列（QueueHandler），由后台线程（QueueListener）写文件和控制台，
+  事件循环中的 logger 调用只做入队，不做磁盘 I/O
+- app.log 按大小轮转（RotatingFileHandler），不会无限增长
+- 提示词、原始响应等大段正文通过 log_payload 记录：DEBUG 级按采样率记录截断后的正文，
+  其余只记录长度；开启 LOG_PAYLOAD_CAPTURE 后完整正文另写入 gzip 压缩的 JSONL 文件
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from typing import Any, Optional
+
+from config import Config
+
+PAYLOAD_LOGGER = 'payloads'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class GzipJsonlHandler(logging.Handler):
+    """把 payload 记录以 JSON 行追加写入 gzip 文件（每次启动追加一个 gzip 成员）"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._stream = None
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self._stream is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._stream = gzip.open(self.path, 'at', encoding='utf-8')
+            self._stream.write(json.dumps({
+                'ts': record.created,
+                'kind': record.msg,
+                'logger': record.args.get('logger'),
+                'data': record.args.get('data')
+            }, ensure_ascii=False) + '\n')
+            self._stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        super().close()
+
+
+class _PayloadQueueHandler(logging.handlers.QueueHandler):
+    """payload 记录原样入队，不在调用线程里格式化大段正文"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _only(name: str):
+    return lambda record: record.name == name
+
+
+def _exclude(name: str):
+    return lambda record: record.name != name
+
+
+def setup_logging():
+    """配置根日志器，重复调用无副作用"""
+    global _listener
+    if _listener is not None:
+        return
+
+    Config.LOG_DIR.mkdir(parents=True, exist_ok=True)
+    log_queue = queue.SimpleQueue()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        Config.LOG_DIR / 'app.log',
+        maxBytes=Config.LOG_MAX_BYTES,
+        backupCount=Config.LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.setLevel(Config.LOG_LEVEL)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    file_handler.addFilter(_exclude(PAYLOAD_LOGGER))
+
+    # 控制台只显示关键信息
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    console_handler.addFilter(_exclude(PAYLOAD_LOGGER))
+
+    handlers = [file_handler, console_handler]
+    if Config.LOG_PAYLOAD_CAPTURE:
+        payload_handler = GzipJsonlHandler(Config.LOG_PAYLOAD_FILE)
+        payload_handler.addFilter(_only(PAYLOAD_LOGGER))
+        handlers.append(payload_handler)
+
+        payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+        payload_logger.propagate = False
+        payload_logger.setLevel(logging.DEBUG)
+        payload_logger.addHandler(_PayloadQueueHandler(log_queue))
+
+    root_logger = logging.getLogger()
+    root_logger.handlers = []  # 清除之前的处理器
+    root_logger.setLevel(Config.LOG_LEVEL)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    # 配置第三方库的日志级别
+    for name in ('httpcore', 'httpx', 'openai', 'urllib3', 'asyncio'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台写日志线程，写完队列中剩余的记录"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def truncate_payload(text: str, limit: Optional[int] = None) -> str:
+    """保留首尾，中间省略"""
+    limit = Config.LOG_PAYLOAD_CHARS if limit is None else limit
+    if len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    tail = limit - head
+    return f"{text[:head]} …[省略 {len(text) - limit} 字符]… {text[len(text) - tail:]}"
+
+
+def log_payload(logger: logging.Logger, kind: str, data: Any):
+    """
+    记录请求/响应正文
+
+    :param kind: 正文类型，如 llm_request、llm_response
+    :param data: 字符串，或可 JSON 序列化的对象（仅在确实需要记录时才序列化）
+    """
+    capture = Config.LOG_PAYLOAD_CAPTURE and _listener is not None
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if not capture and not debug:
+        return
+    sampled = debug and random.random() < Config.LOG_PAYLOAD_SAMPLE_RATE
+    if not sampled and not capture:
+        # 未采样时不序列化正文
+        logger.debug(f"{kind} ({len(data)} chars)" if isinstance(data, str) else kind)
+        return
+
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    if sampled:
+        logger.debug(f"{kind} ({len(text)} chars): {truncate_payload(text)}")
+    elif debug:
+        logger.debug(f"{kind} ({len(text)} chars)")
+    if capture:
+        logging.getLogger(PAYLOAD_LOGGER).debug(kind, {'data': text, 'logger': logger.name})
@@ -0,0 +1,69 @@
+# model_router.py
+
+"""
+按任务选择模型
+
+Config.MODEL_ROUTES 为每类任务配置一组模型，第一个为首选，其余依次作为备选：
+首选模型重试耗尽仍失败时，自动换下一个。任务类型：
+    outline        生成大纲（结构化 JSON，适合快速模型）
+    section_high   高分值小节正文（见 Config.SECTION_HIGH_TIER_RATIO）
+    section_low    其余小节正文
+    chat           对话模式
+    plan           长小节分段生成前的提纲规划（适合快速模型）
+    repair         修复模型返回的非法 JSON
+每个路由可写 model、api_base、api_key（或 api_key_env，从环境变量读取）、max_tokens（该模型的输出上限），
+未写的字段沿用 LLM_MODEL / LLM_API_BASE / LLM_API_KEY。某任务未配置时使用默认模型。
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from config import Config
+
+TASK_OUTLINE = 'outline'
+TASK_SECTION_HIGH = 'section_high'
+TASK_SECTION_LOW = 'section_low'
+TASK_CHAT = 'chat'
+TASK_REPAIR = 'repair'
+TASK_PLAN = 'plan'
+TASK_DEFAULT = 'default'
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    model: str
+    api_base: Optional[str] = None
+    api_key: Optional[str] = None
+    max_tokens: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ModelRoute':
+        api_key = data.get('api_key')
+        if not api_key and data.get('api_key_env'):
+            api_key = os.getenv(data['api_key_env'])
+        return cls(
+            model=data.get('model') or Config.LLM_MODEL,
+            api_base=data.get('api_base'),
+            api_key=api_key,
+            max_tokens=data.get('max_tokens')
+        )
+
+    def cap_tokens(self, max_tokens: Optional[int]) -> int:
+        """请求的输出预算不超过该模型的上限"""
+        max_tokens = max_tokens or Config.MAX_TOKENS
+        return min(max_tokens, self.max_tokens) if self.max_tokens else max_tokens
+
+
+def routes_for(task: str) -> List[ModelRoute]:
+    """任务对应的模型列表（首选在前），未配置时为默认模型"""
+    configured = Config.MODEL_ROUTES.get(task) or []
+    routes = [ModelRoute.from_dict(route) for route in configured]
+    return routes or [ModelRoute(Config.LLM_MODEL)]
+
+
+def section_task(weight: Optional[float], top_weight: Optional[float]) -> str:
+    """按评分权重把小节分到 section_high / section_low"""
+    if weight is None or not top_weight:
+        return TASK_SECTION_HIGH
+    return TASK_SECTION_HIGH if weight >= top_weight * Config.SECTION_HIGH_TIER_RATIO else TASK_SECTION_LOW
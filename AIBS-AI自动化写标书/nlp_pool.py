@@ -0,0 +1,178 @@
+# nlp_pool.py
+
+"""
+spaCy 后处理进程池
+
+分块、关系提取、连贯性检查都要跑 spaCy 模型，属于 CPU 密集的同步计算：
+在事件循环里直接调用会卡住所有 HTTP 请求和 LLM 流，而且只能用到一个核。
+
+这里把模型解析放到常驻的工作进程中：
+- 每个工作进程启动时加载一次模型（spawn 方式启动，避免 fork 已加载的 torch 模型）
+- 待解析的文本按进程数切成连续分片，每个分片在进程内用 nlp.pipe 批量解析，多核并行
+- 工作进程只返回相似度和重合度计算所需的特征（文档向量、非停用词集合、token 数），
+  相似度矩阵等轻量计算回到主进程完成；每块文本只解析一次，不再按块对重复解析
+
+Config.NLP_WORKERS 为 0 时不启动进程，在线程池中解析（仍不阻塞事件循环）。
+"""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+from config import Config
+
+if TYPE_CHECKING:
+    # prompts 在运行时才导入（它又依赖本模块）
+    from prompts import ContentBlock
+
+logger = logging.getLogger(__name__)
+
+_nlp = None
+
+
+def get_nlp():
+    """按需加载中文模型（首次调用时加载，进程内只加载一次）"""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        try:
+            _nlp = spacy.load("zh_core_web_trf")
+        except OSError:
+            logger.warning("未安装 zh_core_web_trf，自动降级为 zh_core_web_sm，部分相似度功能不准确。"
+                           "建议运行 python -m spacy download zh_core_web_trf 安装大模型。")
+            _nlp = spacy.load("zh_core_web_sm")
+    return _nlp
+
+
+@dataclass
+class DocFeatures:
+    """一段文本的解析结果中，相似度和连贯性计算用到的部分"""
+    vector: np.ndarray
+    norm: float
+    terms: FrozenSet[str]
+    length: int
+
+    def similarity(self, other: 'DocFeatures') -> float:
+        """与 spaCy Doc.similarity 一致：文档向量的余弦相似度，空向量时为 0"""
+        if not self.norm or not other.norm:
+            return 0.0
+        return float(np.dot(self.vector, other.vector) / (self.norm * other.norm))
+
+
+def analyze_texts(texts: Sequence[str], batch_size: Optional[int] = None) -> List[DocFeatures]:
+    """在当前进程中批量解析文本"""
+    nlp = get_nlp()
+    features = []
+    for doc in nlp.pipe(texts, batch_size=batch_size or Config.NLP_BATCH_SIZE):
+        vector = np.asarray(doc.vector, dtype=np.float32)
+        features.append(DocFeatures(
+            vector=vector,
+            norm=float(np.linalg.norm(vector)),
+            terms=frozenset(token.text for token in doc if not token.is_stop),
+            length=len(doc)
+        ))
+    return features
+
+
+def _init_worker():
+    get_nlp()
+
+
+class NLPPool:
+    """常驻的 spaCy 解析进程池，对外提供异步接口"""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = Config.NLP_WORKERS if workers is None else workers
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+                logger.info(f"NLP pool started with {self.workers} worker processes")
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nlp')
+        return self._executor
+
+    async def analyze(self, texts: Sequence[str]) -> List[DocFeatures]:
+        """把文本按进程数分片并行解析，结果保持输入顺序"""
+        texts = list(texts)
+        if not texts:
+            return []
+        shards = max(1, min(self.workers, len(texts)))
+        size = math.ceil(len(texts) / shards)
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(executor, analyze_texts, texts[i:i + size])
+                for i in range(0, len(texts), size)
+            ))
+        except BrokenProcessPool:
+            # 工作进程异常退出（如内存不足被杀）后进程池不可再用，丢弃它，下次调用重新启动
+            self._discard(executor)
+            raise
+        return [features for shard in results for features in shard]
+
+    async def extract_relationships(self, blocks: List['ContentBlock']) -> dict:
+        from prompts import Prompts
+        features = await self.analyze([block.content for block in blocks])
+        return Prompts.extract_relationships(blocks, features)
+
+    async def optimize_overlapping(self, blocks: List['ContentBlock']) -> List['ContentBlock']:
+        """补全块间关系后做连贯性处理（与 Prompts.extract_relationships + optimize_overlapping 一致）"""
+        from prompts import Prompts
+        features = await self.analyze([block.content for block in blocks])
+        relationships = Prompts.extract_relationships(blocks, features)
+        for block in blocks:
+            block.related_sections = relationships.get(block.title, [])
+        return Prompts.optimize_overlapping(blocks, features)
+
+    async def split_content(self, content: str, max_tokens: int = 2000) -> List['ContentBlock']:
+        from prompts import Prompts
+        blocks = Prompts.split_content(content, max_tokens, analyze=False)
+        relationships = await self.extract_relationships(blocks)
+        for block in blocks:
+            block.related_sections = relationships.get(block.title, [])
+        return blocks
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _discard(self, executor: Executor):
+        executor.shutdown(wait=False)
+        if self._executor is executor:
+            logger.warning("NLP pool is broken, it will be restarted on next use")
+            self._executor = None
+
+
+_pool: Optional[NLPPool] = None
+
+
+def get_nlp_pool() -> NLPPool:
+    """进程内共用的解析池"""
+    global _pool
+    if _pool is None:
+        _pool = NLPPool()
+    return _pool
+
+
+def shutdown_nlp_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,182 @@
+# outline.py
+
+"""
+大纲数据模型
+
+- Outline / Chapter / Section / SubSection：与 outline.json（body_paragraphs）一一对应，
+  使用 __slots__ 减少大纲很大时的内存占用，to_dict / from_dict 可无损互转
+- OutlineIndex：把三级大纲展平成节点表（标题、层级、父节点下标、位置），
+  预先建立 id→节点、子节点列表，父路径、前后兄弟节点的查找都是 O(层级深度)
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+Position = Tuple[int, ...]
+
+
+def position_key(position: Position) -> str:
+    """节点在大纲中的下标 (章, 节, 小节) -> 节点 id / 片段键，键的字典序即大纲顺序"""
+    return "-".join(f"{i:03d}" for i in position)
+
+
+@dataclass
+class SubSection:
+    __slots__ = ('sub_section_title', 'content_summary')
+    sub_section_title: str
+    content_summary: str
+
+    def to_dict(self):
+        return {
+            'sub_section_title': self.sub_section_title,
+            'content_summary': self.content_summary
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SubSection':
+        return cls(data['sub_section_title'], data['content_summary'])
+
+
+@dataclass
+class Section:
+    __slots__ = ('section_title', 'sub_sections')
+    section_title: str
+    sub_sections: List[SubSection]
+
+    def to_dict(self):
+        return {
+            'section_title': self.section_title,
+            'sub_sections': [sub.to_dict() for sub in self.sub_sections]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Section':
+        return cls(data['section_title'], [SubSection.from_dict(sub) for sub in data['sub_sections']])
+
+
+@dataclass
+class Chapter:
+    __slots__ = ('chapter_title', 'sections')
+    chapter_title: str
+    sections: List[Section]
+
+    def to_dict(self):
+        return {
+            'chapter_title': self.chapter_title,
+            'sections': [section.to_dict() for section in self.sections]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Chapter':
+        return cls(data['chapter_title'], [Section.from_dict(section) for section in data['sections']])
+
+
+@dataclass
+class Outline:
+    __slots__ = ('body_paragraphs',)
+    body_paragraphs: List[Chapter]
+
+    def to_dict(self):
+        return {
+            'body_paragraphs': [chapter.to_dict() for chapter in self.body_paragraphs]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Outline':
+        return cls([Chapter.from_dict(chapter) for chapter in data['body_paragraphs']])
+
+
+class OutlineIndex:
+    """
+    展平的大纲节点表
+
+    节点按大纲顺序（先序）编号，每个节点记录标题、层级（1 章 / 2 节 / 3 小节）、
+    内容边界（仅小节）、父节点下标和位置元组；节点 id 为 position_key(位置)。
+    字符串与 Outline 共享，不做复制。
+    """
+
+    __slots__ = ('outline', 'titles', 'summaries', 'levels', 'parents', 'positions',
+                 'children', 'roots', 'subsection_nodes', 'id_to_node')
+
+    def __init__(self, outline: Outline):
+        self.outline = outline
+        self.titles: List[str] = []
+        self.summaries: List[Optional[str]] = []
+        self.levels: List[int] = []
+        self.parents: List[int] = []
+        self.positions: List[Position] = []
+        self.children: List[List[int]] = []
+        self.roots: List[int] = []
+        self.subsection_nodes: List[int] = []
+        self.id_to_node: Dict[str, int] = {}
+
+        for ci, chapter in enumerate(outline.body_paragraphs):
+            chapter_node = self._add(chapter.chapter_title, None, 1, -1, (ci,))
+            for si, section in enumerate(chapter.sections):
+                section_node = self._add(section.section_title, None, 2, chapter_node, (ci, si))
+                for ssi, sub_section in enumerate(section.sub_sections):
+                    node = self._add(sub_section.sub_section_title, sub_section.content_summary,
+                                     3, section_node, (ci, si, ssi))
+                    self.subsection_nodes.append(node)
+
+    def _add(self, title: str, summary: Optional[str], level: int, parent: int, position: Position) -> int:
+        node = len(self.titles)
+        self.titles.append(title)
+        self.summaries.append(summary)
+        self.levels.append(level)
+        self.parents.append(parent)
+        self.positions.append(position)
+        self.children.append([])
+        (self.children[parent] if parent >= 0 else self.roots).append(node)
+        self.id_to_node[position_key(position)] = node
+        return node
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'OutlineIndex':
+        return cls(Outline.from_dict(data))
+
+    def to_dict(self) -> dict:
+        return self.outline.to_dict()
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def node(self, node_id: str) -> int:
+        """节点 id -> 节点下标"""
+        return self.id_to_node[node_id]
+
+    def node_id(self, node: int) -> str:
+        return position_key(self.positions[node])
+
+    def path(self, node: int) -> List[int]:
+        """从章到该节点的祖先链（含自身）"""
+        chain = []
+        while node >= 0:
+            chain.append(node)
+            node = self.parents[node]
+        chain.reverse()
+        return chain
+
+    def siblings(self, node: int) -> List[int]:
+        """同一父节点下的全部节点（含自身），按大纲顺序"""
+        parent = self.parents[node]
+        return self.children[parent] if parent >= 0 else self.roots
+
+    def previous_sibling(self, node: int) -> Optional[int]:
+        i = self.positions[node][-1]
+        return self.siblings(node)[i - 1] if i > 0 else None
+
+    def next_sibling(self, node: int) -> Optional[int]:
+        siblings = self.siblings(node)
+        i = self.positions[node][-1]
+        return siblings[i + 1] if i + 1 < len(siblings) else None
+
+    def iter_subsections(self) -> Iterator[Tuple[Position, int]]:
+        """按大纲顺序遍历所有小节：(位置, 节点下标)"""
+        for node in self.subsection_nodes:
+            yield self.positions[node], node
+
+    def count(self, level: int = 3) -> int:
+        if level == 3:
+            return len(self.subsection_nodes)
+        return sum(1 for node_level in self.levels if node_level == level)
@@ -2,17 +2,13 @@ from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
 import json
 import jsonschema
-import spacy
 import networkx as nx
 from nltk import edit_distance
 from collections import defaultdict
 
-# 加载中文模型
-try:
-    nlp = spacy.load("zh_core_web_trf")
-except OSError:
-    print("警告：未安装 zh_core_web_trf，自动降级为 zh_core_web_sm，部分相似度功能不准确。建议运行 python -m spacy download zh_core_web_trf 安装大模型。")
-    nlp = spacy.load("zh_core_web_sm")
+# 中文模型在首次使用时加载；异步场景请用 nlp_pool.get_nlp_pool() 在工作进程中解析
+from nlp_pool import DocFeatures, analyze_texts, get_nlp
+from chunker import iter_chunks
 
 @dataclass
 class ContentBlock:
@@ -160,6 +156,106 @@ class Prompts:
 5. 直接返回完整的 JSON，不要有任何其他文字
 6. 确保 JSON 格式正确，不要截断"""
 
+    # 2. 内容生成相关提示词
+    CONTENT_SYSTEM_ROLE = """你是一名专业的技术方案撰写专家，擅长编写 IT 信息化项目的技术文档。
+你需要确保：
+1. 使用专业、准确的技术术语
+2. 采用连续行文的方式，避免过多的分点、分条
+3. 保持客观、严谨的科技文档风格
+4. 确保内容的连贯性和完整性
+5. 每个三级标题的内容不少于5000字
+6. 适当使用专业的图表描述（使用 mermaid 语法）"""
+
+    CONTENT_INIT_USER = """请记住以下项目背景信息，后续我将逐段发送三级标题及其内容边界，请你据此生成具体内容：
+
+【技术要求】
+{tech_content}
+
+【评分标准】
+{score_content}
+
+【文档大纲】
+{outline}"""
+
+    # 各小节共用的背景信息前缀，整篇生成时只格式化一次
+    CONTENT_CONTEXT_USER = """请基于以下项目背景信息，生成指定章节的具体内容：
+
+【技术要求】
+{tech_req_md}
+
+【评分标准】
+{scoring_criteria_md}
+
+【文档大纲】
+{full_outline_md}
+
+"""
+
+    # 修复非法 JSON（model_router 的 repair 任务）
+    JSON_REPAIR_SYSTEM_ROLE = """你是 JSON 修复工具。用户会发送一段格式有误的 JSON，请修正其中的语法错误（如缺失或多余的引号、括号、逗号），
+不要增删或改写任何内容，只输出修复后的标准 JSON，不要包含任何解释或代码块标记。"""
+
+    CONTENT_NEIGHBOUR_USER = """【已完成的相邻小节摘要】
+{neighbour_context}
+
+请与上述内容保持衔接，避免重复论述。
+
+"""
+
+    CONTENT_AVOID_USER = """【避免重复】
+以下段落已在其它小节中写过，本小节不要重复这些内容和表述，请围绕本小节的内容边界展开：
+{duplicates}
+
+"""
+
+    CONTENT_COVER_USER = """【必须覆盖的要求】
+以下招标要求目前在全文中没有得到回应，请在本小节中结合内容边界逐条作出具体响应：
+{requirements}
+
+"""
+
+    CONTENT_SECTION_USER = """【标题】
+{title}
+
+【内容边界】
+{content_summary}
+
+要求：
+1. 只生成正文内容，不要包含标题
+2. 内容不少于{min_chars}字
+3. 使用连续行文的方式
+4. 保持专业、严谨的文档风格
+5. 确保与整体技术方案的一致性"""
+
+    # 长小节分段生成：提纲规划与单段生成
+    SECTION_PLAN_USER = """【标题】
+{title}
+
+【内容边界】
+{content_summary}
+
+请先为本小节拟定写作提纲：划分为 {count} 个段落，每段给出小标题和要点，段落之间内容不重复，按逻辑顺序排列。
+只输出 JSON，格式为：
+{{"paragraphs": [{{"title": "段落小标题", "points": "本段要点"}}]}}"""
+
+    SECTION_PARAGRAPH_USER = """【标题】
+{title}
+
+【内容边界】
+{content_summary}
+
+【本小节提纲】
+{plan}
+
+现在只撰写第 {index} 段「{paragraph_title}」，要点：{points}
+
+要求：
+1. 只生成本段正文，不要包含标题，不要展开其它段落的要点
+2. 本段不少于{min_chars}字
+3. 使用连续行文的方式
+4. 保持专业、严谨的文档风格
+5. 确保与整体技术方案的一致性"""
+
     @classmethod
     def extract_chapter_title(cls, content: str) -> str:
         """
@@ -191,21 +287,26 @@ class Prompts:
         Returns:
             float: 相似度分数（0-1）
         """
+        nlp = get_nlp()
         doc1 = nlp(block1)
         doc2 = nlp(block2)
         return doc1.similarity(doc2)
 
     @classmethod
-    def extract_relationships(cls, blocks: List[ContentBlock]) -> Dict[str, List[str]]:
+    def extract_relationships(cls, blocks: List[ContentBlock],
+                              features: Optional[List[DocFeatures]] = None) -> Dict[str, List[str]]:
         """
         提取内容块之间的关系
         
         Args:
             blocks: 内容块列表
+            features: 各块的解析特征（如已由 NLPPool 解析），未提供时在当前进程解析
             
         Returns:
             dict: 章节关系图
         """
+        if features is None:
+            features = analyze_texts([block.content for block in blocks])
         relationships = defaultdict(list)
         G = nx.Graph()
         
@@ -216,7 +317,7 @@ class Prompts:
         # 计算相似度并建立关系
         for i in range(len(blocks)):
             for j in range(i + 1, len(blocks)):
-                score = cls.calculate_similarity(blocks[i].content, blocks[j].content)
+                score = features[i].similarity(features[j])
                 if score > 0.3:  # 相似度阈值
                     G.add_edge(blocks[i].title, blocks[j].title, weight=score)
                     relationships[blocks[i].title].append(blocks[j].title)
@@ -225,60 +326,30 @@ class Prompts:
         return relationships
 
     @classmethod
-    def split_content(cls, content: str, max_tokens: int = 2000) -> List[ContentBlock]:
+    def split_content(cls, content: str, max_tokens: int = 2000, analyze: bool = True) -> List[ContentBlock]:
         """
         将长文本内容按章节分块，并分析块间关系
         
         Args:
             content: 需要分块的内容
             max_tokens: 每块的最大token数
+            analyze: 是否分析块间关系（NLPPool.split_content 在工作进程中另行分析）
             
         Returns:
             list: 分块后的内容块列表
         """
         if not content:
             return []
-            
-        blocks = []
-        current_block = ""
-        current_tokens = 0
-        
-        # 按章节标题分隔
-        lines = content.split('\n')
-        current_title = ""
-        
-        for line in lines:
-            line = line.strip()
-            
-            # 检测到新章节标题
-            if line and (line[0].isdigit() or line.startswith('第')):
-                if current_block:
-                    blocks.append(ContentBlock(
-                        content=current_block.strip(),
-                        title=current_title
-                    ))
-                    current_block = ""
-                current_title = line
-                
-            # 如果当前块加上新行会超过限制，则创建新块
-            if current_tokens + len(line) > max_tokens and current_block:
-                blocks.append(ContentBlock(
-                    content=current_block.strip(),
-                    title=current_title
-                ))
-                current_block = line + '\n'
-                current_tokens = len(line)
-                continue
-                
-            current_block += line + '\n'
-            current_tokens += len(line)
-            
-        if current_block:
-            blocks.append(ContentBlock(
-                content=current_block.strip(),
-                title=current_title
-            ))
-            
+
+        # 按章节标题和 token 上限流式分块
+        blocks = [
+            ContentBlock(content=chunk.text, title=chunk.title)
+            for chunk in iter_chunks(content.splitlines(), max_tokens)
+        ]
+
+        if not analyze:
+            return blocks
+
         # 分析块间关系
         relationships = cls.extract_relationships(blocks)
         
@@ -289,45 +360,47 @@ class Prompts:
         return blocks
 
     @classmethod
-    def check_coherence(cls, block1: ContentBlock, block2: ContentBlock) -> float:
+    def check_coherence(cls, block1: ContentBlock, block2: ContentBlock,
+                        features1: Optional[DocFeatures] = None,
+                        features2: Optional[DocFeatures] = None) -> float:
         """
         检查两个相邻块的连贯性
         
         Args:
             block1: 前一个块
             block2: 后一个块
+            features1, features2: 两块的解析特征，未提供时在当前进程解析
             
         Returns:
             float: 连贯性评分（0-1）
         """
+        if features1 is None or features2 is None:
+            features1, features2 = analyze_texts([block1.content, block2.content])
+
         # 计算相似度
-        similarity = cls.calculate_similarity(block1.content, block2.content)
-        
-        # 检查主题连续性
-        title1 = block1.title.lower()
-        title2 = block2.title.lower()
+        similarity = features1.similarity(features2)
         
         # 检查是否存在重叠的关键概念
-        doc1 = nlp(block1.content)
-        doc2 = nlp(block2.content)
-        
-        overlap = len(set([token.text for token in doc1 if not token.is_stop]) & 
-                     set([token.text for token in doc2 if not token.is_stop]))
+        overlap = len(features1.terms & features2.terms)
         
         # 综合评分
-        return (similarity + (overlap / max(len(doc1), len(doc2)))) / 2
+        return (similarity + (overlap / max(features1.length, features2.length, 1))) / 2
 
     @classmethod
-    def optimize_overlapping(cls, blocks: List[ContentBlock]) -> List[ContentBlock]:
+    def optimize_overlapping(cls, blocks: List[ContentBlock],
+                             features: Optional[List[DocFeatures]] = None) -> List[ContentBlock]:
         """
         优化重叠区域，确保内容连贯性
         
         Args:
             blocks: 内容块列表
+            features: 各块的解析特征（按原始内容解析），未提供时在当前进程解析
             
         Returns:
             list: 优化后的内容块列表
         """
+        if features is None:
+            features = analyze_texts([block.content for block in blocks])
         optimized_blocks = []
         
         for i in range(len(blocks) - 1):
@@ -335,7 +408,7 @@ class Prompts:
             block2 = blocks[i + 1]
             
             # 检查连贯性
-            coherence = cls.check_coherence(block1, block2)
+            coherence = cls.check_coherence(block1, block2, features[i], features[i + 1])
             
             if coherence < 0.5:  # 连贯性阈值
                 # 添加过渡段落
@@ -0,0 +1,135 @@
+# score_weights.py
+
+"""
+评分权重
+
+从 score.md 中解析评分项及分值（如"创新性（10分）：……"），把大纲中的每个小节对应到评分项，
+按分值给小节分配权重：
+- 生成顺序：高分值小节优先，时间或额度不够时，已完成的是最能得分的部分
+- 输出预算：max_tokens 与权重成正比，最高权重的小节使用 Config.MAX_TOKENS，
+  其余按比例缩减，不低于 Config.SECTION_MIN_TOKENS
+
+对应规则：评分项名称出现在小节、节或章标题中时直接对应（越深的标题越优先）；
+否则按字符二元组重合度对应到最相近的评分项；都对不上的小节取平均权重。
+同一评分项下的多个小节平分该项分值。
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+from outline import OutlineIndex
+
+logger = logging.getLogger(__name__)
+
+_ITEM_PATTERN = re.compile(r'^\s*(?:[#>*\-\d.、\s]*)(.+?)\s*[（(]\s*(\d+(?:\.\d+)?)\s*分\s*[）)]\s*[:：]?\s*(.*)$')
+
+# 按重合度对应时的最低 Jaccard 相似度
+MIN_SIMILARITY = 0.1
+
+
+@dataclass
+class ScoringItem:
+    name: str
+    points: float
+    description: str = ""
+    category: Optional[str] = None
+
+
+def parse_scoring_items(score_md: str) -> List[ScoringItem]:
+    """
+    解析评分项
+
+    行尾没有说明文字的评分行（如"技术方案（40分）"）视为分类，其后带说明的评分行为具体评分项；
+    若全文没有带说明的评分行，则所有评分行都作为评分项。
+    """
+    entries = []
+    for line in score_md.splitlines():
+        match = _ITEM_PATTERN.match(line)
+        if match:
+            name, points, description = match.groups()
+            entries.append((name.strip(), float(points), description.strip()))
+
+    if not any(description for _, _, description in entries):
+        return [ScoringItem(name, points) for name, points, _ in entries]
+
+    items = []
+    category = None
+    for name, points, description in entries:
+        if description:
+            items.append(ScoringItem(name, points, description, category))
+        else:
+            category = name
+    return items
+
+
+def _bigrams(text: str) -> Set[str]:
+    text = re.sub(r'[\s\d.、（）()：:，,。分第章节]+', '', text)
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def match_subsections(index: OutlineIndex, items: List[ScoringItem]) -> Dict[int, Optional[int]]:
+    """小节节点下标 -> 评分项下标（对不上时为 None）"""
+    item_grams = [_bigrams(f"{item.name}{item.description}") for item in items]
+    mapping = {}
+    for _, node in index.iter_subsections():
+        path = index.path(node)
+        matched = None
+        # 名称直接出现在标题中：从小节往上找
+        for ancestor in reversed(path):
+            title = index.titles[ancestor]
+            hits = [i for i, item in enumerate(items) if item.name and item.name in title]
+            if hits:
+                matched = max(hits, key=lambda i: len(items[i].name))
+                break
+        if matched is None and items:
+            grams = _bigrams("".join(index.titles[n] for n in path) + (index.summaries[node] or ""))
+            scores = [_similarity(grams, item_gram) for item_gram in item_grams]
+            best = max(range(len(items)), key=lambda i: scores[i])
+            if scores[best] >= MIN_SIMILARITY:
+                matched = best
+        mapping[node] = matched
+    return mapping
+
+
+def section_weights(index: OutlineIndex, score_md: str) -> Dict[int, float]:
+    """小节节点下标 -> 权重（分值，同一评分项的小节平分）"""
+    items = parse_scoring_items(score_md)
+    nodes = [node for _, node in index.iter_subsections()]
+    if not items or not nodes:
+        return {node: 1.0 for node in nodes}
+
+    mapping = match_subsections(index, items)
+    counts: Dict[int, int] = {}
+    for item in mapping.values():
+        if item is not None:
+            counts[item] = counts.get(item, 0) + 1
+
+    weights = {node: items[item].points / counts[item] for node, item in mapping.items() if item is not None}
+    default = sum(weights.values()) / len(weights) if weights else 1.0
+    unmatched = [node for node in nodes if node not in weights]
+    if unmatched:
+        logger.info(f"{len(unmatched)} subsections did not match any scoring item, using average weight {default:.2f}")
+    for node in unmatched:
+        weights[node] = default
+    return weights
+
+
+def token_budgets(weights: Dict[int, float], max_tokens: int, min_tokens: int) -> Dict[int, int]:
+    """按权重比例分配 max_tokens：最高权重取 max_tokens，其余按比例缩减，不低于 min_tokens"""
+    if not weights:
+        return {}
+    top = max(weights.values()) or 1.0
+    return {node: max(min_tokens, min(max_tokens, int(max_tokens * weight / top))) for node, weight in weights.items()}
+
+
+def target_chars(budget: int, max_tokens: int, top_chars: int, min_chars: int = 500) -> int:
+    """按输出预算折算小节要求的正文字数（取整到百位，写入提示词）"""
+    return max(min_chars, int(round(top_chars * budget / max_tokens, -2)))
@@ -0,0 +1,206 @@
+# search_index.py
+
+"""
+历史标书全文检索
+
+每次拼装 content.md 时，把各项目的小节（附带"章 > 节"路径）写入本地 SQLite FTS5 索引，
+可以跨项目检索"上次是怎么写高可用设计的"。
+
+中文分词：FTS5 自带的 unicode61 把连续汉字当成一个词，trigram 又查不到两个字的词，
+因此入库前先把文本转成"字符二元组 + 小写英文词"的空格分隔序列（单独的汉字保留单字），
+查询词做同样的转换后作为短语匹配（相邻二元组必须连续出现，即原文包含该子串）。
+原文另存一份，片段高亮在原文上完成。
+
+增量索引：每个小节记录内容哈希，只更新变化过的小节，删除骨架中已不存在的小节。
+
+重建全部项目的索引：python search_index.py
+"""
+
+import hashlib
+import html
+import logging
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[A-Za-z0-9]+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    UNIQUE (project_id, key)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5(title, path, body, tokenize='unicode61');
+"""
+
+# bm25() 的列权重：标题 > 路径 > 正文
+_RANK = "bm25(sections_fts, 5.0, 2.0, 1.0)"
+
+
+def to_terms(text: str) -> str:
+    """转换为空格分隔的词：连续汉字取二元组（单字保留），字母数字串小写"""
+    terms = []
+    for run in _TOKEN_RUN.findall(text or ""):
+        if run.isascii():
+            terms.append(run.lower())
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(map(str.__add__, run, run[1:]))
+    return " ".join(terms)
+
+
+def to_match_query(query: str) -> Optional[str]:
+    """把用户输入转成 FTS5 MATCH 表达式：每个词转成二元组短语，多个词之间为 AND"""
+    phrases = []
+    for word in query.split():
+        terms = to_terms(word)
+        if terms:
+            phrases.append('"' + terms.replace('"', '') + '"')
+    return " AND ".join(phrases) or None
+
+
+def highlight(content: str, query: str, width: Optional[int] = None) -> str:
+    """截取原文中第一个命中词附近的片段，命中词用 <mark> 标出（其余内容做 HTML 转义）"""
+    width = width or Config.SEARCH_SNIPPET_CHARS
+    words = sorted({word for word in query.split() if word}, key=len, reverse=True)
+    pattern = re.compile('|'.join(re.escape(word) for word in words), re.IGNORECASE) if words else None
+    match = pattern.search(content) if pattern else None
+    start = max(0, match.start() - width // 2) if match else 0
+    end = min(len(content), start + width)
+    snippet = content[start:end].replace('\n', ' ')
+    parts = []
+    last = 0
+    for hit in (pattern.finditer(snippet) if pattern else ()):
+        parts.append(html.escape(snippet[last:hit.start()]))
+        parts.append(f"<mark>{html.escape(hit.group())}</mark>")
+        last = hit.end()
+    parts.append(html.escape(snippet[last:]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(content) else "")
+
+
+class SearchIndex:
+    """SQLite FTS5 索引"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or Config.SEARCH_INDEX_FILE)
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def index_project(self, project_id: str, sections: List[Tuple[str, str, str, str]]) -> Dict[str, int]:
+        """
+        增量索引一个项目
+
+        Args:
+            sections: (key, 路径, 标题, 正文) 列表，即项目当前的全部小节
+
+        Returns:
+            {'updated': 新增或变化的小节数, 'deleted': 删除的小节数}
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        updated = deleted = 0
+        with closing(self._connect()) as conn, conn:
+            existing = {key: (rowid, digest) for rowid, key, digest in conn.execute(
+                "SELECT id, key, content_hash FROM sections WHERE project_id = ?", (project_id,))}
+            for key, path, title, content in sections:
+                digest = hashlib.sha1(f"{path}\n{title}\n{content}".encode('utf-8')).hexdigest()
+                current = existing.pop(key, None)
+                if current and current[1] == digest:
+                    continue
+                if current:
+                    rowid = current[0]
+                    conn.execute("UPDATE sections SET title = ?, path = ?, content = ?, content_hash = ?, updated_at = ? "
+                                 "WHERE id = ?", (title, path, content, digest, now, rowid))
+                    conn.execute("DELETE FROM sections_fts WHERE rowid = ?", (rowid,))
+                else:
+                    rowid = conn.execute(
+                        "INSERT INTO sections (project_id, key, title, path, content, content_hash, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", (project_id, key, title, path, content, digest, now)).lastrowid
+                conn.execute("INSERT INTO sections_fts (rowid, title, path, body) VALUES (?, ?, ?, ?)",
+                             (rowid, to_terms(title), to_terms(path), to_terms(content)))
+                updated += 1
+            for rowid, _ in existing.values():
+                conn.execute("DELETE FROM sections WHERE id = ?", (rowid,))
+                conn.execute("DELETE FROM sections_fts WHERE rowid = ?", (rowid,))
+                deleted += 1
+        return {'updated': updated, 'deleted': deleted}
+
+    def search(self, query: str, project_id: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """按相关度检索小节，返回带高亮片段的结果"""
+        match = to_match_query(query)
+        if not match:
+            return []
+        sql = (f"SELECT s.project_id, s.key, s.title, s.path, s.content, s.updated_at, {_RANK} AS rank "
+               "FROM sections_fts JOIN sections s ON s.id = sections_fts.rowid WHERE sections_fts MATCH ?")
+        params: list = [match]
+        if project_id:
+            sql += " AND s.project_id = ?"
+            params.append(project_id)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [{
+            'project_id': project,
+            'key': key,
+            'title': title,
+            'path': path,
+            'snippet': highlight(content, query),
+            'score': round(-rank, 3),
+            'updated_at': updated_at
+        } for project, key, title, path, content, updated_at, rank in rows]
+
+
+def store_sections(store) -> List[Tuple[str, str, str, str]]:
+    """从 DocumentStore 的骨架中取出各小节的 (key, "章 > 节" 路径, 标题, 正文)"""
+    contents = {key: (title, content) for key, title, content in store.sections()}
+    chapter = section = ""
+    result = []
+    for item in store.layout:
+        if item['type'] == 'text':
+            heading = item['text'].strip()
+            if heading.startswith('## '):
+                section = heading[3:].strip()
+            elif heading.startswith('# '):
+                chapter, section = heading[2:].strip(), ""
+        elif item['key'] in contents:
+            title, content = contents[item['key']]
+            path = " > ".join(part for part in (chapter, section) if part)
+            result.append((item['key'], path, title, content))
+    return result
+
+
+def index_document_store(project_id: str, store, index: Optional[SearchIndex] = None) -> Dict[str, int]:
+    """把一个项目的 DocumentStore 增量写入索引"""
+    store.refresh()
+    return (index or SearchIndex()).index_project(project_id, store_sections(store))
+
+
+if __name__ == '__main__':
+    from document_store import DocumentStore
+    from workspace import list_workspaces
+
+    logging.basicConfig(level=logging.INFO)
+    search_index = SearchIndex()
+    for workspace in list_workspaces():
+        stats = index_document_store(workspace.project_id, DocumentStore(workspace.sections_dir), search_index)
+        logger.info(f"{workspace.project_id}: {stats}")
@@ -0,0 +1,88 @@
+# storage.py
+
+"""
+文件存储工具
+
+- 原子写入：先写同目录下的临时文件，fsync 后用 os.replace 重命名覆盖，
+  读取方要么看到旧文件，要么看到完整的新文件，不会读到写了一半的内容
+- 异步版本：实际 I/O 放到线程池执行，避免在事件循环里阻塞所有进行中的 LLM 请求
+"""
+
+import asyncio
+import functools
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Union
+
+from tracing import span
+
+PathLike = Union[str, os.PathLike]
+
+
+def atomic_write_text(path: PathLike, content: str, encoding: str = 'utf-8'):
+    """原子写入文本文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)  # mkstemp 默认 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: PathLike, data: Any, indent: int = 2):
+    """原子写入 JSON 文件"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+def read_text(path: PathLike, encoding: str = 'utf-8') -> str:
+    with open(path, 'r', encoding=encoding) as f:
+        return f.read()
+
+
+def append_text(path: PathLike, content: str, encoding: str = 'utf-8'):
+    with open(path, 'a', encoding=encoding) as f:
+        f.write(content)
+
+
+async def _run_in_thread(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+async def read_text_async(path: PathLike, encoding: str = 'utf-8') -> str:
+    """异步读取文本文件"""
+    return await _run_in_thread(read_text, path, encoding)
+
+
+async def read_json_async(path: PathLike) -> Any:
+    """异步读取 JSON 文件"""
+    return json.loads(await read_text_async(path))
+
+
+async def write_text_async(path: PathLike, content: str, encoding: str = 'utf-8'):
+    """异步原子写入文本文件"""
+    with span("write_file", cat="io", path=Path(path).name, size=len(content)):
+        await _run_in_thread(atomic_write_text, path, content, encoding)
+
+
+async def write_json_async(path: PathLike, data: Any, indent: int = 2):
+    """异步原子写入 JSON 文件"""
+    await write_text_async(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+async def append_text_async(path: PathLike, content: str, encoding: str = 'utf-8'):
+    """异步追加文本（非原子，仅用于只追加的文件）"""
+    with span("append_file", cat="io", path=Path(path).name, size=len(content)):
+        await _run_in_thread(append_text, path, content, encoding)
@@ -0,0 +1,32 @@
+from bidding_workflow import BiddingWorkflow
+from outline import position_key
+
+
+def make_outline(section_count):
+    return {
+        "body_paragraphs": [{
+            "chapter_title": "第一章 技术方案",
+            "sections": [
+                {
+                    "section_title": f"1.{i} 节{i}",
+                    "sub_sections": [
+                        {"sub_section_title": f"1.{i}.1 小节", "content_summary": "边界"}
+                    ]
+                }
+                for i in range(1, section_count + 1)
+            ]
+        }]
+    }
+
+
+def test_layout_follows_outline_order_past_ten_sections():
+    workflow = BiddingWorkflow()
+    workflow.outline = workflow.parse_outline_json(make_outline(11))
+
+    headings = [item['text'].strip() for item in workflow._build_document_layout()
+                if item['type'] == 'text' and item['text'].startswith('## ')]
+    assert headings == [f"## 1.{i} 节{i}" for i in range(1, 12)]
+
+    fragments = [item['key'] for item in workflow._build_document_layout() if item['type'] == 'fragment']
+    assert fragments == [position_key((0, i, 0)) for i in range(11)]
+    assert fragments == sorted(fragments)
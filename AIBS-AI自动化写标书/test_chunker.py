@@ -0,0 +1,42 @@
+import time
+
+from chunker import split_text
+from tokenizer import count_tokens
+
+
+def test_chunks_respect_token_limit_and_headings():
+    text = "\n".join([
+        "第一章 总体方案",
+        "本项目建设内容包括数据平台。" * 30,
+        "1.1 技术路线",
+        "采用微服务架构。",
+    ])
+    chunks = split_text(text, max_tokens=100)
+    assert all(count_tokens(chunk.text) <= 100 for chunk in chunks)
+    # 超长行在句末切开，不切在句子中间
+    assert all(chunk.text.endswith("。") for chunk in chunks)
+    assert chunks[0].title == "第一章 总体方案"
+    assert chunks[-1].title == "1.1 技术路线" and chunks[-1].text.startswith("1.1 技术路线")
+    assert "".join(c.text for c in chunks[:-1]).replace("\n", "") == text.split("\n1.1")[0].replace("\n", "")
+
+
+def test_overlap_repeats_tail_sentences():
+    text = "".join(f"第{i}句内容。" for i in range(40))
+    chunks = split_text(text, max_tokens=60, overlap_tokens=15, split_on_headings=False)
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        first_sentence = current.text.split("。")[0] + "。"
+        tail = previous.text[previous.text.index(first_sentence):]
+        assert current.text.startswith(tail) and count_tokens(tail) <= 15
+
+
+def test_long_unpunctuated_line_is_split_in_linear_time():
+    line = "数据安全ABCDEFGHIJ" * 20000
+    started = time.perf_counter()
+    chunks = split_text(line, max_tokens=2000, overlap_tokens=0)
+    elapsed = time.perf_counter() - started
+    assert "".join(chunk.text for chunk in chunks) == line
+    assert all(count_tokens(chunk.text) <= 2000 for chunk in chunks)
+    assert all(chunk.tokens == count_tokens(chunk.text) for chunk in chunks)
+    # 280K 字符，逐段重新计数剩余文本时要数十秒
+    assert elapsed < 2
@@ -0,0 +1,142 @@
+import asyncio
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from config import Config
+from llmkey import LLMClient
+from model_router import ModelRoute, routes_for
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run(breaker, clock, ok, latency=1.0):
+    attempt = breaker.acquire()
+    assert attempt is not None
+    clock.now += latency
+    if ok:
+        attempt.succeed()
+    else:
+        attempt.fail()
+
+
+def test_opens_on_error_rate_and_recovers_through_half_open_probe():
+    clock = _Clock()
+    breaker = CircuitBreaker('m @ base', clock)
+    for ok in (True, False, True, False, False):
+        _run(breaker, clock, ok)
+    assert breaker.state == OPEN
+    assert breaker.acquire() is None and not breaker.available
+
+    clock.now += Config.CIRCUIT_OPEN_SECONDS
+    probe = breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    # 试探请求进行中，其余请求仍被拒绝
+    assert breaker.acquire() is None
+    probe.fail()
+    assert breaker.state == OPEN and breaker.times_opened == 2
+
+    clock.now += Config.CIRCUIT_OPEN_SECONDS
+    _run(breaker, clock, True)
+    assert breaker.state == CLOSED
+    assert breaker.stats()['requests'] == 0
+
+
+def test_slow_calls_open_and_rate_limits_are_not_counted():
+    clock = _Clock()
+    breaker = CircuitBreaker('m @ base', clock)
+    for _ in range(10):
+        breaker.acquire().release()
+    assert breaker.state == CLOSED and breaker.stats()['requests'] == 0
+
+    # 同时进行的请求都很慢
+    attempts = [breaker.acquire() for _ in range(Config.CIRCUIT_MIN_REQUESTS)]
+    clock.now += Config.CIRCUIT_SLOW_SECONDS
+    for attempt in attempts:
+        attempt.succeed()
+    assert breaker.state == OPEN
+    assert breaker.stats()['slow'] == Config.CIRCUIT_MIN_REQUESTS
+
+
+def test_routing_skips_models_with_open_circuit(monkeypatch):
+    circuit_breaker.reset_breakers()
+    monkeypatch.setitem(Config.MODEL_ROUTES, 'outline', [{'model': 'primary'}, {'model': 'backup'}])
+    client = LLMClient()
+    calls = []
+
+    async def call(route, messages, require_json=False, require_outline=False, max_tokens=None):
+        calls.append(route.model)
+        return f'{route.model} 的结果'
+
+    client._call_model_async = call
+    breaker = client._breaker_for(routes_for('outline')[0])
+    for _ in range(Config.CIRCUIT_MIN_REQUESTS):
+        breaker.acquire().fail()
+
+    result = asyncio.run(client._call_llm_async([{'role': 'user', 'content': '大纲'}], task='outline'))
+    assert result == 'backup 的结果'
+    assert calls == ['backup']
+    health = {item['model']: item['state'] for item in circuit_breaker.breaker_stats()}
+    assert health == {'primary': OPEN, 'backup': CLOSED}
+    circuit_breaker.reset_breakers()
+
+
+class _FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.headers = {}
+        self._body = body
+
+    async def text(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _client_with_responses(responses):
+    client = LLMClient()
+    posted = []
+
+    class Session:
+        def post(self, *args, **kwargs):
+            posted.append(kwargs['json']['model'])
+            return responses.pop(0)
+
+    async def session_for(route):
+        return Session()
+
+    async def no_sleep(wait_time, breaker=None):
+        pass
+
+    client._session_for = session_for
+    client._backoff_sleep = no_sleep
+    return client, posted
+
+
+def test_error_body_with_200_counts_as_failure_and_client_errors_are_not_retried():
+    circuit_breaker.reset_breakers()
+    route = ModelRoute(model='test-model')
+    messages = [{'role': 'user', 'content': '提示词'}]
+
+    client, posted = _client_with_responses([_FakeResponse(200, '<html>Bad Gateway</html>'),
+                                             _FakeResponse(200, '{"error": {"message": "upstream"}}')])
+    assert asyncio.run(client._request_model_async(route, messages)) is None
+    assert asyncio.run(client._request_model_async(route, messages)) is None
+    assert client._breaker_for(route).stats()['failures'] == 2
+
+    circuit_breaker.reset_breakers()
+    client, posted = _client_with_responses([_FakeResponse(400, '{"error": "context length exceeded"}')])
+    assert asyncio.run(client._request_model_async(route, messages)) is None
+    # 请求本身的问题：不重试，也不计入熔断
+    assert len(posted) == 1
+    assert client._breaker_for(route).stats()['requests'] == 0
+    circuit_breaker.reset_breakers()
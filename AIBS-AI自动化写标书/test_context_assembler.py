@@ -0,0 +1,52 @@
+from context_assembler import ContextAssembler, extractive_summary
+from outline import OutlineIndex, position_key
+from tokenizer import count_tokens
+
+
+def make_index():
+    return OutlineIndex.from_dict({
+        "body_paragraphs": [{
+            "chapter_title": "第一章",
+            "sections": [
+                {
+                    "section_title": f"1.{si + 1} 节",
+                    "sub_sections": [
+                        {"sub_section_title": f"1.{si + 1}.{ssi + 1} 小节", "content_summary": ""}
+                        for ssi in range(3)
+                    ]
+                }
+                for si in range(2)
+            ]
+        }]
+    })
+
+
+def test_summary_takes_leading_sentences_within_budget():
+    text = "第一句。第二句。\n\n另一段的首句！其后内容。\n" + "很长的段落。" * 100
+    summary = extractive_summary(text, 20)
+    assert summary.startswith("第一句。另一段的首句！")
+    assert "第二句" not in summary
+    assert count_tokens(summary) <= 20
+
+
+def test_schedule_and_context_from_completed_neighbours():
+    index = make_index()
+    assembler = ContextAssembler(index, budget_tokens=40, summary_tokens=12)
+    nodes = [node for _, node in index.iter_subsections()]
+    node = lambda *position: index.node(position_key(position))
+
+    # 节首先于各节后续小节调度，后续小节只依赖本节节首
+    order = assembler.schedule(nodes)
+    assert order[:2] == [node(0, 0, 0), node(0, 1, 0)]
+    assert assembler.dependency(node(0, 1, 2)) == node(0, 1, 0)
+    assert assembler.dependency(node(0, 1, 0)) is None
+
+    assembler.complete(node(0, 0, 2), "上一节末尾小节的内容。")
+    assembler.complete(node(0, 1, 0), "本节节首的内容。")
+    assembler.complete(node(0, 0, 1), None)  # 生成失败不提供摘要
+    context = assembler.build(node(0, 1, 1))
+    assert context.split("\n") == ["1.1.3 小节：上一节末尾小节的内容。", "1.2.1 小节：本节节首的内容。"]
+
+    # 预算不足时优先保留最近的前序兄弟小节
+    assembler.budget_tokens = 20
+    assert assembler.build(node(0, 1, 1)) == "1.2.1 小节：本节节首的内容。"
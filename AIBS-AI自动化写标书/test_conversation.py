@@ -0,0 +1,31 @@
+from conversation import ConversationHistory
+from tokenizer import count_tokens
+
+
+def run_turns(history, count):
+    for i in range(count):
+        history.add("user", f"小节{i}\n内容边界")
+        history.add("assistant", f"小节{i}的首句。" + "正文内容。" * 200)
+        yield history.messages()
+
+
+def test_pinned_messages_and_recent_turns_are_kept():
+    history = ConversationHistory(budget_tokens=100000, keep_turns=2, turn_summary_tokens=20, summary_tokens=1000)
+    history.start("系统角色")
+    history.add("user", "背景信息")
+    history.add("assistant", "已记住")
+    history.pin_last_turn()
+
+    messages = list(run_turns(history, 5))[-1]
+    assert [m['content'] for m in messages[:3]] == ["系统角色", "背景信息", "已记住"]
+    assert messages[3]['role'] == "system"
+    assert "小节0：小节0的首句。" in messages[3]['content']
+    assert [m['content'] for m in messages[4:] if m['role'] == 'user'] == ["小节3\n内容边界", "小节4\n内容边界"]
+
+
+def test_prompt_size_stays_flat_for_long_runs():
+    history = ConversationHistory(budget_tokens=3000, keep_turns=2, turn_summary_tokens=20, summary_tokens=200)
+    history.start("系统角色")
+    sizes = [sum(count_tokens(m['content']) for m in messages) for messages in run_turns(history, 50)]
+    assert max(sizes) <= 3000
+    assert sizes[-1] == sizes[20]
@@ -0,0 +1,33 @@
+from coverage import analyze_coverage, parse_requirements, sections_to_cover
+
+TECH = """硬件要求
+控制器：支持4G/5G通信，具备远程控制功能。
+电源：输入电压220V±10%，具备过压、过流保护。
+"""
+SCORE = """售后服务（20分）
+维护响应时间（10分）：是否承诺24小时内响应。
+"""
+
+
+def test_requirements_parsed_with_categories():
+    requirements = parse_requirements(TECH, SCORE)
+    assert [(r.id, r.name, r.category) for r in requirements] == [
+        ("tech-1", "控制器", "硬件要求"),
+        ("tech-2", "电源", "硬件要求"),
+        ("score-1", "维护响应时间", "售后服务"),
+    ]
+
+
+def test_uncovered_requirement_flagged_and_assigned_to_closest_section():
+    content = [
+        ("001-001-001", "1.1.1 通信方案", "控制器支持4G/5G通信，平台可对每盏路灯进行远程控制功能配置。"),
+        ("001-001-002", "1.1.2 供电设计", "电源模块输入电压满足现场条件。"),
+        ("001-002-001", "1.2.1 售后承诺", "我们承诺24小时内响应，维护响应时间满足要求。"),
+    ]
+    report = analyze_coverage(parse_requirements(TECH, SCORE), content=content)
+    rows = {row['id']: row['content'] for row in report['requirements']}
+    assert rows['tech-1']['covered'] and rows['tech-1']['matches'][0]['key'] == "001-001-001"
+    assert rows['score-1']['covered']
+    # 过压、过流保护没有写到
+    assert report['uncovered']['content'] == ["tech-2"]
+    assert sections_to_cover(report) == {"001-001-002": [TECH.splitlines()[2]]}
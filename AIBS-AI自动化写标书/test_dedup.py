@@ -0,0 +1,25 @@
+from dedup import find_duplicates, sections_to_regenerate
+
+SHARED = "本项目采用分布式微服务架构，数据层使用主从复制的关系型数据库，服务层通过统一网关对外提供接口，并配备完善的监控告警体系。"
+
+
+def test_detects_near_verbatim_paragraph_across_sections():
+    sections = [
+        ("001-001-001", f"系统总体设计围绕业务需求展开，兼顾扩展性与可维护性，分阶段完成建设任务并持续优化。\n{SHARED}"),
+        ("001-001-002", SHARED.replace("完善的", "健全的") + "\n安全方面按照等级保护三级要求建设，落实身份认证、访问控制与审计。"),
+        ("001-002-001", "售后服务团队提供七乘二十四小时响应，重大故障两小时内到场处理，并定期回访用户收集改进意见。"),
+    ]
+    pairs = find_duplicates(sections)
+    assert len(pairs) == 1
+    pair = pairs[0]
+    assert (pair.key, pair.other_key) in {("001-001-001", "001-001-002"), ("001-001-002", "001-001-001")}
+    assert pair.similarity >= 0.5
+
+    # 保留排序靠前的小节，只重新生成另一方，并带上需要避开的段落
+    offenders = sections_to_regenerate(pairs, ["001-001-001", "001-001-002", "001-002-001"])
+    assert list(offenders) == ["001-001-002"]
+    assert offenders["001-001-002"] == [SHARED]
+
+
+def test_repeats_within_one_section_are_ignored():
+    assert find_duplicates([("a", f"{SHARED}\n{SHARED}")]) == []
@@ -0,0 +1,137 @@
+import asyncio
+import sys
+import threading
+
+from document_store import DocumentStore, fragment_entry, text_entry
+
+
+LAYOUT = [
+    text_entry("# 第一章\n\n"),
+    text_entry("## 1.1 概述\n\n"),
+    fragment_entry("0000", "1.1.1 系统概述"),
+    fragment_entry("0001", "1.1.2 总体架构"),
+]
+
+
+def test_partial_and_full_assembly(tmp_path):
+    store = DocumentStore(tmp_path / "sections")
+
+    async def run():
+        await store.reset(LAYOUT)
+        # 后面的小节先完成
+        await store.put_section("0001", "1.1.2 总体架构", "架构正文")
+        partial = store.render()
+        await store.put_section("0000", "1.1.1 系统概述", "概述正文")
+        await store.write_document(tmp_path / "content.md")
+        return partial
+
+    partial = asyncio.run(run())
+    assert "架构正文" in partial and "概述正文" not in partial
+
+    content = (tmp_path / "content.md").read_text(encoding='utf-8')
+    assert content.index("### 1.1.1 系统概述") < content.index("### 1.1.2 总体架构")
+
+
+def test_reader_sees_writer_updates_incrementally(tmp_path):
+    writer = DocumentStore(tmp_path)
+    reader = DocumentStore(tmp_path)
+
+    async def run():
+        await writer.reset(LAYOUT)
+        await writer.put_section("0000", "1.1.1 系统概述", "第一版")
+        first = reader.refresh().render()
+        await writer.put_section("0000", "1.1.1 系统概述", "第二版")
+        second = reader.refresh().render()
+        # 新一轮生成会清空之前的小节
+        await writer.reset(LAYOUT)
+        third = reader.refresh().render()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert "第一版" in first
+    assert "第二版" in second and "第一版" not in second
+    assert "第二版" not in third
+    assert reader.version == writer.version
+
+
+def test_changes_since_version(tmp_path):
+    store = DocumentStore(tmp_path)
+
+    async def run():
+        await store.reset(LAYOUT)
+        await store.put_section("0000", "1.1.1 系统概述", "概述正文")
+        seen = store.version
+        await store.put_section("0001", "1.1.2 总体架构", "架构正文")
+        incremental = store.changes_since(seen)
+        await store.reset(LAYOUT)
+        return seen, incremental, store.changes_since(seen)
+
+    seen, incremental, after_reset = asyncio.run(run())
+    assert not incremental['full']
+    assert [section['key'] for section in incremental['sections']] == ["0001"]
+    assert incremental['sections'][0]['content'] == "架构正文"
+    # 新一轮生成后旧版本号失效，需要整体重取
+    assert after_reset['full'] and after_reset['sections'] == []
+    assert DocumentStore(tmp_path).refresh().changes_since(seen)['full']
+
+
+
+def test_concurrent_refreshes_of_shared_reader(tmp_path):
+    writer = DocumentStore(tmp_path)
+    reader = DocumentStore(tmp_path)
+    layout = [fragment_entry(f"{i:04d}", f"小节{i}") for i in range(300)]
+    asyncio.run(writer.reset(layout))
+    done = threading.Event()
+    errors = []
+
+    def poll():
+        # 与 app.py 中的轮询接口一样，多个线程同时刷新、读取同一个实例
+        while not done.is_set():
+            try:
+                reader.refresh()
+                reader.changes_since(0)
+            except Exception as e:
+                errors.append(e)
+
+    async def write():
+        for item in layout:
+            await writer.put_section(item['key'], item['title'], "正文")
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # 频繁切换线程，让竞争更容易出现
+    threads = [threading.Thread(target=poll) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        asyncio.run(write())
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(interval)
+
+    assert not errors
+    assert len(reader.refresh().changes_since(0)['sections']) == 300
+    assert reader.version == writer.version
+
+
+def test_reset_compacts_log_and_readers_detect_the_swap(tmp_path):
+    writer = DocumentStore(tmp_path)
+    reader = DocumentStore(tmp_path)
+
+    async def run():
+        await writer.reset(LAYOUT)
+        await writer.put_section("0000", "1.1.1 系统概述", "旧一轮")
+        reader.refresh()
+        for _ in range(3):
+            await writer.reset(LAYOUT)
+        # 新一轮写入的内容比旧日志更长，不能靠文件变短来判断日志被替换
+        for i in range(5):
+            await writer.put_section("0001", "1.1.2 总体架构", f"新一轮第{i}版")
+
+    asyncio.run(run())
+    lines = (tmp_path / "index.log").read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 6 and '"reset": true' in lines[0]
+    changes = reader.refresh().changes_since(0)
+    assert [section['content'] for section in changes['sections']] == ["新一轮第4版"]
+    assert reader.version == writer.version and reader.reset_version == writer.reset_version
@@ -0,0 +1,87 @@
+import asyncio
+import struct
+import zipfile
+import zlib
+from xml.etree import ElementTree
+
+from document_store import DocumentStore, fragment_entry, text_entry
+from docx_export import export_docx
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+CONTENT = """概述正文，包含**重点**和`代码`。
+
+#### 架构要点
+- 双机热备
+1. 负载均衡
+
+| 指标 | 要求 |
+| --- | --- |
+| 可用性 | 99.9% |
+
+```mermaid
+graph TD
+A-->B
+```
+"""
+
+
+def _png(width, height):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    raw = b''.join(b'\x00' + b'\xff' * width * 3 for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def _export(tmp_path, renderer):
+    store = DocumentStore(tmp_path / "sections")
+
+    async def fill():
+        await store.reset([text_entry("# 第一章 技术方案\n\n"), text_entry("## 1.1 总体设计\n\n"),
+                           fragment_entry("0000", "1.1.1 系统概述"), fragment_entry("0001", "1.1.2 未完成")])
+        await store.put_section("0000", "1.1.1 系统概述", CONTENT)
+
+    asyncio.run(fill())
+    path = tmp_path / "content.docx"
+    stats = export_docx(DocumentStore(tmp_path / "sections"), path, mermaid_renderer=renderer)
+    archive = zipfile.ZipFile(path)
+    document = ElementTree.fromstring(archive.read('word/document.xml'))
+    ElementTree.fromstring(archive.read('word/styles.xml'))
+    return stats, archive, document
+
+
+def _styled(document):
+    result = []
+    for paragraph in document.iter(W + 'p'):
+        style = paragraph.find(f'{W}pPr/{W}pStyle')
+        text = "".join(t.text or "" for t in paragraph.iter(W + 't'))
+        result.append((style.get(W + 'val') if style is not None else None, text))
+    return result
+
+
+def test_outline_levels_tables_and_preserved_mermaid(tmp_path):
+    stats, archive, document = _export(tmp_path, None)
+    paragraphs = _styled(document)
+    assert ('Heading1', '第一章 技术方案') in paragraphs
+    assert ('Heading2', '1.1 总体设计') in paragraphs
+    assert ('Heading3', '1.1.1 系统概述') in paragraphs
+    # 正文中的标题从标题 4 开始，不与骨架的章节混淆
+    assert ('Heading4', '架构要点') in paragraphs
+    assert ('ListParagraph', '• 双机热备') in paragraphs and ('ListParagraph', '1. 负载均衡') in paragraphs
+    assert (None, '概述正文，包含重点和代码。') in paragraphs
+    assert [t.text for t in document.find(f'.//{W}tbl').iter(W + 't')] == ['指标', '要求', '可用性', '99.9%']
+    assert ('Code', 'A-->B') in paragraphs
+    assert stats['mermaid_preserved'] == 1 and stats['images'] == 0
+    assert not (tmp_path / "content.docx.part").exists()
+
+
+def test_mermaid_rendered_as_embedded_image(tmp_path):
+    stats, archive, document = _export(tmp_path, lambda source: _png(2000, 500))
+    assert stats['images'] == 1 and stats['mermaid_preserved'] == 0
+    assert 'word/media/image1.png' in archive.namelist()
+    assert 'rIdImage1' in archive.read('word/_rels/document.xml.rels').decode()
+    extent = document.find('.//{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}extent')
+    # 超过版心宽度的图片按比例缩小
+    cx, cy = int(extent.get('cx')), int(extent.get('cy'))
+    assert cx < 2000 * 9525 and abs(cx / cy - 4) < 0.01
@@ -0,0 +1,42 @@
+import asyncio
+import gzip
+import json
+
+from quart import Quart
+
+from http_cache import ResponseCache, file_stamp, json_response
+
+
+def test_cached_conditional_and_compressed_responses(tmp_path):
+    data_file = tmp_path / "outline.json"
+    data_file.write_text(json.dumps({"title": "大纲" * 1000}, ensure_ascii=False), encoding='utf-8')
+    cache = ResponseCache()
+    builds = []
+    app = Quart(__name__)
+
+    @app.route('/outline')
+    async def outline():
+        async def build():
+            builds.append(1)
+            return json.loads(data_file.read_text(encoding='utf-8')), data_file.stat().st_mtime
+
+        return json_response(await cache.get('outline', file_stamp(data_file), build))
+
+    async def run():
+        client = app.test_client()
+        first = await client.get('/outline', headers={'Accept-Encoding': 'gzip'})
+        etag = first.headers['ETag']
+        body = gzip.decompress(await first.get_data())
+        again = await client.get('/outline', headers={'If-None-Match': etag})
+        data_file.write_text(json.dumps({"title": "新大纲"}, ensure_ascii=False), encoding='utf-8')
+        changed = await client.get('/outline', headers={'If-None-Match': etag})
+        return first, body, again, changed, await changed.get_json()
+
+    first, body, again, changed, changed_json = asyncio.run(run())
+    assert first.headers['Content-Encoding'] == 'gzip' and 'Last-Modified' in first.headers
+    assert json.loads(body)["title"].startswith("大纲")
+    # 未变化时返回 304 且不重新读取文件；文件变化后重新生成
+    assert again.status_code == 304
+    assert changed.status_code == 200 and changed_json == {"title": "新大纲"}
+    assert changed.headers['ETag'] != first.headers['ETag']
+    assert len(builds) == 2
@@ -0,0 +1,105 @@
+import asyncio
+import zipfile
+
+import pytest
+
+from ingest import (build_inputs, extract_docx_pages, extract_pages, extract_pdf_pages, extract_xlsx_pages,
+                    pdf_page_count, split_regions, clean_lines)
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def _paragraph(text, style=None):
+    style_xml = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{style_xml}<w:r><w:t>{text}</w:t></w:r></w:p>'
+
+
+def _row(*cells):
+    return '<w:tr>' + ''.join(f'<w:tc>{_paragraph(cell)}</w:tc>' for cell in cells) + '</w:tr>'
+
+
+def test_docx_tender_split_into_tech_and_score(tmp_path):
+    body = ''.join([
+        _paragraph('第一章 投标人须知', 'Heading1'),
+        _paragraph('投标文件应按要求密封。'),
+        _paragraph('第二章 评标办法', 'Heading1'),
+        '<w:tbl>' + _row('序号', '评分因素', '分值', '评分标准') + _row('1', '方案完整性', '10', '方案是否涵盖所有技术要求')
+        + _row('2', '售后服务', '5分', '是否承诺24小时内响应') + '</w:tbl>',
+        '<w:p><w:r><w:br w:type="page"/></w:r></w:p>',
+        _paragraph('第三章 采购需求', 'Heading1'),
+        _paragraph('二、技术要求'),
+        _paragraph('路灯灯具：LED光源，功率不低于100W，寿命≥50,000小时。'),
+        '<w:tbl>' + _row('控制器', '支持4G/5G通信，具备远程控制功能') + '</w:tbl>',
+        _paragraph('第四章 合同条款', 'Heading1'),
+        _paragraph('付款方式按合同约定。'),
+    ])
+    path = tmp_path / 'tender.docx'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml', f'<w:document {W}><w:body>{body}</w:body></w:document>')
+
+    pages = extract_docx_pages(str(path))
+    assert len(pages) == 2
+    result = build_inputs(pages)
+    assert "方案完整性（10分）：方案是否涵盖所有技术要求" in result.score_md
+    assert "售后服务（5分）：是否承诺24小时内响应" in result.score_md
+    assert "控制器：支持4G/5G通信，具备远程控制功能" in result.tech_md
+    assert "二、技术要求" in result.tech_md
+    # 其它章节不进入 tech.md / score.md
+    assert "付款方式" not in result.tech_md and "密封" not in result.tech_md + result.score_md
+    assert result.summary()['score_items'] == 2 and not result.warnings
+
+
+def test_xlsx_rows_and_async_extraction(tmp_path):
+    path = tmp_path / 'score.xlsx'
+    s = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    r = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/workbook.xml', f'<workbook xmlns="{s}" xmlns:r="{r}"><sheets>'
+                                            f'<sheet name="评分表" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr('xl/_rels/workbook.xml.rels',
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>')
+        archive.writestr('xl/sharedStrings.xml', f'<sst xmlns="{s}"><si><t>创新性</t></si></sst>')
+        archive.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{s}"><sheetData>'
+                                                     '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1"><v>10</v></c></row>'
+                                                     '</sheetData></worksheet>')
+    assert extract_xlsx_pages(str(path)) == ["# 评分表\n| 创新性 |  | 10 |"]
+    assert asyncio.run(extract_pages(path, workers=0)) == extract_xlsx_pages(str(path))
+
+
+def test_pdf_cleanup_rewraps_lines_and_drops_margins():
+    pages = ["某某项目招标文件\n目录\n第三章 技术要求 ........ 15\n第四章 合同条款 ........ 30\n- 1 -"]
+    pages += [f"某某项目招标文件\n第{i}条 条款正文\n系统需具备远程控制、自动调光\n、故障报警等功能。\n其余内容。\n- {i} -"
+              for i in range(2, 6)]
+    lines = clean_lines(pages, pdf=True)
+    assert "某某项目招标文件" not in lines and "- 2 -" not in lines
+    assert "系统需具备远程控制、自动调光、故障报警等功能。" in lines
+    # 目录行不会被当作技术要求章节
+    assert split_regions(lines)['tech'] == []
+
+
+def test_pdf_pages_extracted_in_range(tmp_path):
+    pypdf = pytest.importorskip('pypdf')
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = pypdf.PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+    for number in range(1, 4):
+        page = writer.add_blank_page(width=200, height=200)
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 20 100 Td (Page {number}) Tj ET".encode())
+        page[NameObject('/Contents')] = writer._add_object(content)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+        })
+    path = tmp_path / 'tender.pdf'
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+    assert pdf_page_count(str(path)) == 3
+    pages = extract_pdf_pages(str(path), 1, 10)
+    assert [page.strip() for page in pages] == ["Page 2", "Page 3"]
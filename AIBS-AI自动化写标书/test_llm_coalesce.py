@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+import llmkey
+from llmkey import LLMClient, InvalidJSONResponse
+from model_router import ModelRoute
+
+ROUTE = ModelRoute(model='test-model')
+
+
+def _fake_request(client, calls, result='正文', error=None):
+    async def request(route, messages, require_json=False, require_outline=False, max_tokens=None):
+        calls.append(messages[-1]['content'])
+        await asyncio.sleep(0.05)
+        if error:
+            raise error
+        return result
+
+    client._request_model_async = request
+
+
+def _messages(text):
+    return [{'role': 'user', 'content': text}]
+
+
+def test_identical_requests_share_one_call():
+    calls = []
+    first, second = LLMClient(), LLMClient()
+    _fake_request(first, calls)
+    _fake_request(second, calls)
+
+    async def run():
+        return await asyncio.gather(
+            first._call_model_async(ROUTE, _messages('同一个提示词')),
+            second._call_model_async(ROUTE, _messages('同一个提示词')),
+            first._call_model_async(ROUTE, _messages('另一个提示词')),
+        )
+
+    assert asyncio.run(run()) == ['正文', '正文', '正文']
+    assert sorted(calls) == ['另一个提示词', '同一个提示词']
+    assert not llmkey._inflight
+
+
+def test_errors_reach_every_caller_and_later_calls_retry():
+    calls = []
+    client = LLMClient()
+    _fake_request(client, calls, error=InvalidJSONResponse('bad json', '{'))
+
+    async def run():
+        return await asyncio.gather(
+            *(client._call_model_async(ROUTE, _messages('大纲'), require_json=True) for _ in range(3)),
+            return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, InvalidJSONResponse) for result in results)
+
+    # 请求结束后不再合并
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_request():
+    calls = []
+    client = LLMClient()
+    _fake_request(client, calls)
+
+    async def run():
+        leader = asyncio.ensure_future(client._call_model_async(ROUTE, _messages('提示词')))
+        follower = asyncio.ensure_future(client._call_model_async(ROUTE, _messages('提示词')))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == '正文'
+    assert len(calls) == 1
+
+
+def test_requests_with_different_api_keys_are_not_shared():
+    calls = []
+    first, second = LLMClient(), LLMClient()
+    second.api_key = 'another-key'
+    _fake_request(first, calls)
+    _fake_request(second, calls)
+
+    async def run():
+        return await asyncio.gather(first._call_model_async(ROUTE, _messages('提示词')),
+                                    second._call_model_async(ROUTE, _messages('提示词')))
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_leader_close_waits_for_shared_request():
+    leader, follower = LLMClient(), LLMClient()
+    sessions = []
+
+    async def request(route, messages, require_json=False, require_outline=False, max_tokens=None):
+        session = await leader._session_for(route)
+        sessions.append(session)
+        await asyncio.sleep(0.05)
+        return '会话已关闭' if session.closed else '正文'
+
+    leader._request_model_async = request
+
+    async def run():
+        leading = asyncio.ensure_future(leader._call_model_async(ROUTE, _messages('提示词')))
+        following = asyncio.ensure_future(follower._call_model_async(ROUTE, _messages('提示词')))
+        await asyncio.sleep(0.01)
+        # 发起方的调用被取消（如客户端断开），随后关闭自己的会话
+        leading.cancel()
+        await leader.close()
+        assert len(llmkey._closing) == 1
+        result = await following
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == '正文'
+    assert len(sessions) == 1 and sessions[0].closed
+    assert not llmkey._closing
+
+
+def test_request_cancelled_when_every_caller_cancels():
+    client = LLMClient()
+    _fake_request(client, [])
+
+    async def run():
+        callers = [asyncio.ensure_future(client._call_model_async(ROUTE, _messages('提示词'))) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        task = next(iter(llmkey._inflight.values())).task
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return task
+
+    assert asyncio.run(run()).cancelled()
+    assert not llmkey._inflight
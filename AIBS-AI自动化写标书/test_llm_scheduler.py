@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+from llm_scheduler import LLMScheduler, request_priority
+
+
+def test_capacity_is_shared_and_slots_split_by_priority():
+    async def run():
+        scheduler = LLMScheduler(capacity=2)
+        order = []
+        peak = 0
+
+        async def request(job):
+            nonlocal peak
+            async with scheduler.slot(job):
+                peak = max(peak, scheduler.capacity - scheduler.free)
+                order.append(job.name)
+                await asyncio.sleep(0.01)
+
+        big = scheduler.register('big', priority=1)
+        urgent = scheduler.register('urgent', priority=3)
+        # 大任务先把队列排满，紧急任务随后到达
+        tasks = [asyncio.ensure_future(request(big)) for _ in range(20)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(request(urgent)) for _ in range(6)]
+        await asyncio.gather(*tasks)
+        return order, peak, scheduler.free
+
+    order, peak, free = asyncio.run(run())
+    assert peak == 2 and free == 2
+    # 紧急任务不必等大任务排完：它的 6 个请求都在前 12 个名额内发出
+    assert order[:12].count('urgent') == 6
+    assert order.count('big') == 20
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def run():
+        scheduler = LLMScheduler(capacity=1)
+        job = scheduler.register('job')
+        await scheduler.acquire(job)
+        waiter = asyncio.ensure_future(scheduler.acquire(job))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release(job)
+        return scheduler.free, job.waiters
+
+    free, waiters = asyncio.run(run())
+    assert free == 1 and not waiters
+
+
+def test_waiter_cancelled_in_same_tick_as_release_is_skipped():
+    async def run():
+        scheduler = LLMScheduler(capacity=1)
+        job = scheduler.register('job')
+        await scheduler.acquire(job)
+        cancelled = asyncio.ensure_future(scheduler.acquire(job))
+        queued = asyncio.ensure_future(scheduler.acquire(job))
+        await asyncio.sleep(0)
+        # 取消后立即归还名额，被取消的请求还来不及离开队列
+        cancelled.cancel()
+        scheduler.release(job)
+        await asyncio.gather(cancelled, return_exceptions=True)
+        await queued
+        scheduler.release(job)
+        return scheduler.free, job.in_flight, job.waiters
+
+    free, in_flight, waiters = asyncio.run(run())
+    assert free == 1 and in_flight == 0 and not waiters
+
+
+def test_queued_requests_within_job_follow_request_priority():
+    async def run():
+        scheduler = LLMScheduler(capacity=1)
+        job = scheduler.register('job')
+        order = []
+
+        async def request(priority):
+            with request_priority(priority):
+                async with scheduler.slot(job):
+                    order.append(priority)
+                    await asyncio.sleep(0)
+
+        await asyncio.gather(*(request(priority) for priority in (1, 2, 10, 5, 5)))
+        return order
+
+    # 第一个请求直接拿到空闲名额，其余按优先级发放
+    assert asyncio.run(run()) == [1, 10, 5, 5, 2]
+
+
+class _FakeResponse:
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self._body = body
+
+    async def text(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def post(self, *args, **kwargs):
+        return self.responses.pop(0)
+
+
+def test_rate_limited_request_releases_slot_before_backoff():
+    from circuit_breaker import reset_breakers
+    from llm_scheduler import get_scheduler
+    from llmkey import LLMClient
+    from model_router import ModelRoute
+
+    reset_breakers()
+    client = LLMClient()
+    ok = json.dumps({'choices': [{'message': {'content': '正文'}}]})
+    session = _FakeSession([_FakeResponse(429, 'slow down', {'Retry-After': '3'}), _FakeResponse(500, 'oops'),
+                            _FakeResponse(200, ok)])
+    waits = []
+
+    async def session_for(route):
+        return session
+
+    async def backoff_sleep(wait_time, breaker=None):
+        scheduler = get_scheduler()
+        waits.append((wait_time, scheduler.free == scheduler.capacity))
+
+    client._session_for = session_for
+    client._backoff_sleep = backoff_sleep
+
+    result = asyncio.run(client._request_model_async(ModelRoute(model='test-model'), [{'role': 'user', 'content': '提示词'}]))
+    assert result == '正文'
+    # 429 按 Retry-After 等待，500 按退避等待，等待期间名额都已归还
+    assert waits[0] == (3, True) and waits[1][1] and len(waits) == 2
+    reset_breakers()
@@ -0,0 +1,36 @@
+import gzip
+import json
+import logging
+
+import logging_setup
+from config import Config
+from logging_setup import log_payload, truncate_payload
+
+
+def test_truncate_payload_keeps_head_and_tail():
+    text = "头" * 50 + "中" * 1000 + "尾" * 50
+    truncated = truncate_payload(text, 150)
+    assert truncated.startswith("头" * 50) and truncated.endswith("尾" * 50)
+    assert "省略 950 字符" in truncated
+    assert truncate_payload("短文本", 150) == "短文本"
+
+
+def test_payload_capture_writes_full_body_to_gzip(tmp_path, monkeypatch):
+    logging_setup.shutdown_logging()
+    monkeypatch.setattr(Config, 'LOG_DIR', tmp_path)
+    monkeypatch.setattr(Config, 'LOG_PAYLOAD_FILE', tmp_path / 'payloads.jsonl.gz')
+    monkeypatch.setattr(Config, 'LOG_PAYLOAD_CAPTURE', True)
+    monkeypatch.setattr(Config, 'LOG_PAYLOAD_SAMPLE_RATE', 1.0)
+    try:
+        logging_setup.setup_logging()
+        body = "正文" * 5000
+        log_payload(logging.getLogger("test"), "llm_response", body)
+    finally:
+        logging_setup.shutdown_logging()
+
+    with gzip.open(tmp_path / 'payloads.jsonl.gz', 'rt', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{**records[0], 'kind': 'llm_response', 'logger': 'test', 'data': body}]
+    app_log = (tmp_path / 'app.log').read_text(encoding='utf-8')
+    assert "llm_response (10000 chars)" in app_log
+    assert body not in app_log
@@ -0,0 +1,38 @@
+import asyncio
+
+from benchmarks.mock_llm_server import MockLLMServer, MockServerConfig
+from config import Config
+from llmkey import LLMClient
+from model_router import TASK_SECTION_HIGH, TASK_SECTION_LOW, routes_for, section_task
+
+
+def test_unconfigured_task_uses_default_model(monkeypatch):
+    monkeypatch.setattr(Config, 'MODEL_ROUTES', {'outline': []})
+    assert [route.model for route in routes_for('outline')] == [Config.LLM_MODEL]
+    assert section_task(10.0, 10.0) == TASK_SECTION_HIGH
+    assert section_task(3.0, 10.0) == TASK_SECTION_LOW
+
+
+def test_falls_back_to_next_route_when_primary_fails(monkeypatch):
+    monkeypatch.setattr(Config, 'MAX_RETRIES', 1)
+    monkeypatch.setattr(Config, 'RETRY_DELAY', 0)
+
+    async def run():
+        broken = MockLLMServer(MockServerConfig(latency_dist='fixed', latency_ms=1, error_rate_5xx=1.0))
+        healthy = MockLLMServer(MockServerConfig(latency_dist='fixed', latency_ms=1, tokens_per_second=1e6, output_tokens=20))
+        async with broken, healthy:
+            monkeypatch.setattr(Config, 'MODEL_ROUTES', {'section_low': [
+                {'model': 'small', 'api_base': broken.url},
+                {'model': 'large', 'api_base': healthy.url, 'max_tokens': 10},
+            ]})
+            client = LLMClient()
+            try:
+                content = await client._call_llm_async([{"role": "user", "content": "hi"}], task='section_low')
+            finally:
+                await client.close()
+        return content, broken.stats.requests, healthy.stats.requests
+
+    content, broken_requests, healthy_requests = asyncio.run(run())
+    # 首选模型重试耗尽后换备选模型；备选模型的 max_tokens 上限生效
+    assert broken_requests == 2 and healthy_requests == 1
+    assert len(content) == 10
@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+import spacy
+
+from nlp_pool import NLPPool, analyze_texts
+from prompts import ContentBlock, Prompts
+
+TEXTS = [f"第{i}部分介绍系统的架构设计与实施方案，重点说明数据安全。" for i in range(5)] + ["售后服务承诺。"]
+
+requires_model = pytest.mark.skipif(
+    not (spacy.util.is_package('zh_core_web_trf') or spacy.util.is_package('zh_core_web_sm')),
+    reason="未安装中文 spaCy 模型"
+)
+
+
+@requires_model
+def test_pool_shards_across_workers_and_keeps_order():
+    async def run():
+        pool = NLPPool(workers=2)
+        try:
+            return await pool.analyze(TEXTS)
+        finally:
+            pool.shutdown()
+
+    features = asyncio.run(run())
+    expected = analyze_texts(TEXTS)
+    assert [f.terms for f in features] == [f.terms for f in expected]
+    assert [f.length for f in features] == [f.length for f in expected]
+
+
+@requires_model
+def test_pool_optimize_matches_in_process_result():
+    def blocks():
+        return [ContentBlock(content=text, title=f"块{i}") for i, text in enumerate(TEXTS)]
+
+    expected = blocks()
+    relationships = Prompts.extract_relationships(expected)
+    for block in expected:
+        block.related_sections = relationships.get(block.title, [])
+    expected = Prompts.optimize_overlapping(expected)
+
+    async def run():
+        pool = NLPPool(workers=0)
+        try:
+            return await pool.optimize_overlapping(blocks())
+        finally:
+            pool.shutdown()
+
+    result = asyncio.run(run())
+    assert [block.content for block in result] == [block.content for block in expected]
+
+
+class BrokenExecutor(ThreadPoolExecutor):
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+
+def test_broken_pool_is_replaced_on_next_call():
+    pool = NLPPool(workers=2)
+    broken = BrokenExecutor()
+    pool._executor = broken
+
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(pool.analyze(TEXTS))
+    assert pool._executor is None
+    assert broken._shutdown
@@ -0,0 +1,43 @@
+from outline import OutlineIndex, position_key
+
+
+def make_outline():
+    return {
+        "body_paragraphs": [
+            {
+                "chapter_title": f"第{ci + 1}章",
+                "sections": [
+                    {
+                        "section_title": f"{ci + 1}.{si + 1} 节",
+                        "sub_sections": [
+                            {"sub_section_title": f"{ci + 1}.{si + 1}.{ssi + 1} 小节", "content_summary": f"边界{ssi}"}
+                            for ssi in range(3)
+                        ]
+                    }
+                    for si in range(2)
+                ]
+            }
+            for ci in range(2)
+        ]
+    }
+
+
+def test_round_trip_and_counts():
+    data = make_outline()
+    index = OutlineIndex.from_dict(data)
+    assert index.to_dict() == data
+    assert len(index) == 2 + 4 + 12
+    assert index.count(1) == 2
+    assert index.count() == 12
+
+
+def test_path_and_sibling_lookups():
+    index = OutlineIndex.from_dict(make_outline())
+    node = index.node(position_key((1, 0, 1)))
+    assert [index.titles[n] for n in index.path(node)] == ["第2章", "2.1 节", "2.1.2 小节"]
+    assert index.summaries[node] == "边界1"
+    assert index.titles[index.previous_sibling(node)] == "2.1.1 小节"
+    assert index.titles[index.next_sibling(node)] == "2.1.3 小节"
+    assert index.previous_sibling(index.node(position_key((0,)))) is None
+    assert index.next_sibling(index.node(position_key((1, 1, 2)))) is None
+    assert [position for position, _ in index.iter_subsections()] == sorted(position for position, _ in index.iter_subsections())
@@ -0,0 +1,56 @@
+from outline import OutlineIndex
+from prompts import Prompts
+from score_weights import parse_scoring_items, section_weights, target_chars, token_budgets
+
+SCORE_MD = """技术方案（30分）
+
+方案完整性（20分）：方案是否涵盖所有技术要求。
+
+创新性（10分）：方案是否具备创新点，如智能算法优化等。
+价格（5分）
+
+报价合理性（5分）：报价是否合理，性价比是否高。
+"""
+
+
+def make_index():
+    def section(title, subs):
+        return {"section_title": title,
+                "sub_sections": [{"sub_section_title": s, "content_summary": ""} for s in subs]}
+    return OutlineIndex.from_dict({"body_paragraphs": [
+        {"chapter_title": "第一章 技术方案", "sections": [
+            section("1.1 方案完整性（20分）", ["1.1.1 系统概述", "1.1.2 技术指标对应"]),
+            section("1.2 技术亮点", ["1.2.1 智能算法优化与创新点"]),
+        ]},
+        {"chapter_title": "第二章 价格", "sections": [
+            section("2.1 报价合理性", ["2.1.1 报价明细"]),
+        ]},
+    ]})
+
+
+def test_parse_items_skips_category_lines():
+    items = parse_scoring_items(SCORE_MD)
+    assert [(item.name, item.points, item.category) for item in items] == [
+        ("方案完整性", 20.0, "技术方案"), ("创新性", 10.0, "技术方案"), ("报价合理性", 5.0, "价格")]
+
+
+def test_weights_follow_scores_and_budgets_scale():
+    index = make_index()
+    weights = section_weights(index, SCORE_MD)
+    by_title = {index.titles[node]: weight for node, weight in weights.items()}
+    # 标题直接命中的平分该项分值；"智能算法优化与创新点"按说明文字的重合度对应到创新性
+    assert by_title == {"1.1.1 系统概述": 10.0, "1.1.2 技术指标对应": 10.0,
+                        "1.2.1 智能算法优化与创新点": 10.0, "2.1.1 报价明细": 5.0}
+
+    budgets = token_budgets(weights, max_tokens=8000, min_tokens=3000)
+    assert sorted(budgets.values()) == [4000, 8000, 8000, 8000]
+    assert min(token_budgets({1: 1.0, 2: 100.0}, 8000, 3000).values()) == 3000
+
+
+def test_target_chars_is_a_whole_number_in_the_prompt():
+    assert target_chars(8192, 8192, 5000) == 5000
+    assert target_chars(2949, 8192, 5000) == 1800
+    assert target_chars(100, 8192, 5000) == 500
+    prompt = Prompts.CONTENT_SECTION_USER.format(title='1.1 总体设计', content_summary='边界',
+                                                 min_chars=target_chars(2949, 8192, 5000))
+    assert '1800字' in prompt and '.0' not in prompt
@@ -0,0 +1,25 @@
+from search_index import SearchIndex, to_match_query
+
+
+def test_incremental_index_and_cjk_search(tmp_path):
+    index = SearchIndex(tmp_path / 'search.db')
+    sections = [
+        ("001-001-001", "第一章 技术方案 > 1.1 总体设计", "1.1.1 高可用设计", "平台采用双机热备，实现高可用架构。"),
+        ("001-001-002", "第一章 技术方案 > 1.1 总体设计", "1.1.2 数据存储", "历史数据至少保存90天，支持导出。"),
+    ]
+    assert index.index_project("p1", sections) == {'updated': 2, 'deleted': 0}
+    # 内容未变化时不重复写入，骨架中已删除的小节从索引中移除
+    assert index.index_project("p1", sections[:1]) == {'updated': 0, 'deleted': 1}
+    index.index_project("p2", [("001-001-001", "", "1.1.1 架构", "采用高可用集群部署。")])
+
+    results = index.search("高可用")
+    assert [(r['project_id'], r['key']) for r in results] == [("p1", "001-001-001"), ("p2", "001-001-001")]
+    assert "<mark>高可用</mark>" in results[0]['snippet']
+    # 两个字的词也能检索；多个词需同时命中
+    assert [r['project_id'] for r in index.search("架构", project_id="p2")] == ["p2"]
+    assert index.search("高可用 导出") == []
+
+
+def test_query_phrases_match_substrings_only():
+    assert to_match_query("高可用 HA") == '"高可 可用" AND "ha"'
+    assert to_match_query("，。") is None
@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+import pytest
+
+import storage
+
+
+def test_atomic_write_replaces_without_leftovers(tmp_path):
+    path = tmp_path / "outputs" / "content.md"
+    storage.atomic_write_text(path, "旧内容")
+    storage.atomic_write_text(path, "新内容")
+
+    assert path.read_text(encoding='utf-8') == "新内容"
+    assert os.listdir(path.parent) == ["content.md"]
+
+
+def test_failed_write_keeps_original(tmp_path, monkeypatch):
+    path = tmp_path / "outline.json"
+    storage.atomic_write_json(path, {"body_paragraphs": []})
+    pending = []
+
+    def fail_replace(src, dst):
+        # 临时文件已写完，替换这一步失败
+        pending.append(os.path.basename(src))
+        assert os.path.exists(src)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage.os, 'replace', fail_replace)
+    with pytest.raises(OSError):
+        storage.atomic_write_json(path, {"body_paragraphs": ["新段落"]})
+
+    assert pending and pending[0].endswith('.tmp')
+    assert storage.read_text(path) == '{\n  "body_paragraphs": []\n}'
+    assert os.listdir(tmp_path) == ["outline.json"]
+
+
+def test_async_roundtrip(tmp_path):
+    path = tmp_path / "tech.md"
+
+    async def run():
+        await storage.write_text_async(path, "技术要求")
+        await storage.append_text_async(path, "\n补充")
+        await storage.write_json_async(tmp_path / "a.json", {"章": 1})
+        return await storage.read_text_async(path), await storage.read_json_async(tmp_path / "a.json")
+
+    assert asyncio.run(run()) == ("技术要求\n补充", {"章": 1})
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import llmkey
+from llmkey import LLMClient
+from model_router import TASK_PLAN
+
+
+class _Context:
+    prompt_prefix = ""
+
+
+def _section(**extra):
+    section = {'title': '1.1 总体设计', 'content_summary': '系统架构与技术路线', 'context': _Context(),
+               'min_chars': 4000, 'max_tokens': 4000, 'paragraphs': 3}
+    section.update(extra)
+    return section
+
+
+def _fake_llm(client, plan, fail_paragraph=None):
+    calls = []
+
+    async def call(messages, require_json=False, require_outline=False, max_tokens=None, task=None):
+        calls.append((task, max_tokens))
+        if task == TASK_PLAN:
+            return plan
+        prompt = messages[-1]['content']
+        index = int(prompt.split('现在只撰写第 ')[1].split(' 段')[0])
+        if index == fail_paragraph:
+            return None
+        return f"第{index}段正文。" * 5
+
+    client._call_llm_async = call
+    return calls
+
+
+class _FakeNLPPool:
+    """不加载 spaCy 模型的解析池"""
+
+    def __init__(self, error=None):
+        self.error = error
+
+    async def optimize_overlapping(self, blocks):
+        if self.error:
+            raise self.error
+        return blocks
+
+
+def _stub_nlp_pool(monkeypatch, error=None):
+    pool = _FakeNLPPool(error)
+    monkeypatch.setattr(llmkey, 'get_nlp_pool', lambda: pool)
+
+
+def test_paragraphs_generated_and_stitched_in_plan_order(monkeypatch):
+    _stub_nlp_pool(monkeypatch)
+    plan = json.dumps({'paragraphs': [{'title': f'要点{i}', 'points': f'内容{i}'} for i in range(1, 4)]},
+                      ensure_ascii=False)
+
+    async def run():
+        client = LLMClient()
+        calls = _fake_llm(client, plan, fail_paragraph=2)
+        try:
+            result = await client._generate_section_content(_section())
+        finally:
+            await client.close()
+        return result, calls
+
+    result, calls = asyncio.run(run())
+    content = result['content']
+    assert content.index('第1段') < content.index('要点2') < content.index('第3段')
+    # 失败的段落留占位，不把整节标成失败
+    assert '本段内容缺失' in content and '生成失败' not in content
+    assert calls[0] == (TASK_PLAN, 1024) and len(calls) == 4
+
+
+def test_coherence_failure_keeps_generated_paragraphs(monkeypatch):
+    _stub_nlp_pool(monkeypatch, error=OSError("Can't find model 'zh_core_web_trf'"))
+    plan = json.dumps({'paragraphs': [{'title': f'要点{i}', 'points': f'内容{i}'} for i in range(1, 3)]},
+                      ensure_ascii=False)
+
+    async def run():
+        client = LLMClient()
+        _fake_llm(client, plan)
+        fake_call = client._call_llm_async
+
+        async def call(messages, **kwargs):
+            prompts.append(messages[-1]['content'])
+            return await fake_call(messages, **kwargs)
+
+        client._call_llm_async = call
+        try:
+            return await client._generate_section_content(_section(paragraphs=2))
+        finally:
+            await client.close()
+
+    prompts = []
+    content = asyncio.run(run())['content']
+    assert '生成失败' not in content
+    assert content.index('第1段') < content.index('第2段')
+    assert '本段不少于2000字' in prompts[-1]
+
+
+def test_invalid_plan_falls_back_to_single_call():
+    async def run():
+        client = LLMClient()
+        calls = _fake_llm(client, 'not json')
+        client_call = client._call_llm_async
+
+        async def single(messages, **kwargs):
+            if kwargs.get('task') == TASK_PLAN:
+                return await client_call(messages, **kwargs)
+            calls.append(('single', kwargs.get('max_tokens')))
+            return "整节正文"
+
+        client._call_llm_async = single
+        try:
+            result = await client._generate_section_content(_section())
+        finally:
+            await client.close()
+        return result, calls
+
+    result, calls = asyncio.run(run())
+    assert result['content'] == "整节正文"
+    assert calls[-1] == ('single', 4000)
@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+from config import Config
+from tracing import span
+
+
+def test_span_disabled_is_noop(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'TRACE_ENABLED', False)
+    monkeypatch.setattr(Config, 'TRACE_DIR', tmp_path)
+
+    with span("generate_outline", root=True):
+        with span("llm_attempt", cat="llm"):
+            pass
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_root_span_exports_chrome_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'TRACE_ENABLED', True)
+    monkeypatch.setattr(Config, 'TRACE_DIR', tmp_path)
+
+    async def section(title):
+        with span("generate_section_content_async", cat="llm", title=title):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        with span("generate_full_content_async", root=True):
+            await asyncio.gather(section("1.1.1 a"), section("1.1.2 b"))
+
+    asyncio.run(run())
+
+    files = list(tmp_path.glob("generate_full_content_async-*.json"))
+    assert len(files) == 1
+    events = json.loads(files[0].read_text(encoding='utf-8'))['traceEvents']
+    spans = [e for e in events if e['ph'] == 'X']
+    assert sorted(e['name'] for e in spans) == [
+        "generate_full_content_async",
+        "generate_section_content_async",
+        "generate_section_content_async",
+    ]
+    # 并发的两个小节落在不同的时间线上
+    section_tids = {e['tid'] for e in spans if e['name'] == "generate_section_content_async"}
+    assert len(section_tids) == 2
@@ -0,0 +1,29 @@
+import pytest
+
+from config import Config
+from workspace import DEFAULT_PROJECT, Workspace, list_workspaces, validate_project_id
+
+
+def test_default_project_uses_legacy_directories():
+    workspace = Workspace.for_project(DEFAULT_PROJECT)
+    assert workspace.tech_file == Config.INPUT_DIR / 'tech.md'
+    assert workspace.outline_json == Config.OUTLINE_DIR / 'outline.json'
+    assert workspace.content_file == Config.OUTPUT_DIR / 'content.md'
+
+
+def test_projects_are_isolated_and_listed(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PROJECTS_DIR', tmp_path)
+    first = Workspace.for_project('bid-a').ensure()
+    second = Workspace.for_project('bid-b').ensure()
+    assert first.outline_json != second.outline_json
+    assert first.sections_dir == tmp_path / 'bid-a' / 'outputs' / 'sections'
+
+    first.tech_file.write_text("技术要求", encoding='utf-8')
+    ids = [workspace.project_id for workspace in list_workspaces()]
+    assert ids == [DEFAULT_PROJECT, 'bid-a', 'bid-b']
+    assert first.info()['updated_at'] is not None
+    assert second.info()['has_input'] is False
+
+    for bad in ('../etc', 'a/b', ''):
+        with pytest.raises(ValueError):
+            validate_project_id(bad)
@@ -0,0 +1,142 @@
+# tokenizer.py
+
+"""
+token 计数
+
+Config.TOKENIZER 选择分词器：
+    estimate               不依赖具体模型的估算：中日韩字符按 1 个 token 计，
+                           其余连续的字母数字按约 4 个字符 1 个 token 计，标点和其它符号各计 1 个
+    tiktoken:<encoding>    用 tiktoken 的编码精确计数（如 tiktoken:cl100k_base），需要安装 tiktoken
+分词器按名称缓存，只加载一次；指定的分词器不可用时退回 estimate。
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Iterator, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_]')
+_CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+_LONG_WORD = re.compile(r'[A-Za-z0-9_]{5,}')
+
+
+def _piece_tokens(piece: str) -> int:
+    return (len(piece) + 3) // 4 if len(piece) > 1 else 1
+
+
+class EstimateTokenizer:
+    """按字符类别估算 token 数"""
+
+    name = 'estimate'
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        # 每个片段至少 1 个 token，再补上超过 4 个字符的字母数字串多出的部分（避免逐个片段调用 Python 代码）
+        return len(_TOKEN_PATTERN.findall(text)) + sum((len(word) - 1) // 4 for word in _LONG_WORD.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        total = 0
+        for match in _TOKEN_PATTERN.finditer(text):
+            total += _piece_tokens(match.group())
+            if total > max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+    def split(self, text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+        """按 token 上限把文本切成连续的几段，产出 (片段, token 数)；一次遍历，线性复杂度"""
+        max_tokens = max(1, max_tokens)
+        # 单个字母数字串超过上限时按字符切开，每 4 个字符计 1 个 token
+        step = max_tokens * 4
+        start, total = 0, 0
+        for match in _TOKEN_PATTERN.finditer(text):
+            tokens = _piece_tokens(match.group())
+            if total and total + tokens > max_tokens:
+                yield text[start:match.start()], total
+                start, total = match.start(), 0
+            if tokens > max_tokens:
+                while match.end() - start > step:
+                    yield text[start:start + step], max_tokens
+                    start += step
+                tokens = _piece_tokens(text[start:match.end()])
+            total += tokens
+        if total:
+            yield text[start:], total
+
+
+class TiktokenTokenizer:
+    """tiktoken 编码的精确计数"""
+
+    def __init__(self, encoding_name: str):
+        import tiktoken
+        self.name = f'tiktoken:{encoding_name}'
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        # 截断处可能落在多字节字符中间，去掉解码出的替换字符
+        return self.encoding.decode(tokens[:max_tokens]).rstrip('�').rstrip()
+
+    def split(self, text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+        """按 token 上限把文本切成连续的几段，产出 (片段, token 数)；只编码一次"""
+        max_tokens = max(1, max_tokens)
+        tokens = self.encoding.encode(text, disallowed_special=())
+        start = 0
+        while start < len(tokens):
+            end = min(start + max_tokens, len(tokens))
+            piece = None
+            # 切点落在多字节字符中间时前移，前移到头仍不行（单个字符跨多个 token）则后移
+            for candidate in [*range(end, max(start, end - 4), -1), *range(end + 1, min(end + 4, len(tokens)) + 1)]:
+                try:
+                    piece = self.encoding.decode_bytes(tokens[start:candidate]).decode('utf-8')
+                except UnicodeDecodeError:
+                    continue
+                end = candidate
+                break
+            if piece is None:
+                piece = self.encoding.decode(tokens[start:end])
+            yield piece, end - start
+            start = end
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(spec: str):
+    """按名称加载分词器（带缓存）"""
+    kind, _, arg = (spec or 'estimate').partition(':')
+    if kind == 'tiktoken':
+        try:
+            return TiktokenTokenizer(arg or 'cl100k_base')
+        except Exception as e:
+            logger.warning(f"Tokenizer {spec} unavailable ({e}), falling back to estimate")
+    elif kind != 'estimate':
+        logger.warning(f"Unknown tokenizer {spec}, falling back to estimate")
+    return EstimateTokenizer()
+
+
+def get_tokenizer():
+    return load_tokenizer(Config.TOKENIZER)
+
+
+def count_tokens(text: str) -> int:
+    """计算文本的 token 数"""
+    return get_tokenizer().count(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截取文本开头不超过 max_tokens 的部分"""
+    return get_tokenizer().truncate(text, max_tokens)
@@ -0,0 +1,130 @@
+# tracing.py
+
+"""
+轻量级链路追踪
+
+用 span 记录生成流程中各阶段（大纲、整篇生成、单节生成、每次 LLM 请求、
+信号量等待、批次屏障、退避重试、磁盘写入）的起止时间，
+一次运行结束后导出为 Chrome trace-event JSON，可直接拖入 https://ui.perfetto.dev 查看时间线。
+
+通过 Config.TRACE_ENABLED 开关，关闭时 span 为空操作。
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 当前运行（根 span）的事件缓冲区，随 asyncio 任务的上下文自动传递给子任务
+_current_run: contextvars.ContextVar = contextvars.ContextVar('trace_run', default=None)
+
+# 进程内统一的时间原点，保证同一文件内的时间戳可比
+_CLOCK_ORIGIN = time.perf_counter()
+
+
+def _now_us() -> float:
+    return (time.perf_counter() - _CLOCK_ORIGIN) * 1_000_000
+
+
+class TraceRun:
+    """一次运行收集到的全部 trace 事件"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events: List[Dict] = []
+        self._tracks: Dict[object, int] = {}
+        self._lock = threading.Lock()
+
+    def track_id(self, label: str) -> int:
+        """为当前 asyncio 任务（或线程）分配一条独立的时间线"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else ('thread', threading.get_ident())
+
+        with self._lock:
+            tid = self._tracks.get(key)
+            if tid is None:
+                tid = len(self._tracks) + 1
+                self._tracks[key] = tid
+                # 以该时间线上的第一个 span 名称命名，便于在 Perfetto 中辨认
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                    'args': {'name': label}
+                })
+            return tid
+
+    def add(self, event: Dict):
+        with self._lock:
+            self.events.append(event)
+
+    def export(self, trace_dir: Optional[os.PathLike] = None) -> Optional[str]:
+        """将事件写入 Chrome trace-event JSON 文件，返回文件路径"""
+        trace_dir = trace_dir or Config.TRACE_DIR
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            path = os.path.join(trace_dir, f"{self.name}-{timestamp}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'traceEvents': self.events,
+                    'displayTimeUnit': 'ms',
+                    'otherData': {'run': self.name}
+                }, f, ensure_ascii=False)
+            logger.info(f"Trace exported to {path} ({len(self.events)} events)")
+            return path
+        except Exception as e:
+            logger.error(f"Error exporting trace: {e}")
+            return None
+
+
+@contextmanager
+def span(name: str, cat: str = 'workflow', root: bool = False, **args):
+    """
+    记录一个 span
+
+    Args:
+        name: span 名称
+        cat: 分类（workflow / llm / io / wait）
+        root: 若当前没有进行中的运行，是否以此 span 开启一次新的运行；
+              根 span 结束时自动导出 trace 文件
+        **args: 附加在事件上的参数（章节标题、重试次数等）
+    """
+    run = _current_run.get()
+    token = None
+    if run is None:
+        if not (root and Config.TRACE_ENABLED):
+            yield
+            return
+        run = TraceRun(name)
+        token = _current_run.set(run)
+
+    tid = run.track_id(name)
+    start = _now_us()
+    try:
+        yield
+    except BaseException as e:
+        args['error'] = type(e).__name__
+        raise
+    finally:
+        run.add({
+            'name': name, 'cat': cat, 'ph': 'X',
+            'ts': start, 'dur': _now_us() - start,
+            'pid': os.getpid(), 'tid': tid,
+            'args': {k: str(v) for k, v in args.items()}
+        })
+        if token is not None:
+            _current_run.reset(token)
+            run.export()
+
@@ -0,0 +1,123 @@
+# workspace.py
+
+"""
+按项目隔离的工作区
+
+每个投标项目有独立的输入、大纲、小节片段和正文目录，多个项目可以同时生成互不覆盖。
+默认项目（default）沿用原来的 inputs/、outputs/ 目录，已有数据和调用方式不受影响；
+其它项目位于 projects/<project_id>/ 下：
+    projects/<project_id>/inputs/         tech.md、score.md（导入招标文件时另有 source.md 和 uploads/）
+    projects/<project_id>/outputs/        content.md
+    projects/<project_id>/outputs/outline/  outline.json、outline.md
+    projects/<project_id>/outputs/sections/ 小节片段
+"""
+
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import Config
+
+DEFAULT_PROJECT = 'default'
+
+_PROJECT_ID = re.compile(r'^[0-9A-Za-z_-]{1,64}$')
+
+
+def validate_project_id(project_id: str) -> str:
+    """项目 ID 只允许字母、数字、下划线和连字符，避免路径穿越"""
+    if not project_id or not _PROJECT_ID.match(project_id):
+        raise ValueError(f"Invalid project id: {project_id!r}")
+    return project_id
+
+
+class Workspace:
+    """单个项目的文件布局"""
+
+    def __init__(self, project_id: str, input_dir: Path, output_dir: Path,
+                 outline_dir: Optional[Path] = None, sections_dir: Optional[Path] = None):
+        self.project_id = project_id
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.outline_dir = Path(outline_dir) if outline_dir else self.output_dir / 'outline'
+        self.sections_dir = Path(sections_dir) if sections_dir else self.output_dir / 'sections'
+
+    @classmethod
+    def for_project(cls, project_id: str = DEFAULT_PROJECT) -> 'Workspace':
+        project_id = validate_project_id(project_id or DEFAULT_PROJECT)
+        if project_id == DEFAULT_PROJECT:
+            return cls(project_id, Config.INPUT_DIR, Config.OUTPUT_DIR, Config.OUTLINE_DIR, Config.SECTIONS_DIR)
+        root = Config.PROJECTS_DIR / project_id
+        return cls(project_id, root / 'inputs', root / 'outputs')
+
+    @property
+    def tech_file(self) -> Path:
+        return self.input_dir / 'tech.md'
+
+    @property
+    def score_file(self) -> Path:
+        return self.input_dir / 'score.md'
+
+    @property
+    def source_file(self) -> Path:
+        """导入招标文件时抽取出的全文"""
+        return self.input_dir / 'source.md'
+
+    @property
+    def upload_dir(self) -> Path:
+        return self.input_dir / 'uploads'
+
+    @property
+    def outline_json(self) -> Path:
+        return self.outline_dir / 'outline.json'
+
+    @property
+    def outline_md(self) -> Path:
+        return self.outline_dir / 'outline.md'
+
+    @property
+    def content_file(self) -> Path:
+        return self.output_dir / 'content.md'
+
+    @property
+    def docx_file(self) -> Path:
+        return self.output_dir / 'content.docx'
+
+    @property
+    def duplicates_file(self) -> Path:
+        return self.output_dir / 'duplicates.json'
+
+    @property
+    def coverage_file(self) -> Path:
+        return self.output_dir / 'coverage.json'
+
+    def exists(self) -> bool:
+        return self.input_dir.exists()
+
+    def ensure(self) -> 'Workspace':
+        """创建项目目录"""
+        for path in (self.input_dir, self.outline_dir, self.sections_dir):
+            path.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def info(self) -> Dict:
+        """项目概况，供列表接口使用"""
+        files = [self.tech_file, self.score_file, self.outline_json, self.content_file]
+        mtimes = [path.stat().st_mtime for path in files if path.exists()]
+        return {
+            'project_id': self.project_id,
+            'has_input': self.tech_file.exists() and self.score_file.exists(),
+            'has_outline': self.outline_json.exists(),
+            'has_content': self.content_file.exists(),
+            'updated_at': datetime.fromtimestamp(max(mtimes)).isoformat() if mtimes else None
+        }
+
+
+def list_workspaces() -> List[Workspace]:
+    """默认项目和 projects/ 下的所有项目，按 ID 排序"""
+    workspaces = [Workspace.for_project(DEFAULT_PROJECT)]
+    if Config.PROJECTS_DIR.exists():
+        for path in sorted(Config.PROJECTS_DIR.iterdir()):
+            if path.is_dir() and _PROJECT_ID.match(path.name) and path.name != DEFAULT_PROJECT:
+                workspaces.append(Workspace.for_project(path.name))
+    return workspaces